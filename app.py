@@ -2,7 +2,9 @@ from dash import Dash
 import dash_bootstrap_components as dbc
 from layouts.layout import app_layout
 from callbacks import register_callbacks
-from config import APP_PORT, APP_DEBUG, logger
+from config import APP_PORT, APP_DEBUG, COMPRESS_RESPONSES, METRICS_ENABLED, logger
+from utils.callback_metrics import instrument_callbacks, register_metrics_route
+from utils.response_compression import register_response_compression
 
 # ✅ Initialize Dash app
 app = Dash(
@@ -19,6 +21,15 @@ app.layout = app_layout
 # ✅ Register callbacks
 register_callbacks(app)
 
+# ✅ Time every callback and serve the numbers at /metrics
+if METRICS_ENABLED:
+    instrument_callbacks(app)
+    register_metrics_route(server)
+
+# ✅ Gzip responses for browsers that accept it
+if COMPRESS_RESPONSES:
+    register_response_compression(server)
+
 if __name__ == '__main__':
     logger.info("🚀 Starting Dash app...")
     app.run_server(debug=APP_DEBUG, port=APP_PORT)
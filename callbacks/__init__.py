@@ -1,9 +1,19 @@
 from .tree_callbacks import register_tree_callbacks
 from .snp_callbacks import register_snp_callbacks
 from .alignment_callbacks import register_alignment_callbacks
+from .map_callbacks import register_map_callbacks
+from .comparison_callbacks import register_comparison_callbacks
+from .project_callbacks import register_project_callbacks
+from .layout_callbacks import register_layout_callbacks
+from .selection_callbacks import register_selection_callbacks
 
 def register_callbacks(app):
     """Register all callback functions."""
     register_tree_callbacks(app)
     register_snp_callbacks(app)
     register_alignment_callbacks(app)
+    register_map_callbacks(app)
+    register_comparison_callbacks(app)
+    register_project_callbacks(app)
+    register_layout_callbacks(app)
+    register_selection_callbacks(app)
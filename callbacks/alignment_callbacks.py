@@ -1,36 +1,193 @@
-import base64
-import io
-from dash import html, Input, Output, State
-import dash_bio as dashbio
-from Bio import SeqIO
+from dash import dcc, html, Input, Output, State, Patch, no_update
+from dash.exceptions import PreventUpdate
 from config import logger
+from utils.callback_metrics import error_message
 
 def register_alignment_callbacks(app):
     @app.callback(
-        Output('output-alignment-chart', 'children'),
+        [Output('msa-alignment-key', 'data'),
+         Output('msa-alignment-summary', 'children'),
+         Output('msa-overview-graph', 'figure'),
+         Output('msa-overview-graph', 'style'),
+         Output('msa-column-start', 'max'),
+         Output('msa-column-start', 'value'),
+         Output('msa-row-start', 'max'),
+         Output('msa-row-start', 'value')],
         [Input('upload-fasta', 'contents'),
-         Input('alignment-colorscale', 'value')],
+         Input('project-bundle', 'value')],
         [State('upload-fasta', 'filename')]
     )
-    def display_msa(file_contents, colorscale, file_name):
-        if not file_contents:
-            return html.Div("No FASTA file uploaded yet.", className="text-warning")
+    def load_alignment(file_contents, project, file_name):
+        """Encodes the uploaded FASTA once into the on-disk store and returns only its key and overview."""
+        from utils.file_processing import decode_uploaded_bytes, hash_uploaded_contents
+        from utils.alignment_store import get_alignment, load_alignment_bytes, load_sequence_stats
+        from utils.fasta_validation import FastaValidationError
+        from utils.variable_sites import get_site_index
+        from utils.msa_window import create_overview_figure
+        from utils.project_bundle import open_bundle
+
+        if not file_contents and not project:
+            return (None, html.Div("No FASTA file uploaded yet.", className="text-warning"),
+                    {}, {'display': 'none'}, 0, 0, 0, 0)
 
         try:
-            content_type, content_string = file_contents.split(',')
-            decoded = base64.b64decode(content_string).decode('utf-8')
-            records = list(SeqIO.parse(io.StringIO(decoded), "fasta"))
+            if project:
+                # ✅ Project alignments were encoded at ingest time; open the bundle's store directly
+                key = open_bundle(project).alignment_key
+                if key is None:
+                    return (None, html.Div(f"Project {project} has no alignment.", className="text-warning"),
+                            {}, {'display': 'none'}, 0, 0, 0, 0)
+                alignment, file_name = get_alignment(key), project
+            else:
+                key = hash_uploaded_contents(file_contents)
+                alignment = get_alignment(key)
+                if alignment is None:
+                    alignment = load_alignment_bytes(key, decode_uploaded_bytes(file_contents))
+
+            site_index = get_site_index(key, alignment.matrix)
+            stats = load_sequence_stats(key)
+            completeness = 1 - (stats['gaps'] + stats['n']) / stats['length'].clip(lower=1)
+            worst = completeness.idxmin()
 
-            if not records:
-                return html.Div("Uploaded file is not a valid FASTA file.", className="text-danger")
+            n_rows, n_cols = alignment.shape
+            summary = html.Div([
+                html.Div(f"{file_name}: {n_rows} sequences x {n_cols} columns, "
+                         f"{len(site_index.polymorphic)} polymorphic sites "
+                         f"({len(site_index.parsimony_informative)} parsimony-informative), "
+                         f"{site_index.gap_fraction.mean():.1%} gaps, {site_index.n_fraction.mean():.1%} N"),
+                html.Div(f"Least complete sequence: {stats['name'][worst]} ({completeness[worst]:.1%} called)"),
+            ], style={'color': 'white'})
+            return (key, summary, create_overview_figure(alignment, site_index.polymorphic_mask),
+                    {'display': 'block'}, max(n_cols - 1, 0), 0, max(n_rows - 1, 0), 0)
 
-            return dashbio.AlignmentChart(
-                id='alignment-viewer',
-                data=decoded,
-                colorscale=colorscale if colorscale else 'nucleotide',
-                tilewidth=20
-            )
+        except FastaValidationError as e:
+            report = e.report
+            logger.warning(f"Rejected FASTA file {file_name}: {report.n_problems} problem(s)")
+            problems = [html.Li(problem) for problem in report.problems]
+            if report.n_problems > len(report.problems):
+                problems.append(html.Li(f"... and {report.n_problems - len(report.problems)} more."))
+            return (None, error_message([html.P(f"{file_name} is not a valid alignment:"), html.Ul(problems)]),
+                    {}, {'display': 'none'}, 0, 0, 0, 0)
 
         except Exception as e:
             logger.error(f"Error processing FASTA file: {str(e)}")
-            return html.Div(f"Error processing file: {str(e)}", className="text-danger")
+            return (None, error_message(f"Error processing file: {str(e)}"),
+                    {}, {'display': 'none'}, 0, 0, 0, 0)
+
+    @app.callback(
+        [Output('output-alignment-chart', 'children'),
+         Output('msa-overview-graph', 'figure', allow_duplicate=True)],
+        [Input('msa-alignment-key', 'data'),
+         Input('msa-column-start', 'value'),
+         Input('msa-row-start', 'value'),
+         Input('msa-window-width', 'value'),
+         Input('msa-window-rows', 'value'),
+         Input('alignment-colorscale', 'value'),
+         Input('msa-variable-sites-only', 'value'),
+         Input('msa-tracks', 'value')],
+        [State('sample-selection', 'data')],
+        prevent_initial_call=True
+    )
+    def display_msa(key, col_start, row_start, window_width, window_rows, colorscale, variable_only, selected_tracks,
+                    selection):
+        """Renders the current window of the alignment; only the visible rows and columns are sent."""
+        from utils.msa_window import create_window_figure, clamp_window, window_shape, window_positions
+        from utils.msa_window import selected_row_shapes
+        from utils.sample_selection import selected_positions
+        from utils.alignment_tracks import get_alignment_tracks, create_track_figure
+        from utils.alignment_store import get_alignment
+        from utils.variable_sites import get_site_index
+
+        if not key:
+            return html.Div(), no_update
+
+        alignment = get_alignment(key)
+        if alignment is None:
+            return html.Div("Alignment is no longer stored on the server, please upload it again.",
+                            className="text-warning"), no_update
+
+        try:
+            columns = None
+            if variable_only and 'VARIABLE' in variable_only:
+                columns = get_site_index(key, alignment.matrix).polymorphic
+                if len(columns) == 0:
+                    return html.Div("The alignment has no variable sites.", className="text-warning"), no_update
+
+            row_start, col_start, window_rows, window_width = clamp_window(
+                alignment, row_start, col_start, window_rows or 25, window_width or 100, columns)
+            fig = create_window_figure(alignment, row_start, col_start, window_rows, window_width,
+                                       colorscale if colorscale else 'nucleotide', columns)
+            selected = selected_positions(selection, 'alignment', key)
+            if selected is not None:
+                in_window = selected[(selected >= row_start) & (selected < row_start + window_rows)]
+                fig.update_layout(shapes=selected_row_shapes(in_window - row_start))
+
+            # ✅ Tracks are computed once per upload hash; here they are only sliced
+            children = []
+            if selected_tracks:
+                tracks = get_alignment_tracks(key, alignment.matrix)
+                positions = window_positions(col_start, window_width, columns)
+                children.append(dcc.Graph(id='alignment-tracks', figure=create_track_figure(tracks, positions, selected_tracks)))
+            children.append(dcc.Graph(id='alignment-viewer', figure=fig))
+
+            # ✅ Move the highlight on the overview without resending the overview data
+            overview = Patch()
+            if columns is None:
+                overview['layout']['shapes'] = [window_shape(col_start, window_width)]
+            else:
+                first, last = int(columns[col_start]), int(columns[col_start + window_width - 1])
+                overview['layout']['shapes'] = [window_shape(first, last - first + 1)]
+
+            return html.Div(children), overview
+
+        except Exception as e:
+            logger.error(f"Error rendering alignment window: {str(e)}")
+            return error_message(f"Error rendering alignment: {str(e)}"), no_update
+
+    @app.callback(
+        [Output('msa-column-start', 'max', allow_duplicate=True),
+         Output('msa-column-start', 'value', allow_duplicate=True)],
+        [Input('msa-variable-sites-only', 'value')],
+        [State('msa-alignment-key', 'data')],
+        prevent_initial_call=True
+    )
+    def toggle_variable_sites(variable_only, key):
+        """Switches the column slider between all columns and the polymorphic-site index."""
+        from utils.alignment_store import get_alignment
+        from utils.variable_sites import get_site_index
+
+        alignment = get_alignment(key) if key else None
+        if alignment is None:
+            raise PreventUpdate
+
+        if variable_only and 'VARIABLE' in variable_only:
+            n_cols = len(get_site_index(key, alignment.matrix).polymorphic)
+        else:
+            n_cols = alignment.shape[1]
+        return max(n_cols - 1, 0), 0
+
+    @app.callback(
+        Output('msa-column-start', 'value', allow_duplicate=True),
+        [Input('msa-overview-graph', 'clickData')],
+        [State('msa-column-start', 'max'),
+         State('msa-alignment-key', 'data'),
+         State('msa-variable-sites-only', 'value')],
+        prevent_initial_call=True
+    )
+    def jump_to_overview_click(click_data, max_start, key, variable_only):
+        """Moves the window to the alignment position clicked on the overview track."""
+        import numpy as np
+        from utils.alignment_store import get_alignment
+        from utils.variable_sites import get_site_index
+
+        if not click_data:
+            raise PreventUpdate
+        position = int(click_data['points'][0]['x']) - 1
+
+        alignment = get_alignment(key) if key else None
+        if alignment is not None and variable_only and 'VARIABLE' in variable_only:
+            # ✅ Translate the alignment position to the first variable site at or after it
+            columns = get_site_index(key, alignment.matrix).polymorphic
+            position = int(np.searchsorted(columns, position))
+
+        return max(0, min(position, max_start or 0))
@@ -0,0 +1,79 @@
+from dash import dcc, html, Input, Output, State
+from dash.exceptions import PreventUpdate
+from config import logger
+from utils.callback_metrics import error_message
+
+
+def register_comparison_callbacks(app):
+    @app.callback(
+        [Output('compare-trees-key', 'data'),
+         Output('compare-trees-summary', 'children'),
+         Output('tree-distance-container', 'children'),
+         Output('compare-reference-tree', 'options'),
+         Output('compare-reference-tree', 'value'),
+         Output('compare-second-tree', 'options'),
+         Output('compare-second-tree', 'value')],
+        [Input('upload-compare-trees', 'contents')],
+        [State('upload-compare-trees', 'filename')]
+    )
+    def load_tree_set(contents_list, filenames):
+        """Encodes the splits of every uploaded tree once and plots the RF / weighted RF distance matrices."""
+        from utils.file_processing import decode_uploaded_file, hash_uploaded_contents
+        from utils.tree_comparison import (
+            TreeComparison, parse_tree_uploads, get_cached_comparison, cache_comparison, create_distance_figure
+        )
+
+        def message(content):
+            return None, "", content, [], None, [], None
+
+        if not contents_list:
+            return message(html.Div("Upload two or more trees (or one file with several trees).", className="text-warning"))
+
+        try:
+            key = "-".join(hash_uploaded_contents(contents) for contents in contents_list)
+            comparison = get_cached_comparison(key)
+            if comparison is None:
+                trees, labels = parse_tree_uploads([decode_uploaded_file(c) for c in contents_list], filenames)
+                if len(trees) < 2:
+                    return message(html.Div("At least two trees are needed for a comparison.", className="text-warning"))
+                comparison = cache_comparison(key, TreeComparison(trees, labels))
+
+            summary = f"{len(comparison.trees)} trees, {comparison.n_taxa} shared taxa, {comparison.n_splits} distinct splits."
+            if any(comparison.n_missing):
+                summary += f" Taxa missing from some trees are ignored (up to {max(comparison.n_missing)} per tree)."
+            options = [{'label': label, 'value': i} for i, label in enumerate(comparison.labels)]
+            return (key, summary, dcc.Graph(figure=create_distance_figure(comparison)),
+                    options, 0, options, 1)
+
+        except Exception as e:
+            logger.error(f"Error comparing trees: {str(e)}")
+            return message(error_message(f"Error comparing trees: {str(e)}"))
+
+    @app.callback(
+        Output('tree-support-container', 'children'),
+        [Input('compare-trees-key', 'data'),
+         Input('compare-reference-tree', 'value')]
+    )
+    def update_split_support(key, reference):
+        """Colours each branch of the displayed tree by how many of the loaded trees contain it."""
+        from utils.tree_comparison import get_cached_comparison, create_support_figure
+        comparison = get_cached_comparison(key) if key else None
+        if comparison is None or reference is None:
+            raise PreventUpdate
+        return dcc.Graph(figure=create_support_figure(comparison, reference))
+
+    @app.callback(
+        Output('tanglegram-container', 'children'),
+        [Input('compare-trees-key', 'data'),
+         Input('compare-reference-tree', 'value'),
+         Input('compare-second-tree', 'value')]
+    )
+    def update_tanglegram(key, reference, second):
+        """Draws the displayed tree against another one with untangled, matched tip order."""
+        from utils.tree_comparison import get_cached_comparison, create_tanglegram_figure
+        comparison = get_cached_comparison(key) if key else None
+        if comparison is None or reference is None or second is None:
+            raise PreventUpdate
+        if reference == second:
+            return html.Div("Choose two different trees for the tanglegram.", className="text-warning")
+        return dcc.Graph(figure=create_tanglegram_figure(comparison, reference, second))
@@ -1,28 +1,9 @@
-import requests
-import os
-from config import logger, OPENCAGE_API_KEY
+from utils.geocoding import get_geocoding_service
 
 def get_city_coordinates(city_name):
-    """Fetch city coordinates using OpenCage API."""
-    if not OPENCAGE_API_KEY:
-        logger.warning("Missing OpenCage API Key!")
-        return None, None, "⚠️ Missing API Key."
+    """Fetch city coordinates using OpenCage API (cached on disk)."""
+    return get_geocoding_service().resolve(city_name)
 
-    base_url = "https://api.opencagedata.com/geocode/v1/json"
-    params = {"q": city_name, "key": OPENCAGE_API_KEY, "limit": 1}
-
-    try:
-        response = requests.get(base_url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        if not data["results"]:
-            return None, None, "⚠️ City not found."
-
-        lat = data["results"][0]["geometry"]["lat"]
-        lon = data["results"][0]["geometry"]["lng"]
-        return float(lat), float(lon), None
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching city coordinates: {str(e)}")
-        return None, None, f"⚠️ Error: {str(e)}"
+def get_locations_coordinates(locations):
+    """Fetch coordinates for many locations at once; each distinct place is looked up only once."""
+    return get_geocoding_service().resolve_many(locations)
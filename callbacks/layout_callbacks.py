@@ -0,0 +1,24 @@
+from dash import Input, Output, State
+from dash.exceptions import PreventUpdate
+from layouts.layout import LAZY_TABS
+
+
+def register_layout_callbacks(app):
+    for value, (_, build) in LAZY_TABS.items():
+        register_lazy_tab(app, value, build)
+
+
+def register_lazy_tab(app, value, build):
+    """Fills a lazy tab the first time it is selected; its contents then stay in the page."""
+    def load_tab(selected, children):
+        if selected != value or children:
+            raise PreventUpdate
+        return build()
+
+    load_tab.__name__ = f"load_{value.replace('-', '_')}_tab"  # ✅ Named per tab in /metrics
+    app.callback(
+        Output(f'tab-body-{value}', 'children'),
+        Input('main-tabs', 'value'),
+        State(f'tab-body-{value}', 'children'),
+        prevent_initial_call=True
+    )(load_tab)
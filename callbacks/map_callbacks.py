@@ -0,0 +1,70 @@
+from dash import html, Input, Output, State
+from config import logger
+from utils.callback_metrics import error_message
+
+
+def register_map_callbacks(app):
+    @app.callback(
+        [Output('sample-map-container', 'children'),
+         Output('sample-map-key', 'data')],
+        [Input('upload-metadata', 'contents'),
+         Input('project-bundle', 'value')],
+        [State('upload-metadata', 'filename')]
+    )
+    def update_sample_map(metadata_contents, project, metadata_filename):
+        """Renders the sample map for the uploaded metadata (cached per metadata file)."""
+        from callbacks.geolocation import get_locations_coordinates
+        from utils.file_processing import hash_uploaded_contents
+        from utils.metadata_loader import load_metadata_table, fill_missing
+        from utils.project_bundle import open_bundle
+        from utils.phylo_map import aggregate_samples, generate_sample_map, get_cached_sample_map, cache_sample_map
+
+        if not metadata_contents and not project:
+            return html.Div("Please upload a metadata file.", className="text-warning"), None
+
+        try:
+            if project:
+                bundle = open_bundle(project)
+                if not bundle.has('metadata'):
+                    return html.Div(f"Project {project} has no metadata.", className="text-warning"), None
+                key = f"project-{project}-{bundle.manifest['created']}"
+            else:
+                key = hash_uploaded_contents(metadata_contents)
+            cached = get_cached_sample_map(key)
+
+            if cached is None:
+                columns = ['location', 'MLST', 'latitude', 'longitude']
+                if project:
+                    metadata = bundle.metadata(columns)
+                else:
+                    metadata = load_metadata_table(metadata_contents, metadata_filename, columns=columns)
+                if 'location' not in metadata.columns:
+                    return error_message("Metadata file must contain a 'location' column."), None
+
+                locations = fill_missing(metadata['location']).astype(str)
+                if {'latitude', 'longitude'}.issubset(metadata.columns):
+                    # ✅ Coordinates supplied in the metadata win over geocoding
+                    coordinates = {loc: (lat, lon) for loc, lat, lon in
+                                   zip(locations, metadata['latitude'], metadata['longitude'])}
+                else:
+                    coordinates = get_locations_coordinates(locations.unique())
+
+                features, unresolved, feature_of_row = aggregate_samples(metadata, coordinates)
+                # ✅ Taxa and their map point are kept with the map, for the shared sample selection
+                samples = (metadata['taxa'].astype(str).tolist(), feature_of_row) if 'taxa' in metadata.columns else None
+                cached = cache_sample_map(key, generate_sample_map(features), unresolved, samples)
+                if unresolved:
+                    logger.warning(f"Could not place {len(unresolved)} location(s) on the map")
+
+            # ✅ Unresolved locations are cached with the map, so a cached map still lists them
+            map_html, unresolved = cached
+            children = [html.Iframe(id='sample-map-frame', srcDoc=map_html,
+                                    style={'width': '100%', 'height': '700px', 'border': 'none'})]
+            if unresolved:
+                children.append(html.P(f"Not shown (location not found): {', '.join(unresolved[:20])}",
+                                       className="text-warning"))
+            return html.Div(children), key
+
+        except Exception as e:
+            logger.error(f"Error generating sample map: {str(e)}")
+            return error_message(f"Error generating map: {str(e)}"), None
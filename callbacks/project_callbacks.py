@@ -0,0 +1,42 @@
+from dash import Input, Output
+from config import logger
+
+
+def register_project_callbacks(app):
+    @app.callback(
+        Output('project-bundle', 'options'),
+        [Input('project-refresh', 'n_clicks')]
+    )
+    def list_projects(n_clicks):
+        """Lists the ingested project bundles (re-read on Refresh, e.g. after a nightly ingest)."""
+        from utils.project_bundle import list_bundles
+        return [{'label': name, 'value': name} for name in list_bundles()]
+
+    @app.callback(
+        Output('project-summary', 'children'),
+        [Input('project-bundle', 'value')]
+    )
+    def summarize_project(project):
+        """One line describing what the selected project contains."""
+        from utils.project_bundle import open_bundle
+
+        if not project:
+            return ""
+        try:
+            contents = open_bundle(project).manifest['contents']
+        except Exception as e:
+            logger.error(f"Error opening project {project}: {str(e)}")
+            return f"Error opening project: {str(e)}"
+
+        parts = []
+        if 'tree' in contents:
+            parts.append(f"tree of {contents['tree']['tips']} tips")
+        if 'matrix' in contents:
+            parts.append(f"SNP matrix of {contents['matrix']['samples']} samples")
+        if 'alignment' in contents:
+            parts.append(f"alignment of {contents['alignment']['n_sequences']} x {contents['alignment']['n_columns']}")
+        if 'metadata' in contents:
+            parts.append(f"{contents['metadata']['rows']} metadata rows")
+        if 'annotations' in contents:
+            parts.append(f"{len(contents['annotations'])} iTOL file(s)")
+        return ", ".join(parts)
@@ -0,0 +1,163 @@
+from dash import Input, Output, State, Patch
+from dash.exceptions import PreventUpdate
+
+# ✅ The store holding the dataset key of each view, per sample index source (utils/sample_selection.py)
+SOURCE_KEYS = {
+    'tree': 'tree-search-key',
+    'large_tree': 'large-tree-search-key',
+    'matrix': 'snp-matrix-key',
+    'alignment': 'msa-alignment-key',
+    'map': 'sample-map-key',
+}
+# Figures with a reserved selection trace: samples are lasso-selected there and the shared selection shown
+SELECTION_GRAPHS = {'tree': 'tree-graph', 'large_tree': 'large-tree-graph', 'matrix': 'snp-heatmap-graph'}
+
+# Keeps the last map selection for maps rendered later and posts it into the map's iframe
+MAP_SELECTION_JS = """
+function(selection) {
+    window.sampleMapSelection = selection ? selection.counts : null;
+    var frame = document.getElementById('sample-map-frame');
+    if (frame && frame.contentWindow) {
+        frame.contentWindow.postMessage({type: 'sample-selection', counts: window.sampleMapSelection}, '*');
+    }
+}
+"""
+
+
+def selection_trace_index(source):
+    from utils.sample_selection import SELECTION_TRACE
+    from utils.snp_heatmap import HEATMAP_SELECTION_TRACE
+    return HEATMAP_SELECTION_TRACE if source == 'matrix' else SELECTION_TRACE
+
+
+def view_samples(source, key):
+    """Sample order of a view's selection trace when it differs from its dataset (the sorted, subsampled heatmap)."""
+    if source != 'matrix':
+        return None
+    from utils.snp_heatmap import heatmap_samples
+    from utils.snp_matrix_store import open_matrix
+    matrix = open_matrix(key)
+    return None if matrix is None else heatmap_samples(matrix)
+
+
+def register_selection_callbacks(app):
+    for source, store in SOURCE_KEYS.items():
+        register_source(app, source, store)
+    for source, graph in SELECTION_GRAPHS.items():
+        register_selection_graph(app, source, graph, SOURCE_KEYS[source])
+
+    @app.callback(
+        Output('sample-selection', 'data', allow_duplicate=True),
+        [Input('clear-sample-selection', 'n_clicks')],
+        prevent_initial_call=True
+    )
+    def clear_selection(n_clicks):
+        return None
+
+    @app.callback(
+        Output('sample-selection-status', 'children'),
+        [Input('sample-selection', 'data')]
+    )
+    def summarize_selection(selection):
+        from utils.sample_selection import selection_summary
+        return selection_summary(selection)
+
+    @app.callback(
+        Output('alignment-viewer', 'figure', allow_duplicate=True),
+        [Input('sample-selection', 'data')],
+        [State('msa-alignment-key', 'data'),
+         State('msa-row-start', 'value'),
+         State('msa-window-rows', 'value')],
+        prevent_initial_call=True
+    )
+    def show_alignment_selection(selection, key, row_start, window_rows):
+        """Marks the selected sequences of the current window (display_msa does the same when the window moves)."""
+        from utils.alignment_store import get_alignment
+        from utils.msa_window import clamp_window, selected_row_shapes
+        from utils.sample_selection import selected_positions
+
+        alignment = get_alignment(key) if key else None
+        if alignment is None:
+            raise PreventUpdate
+        row_start, _, window_rows, _ = clamp_window(alignment, row_start, 0, window_rows or 25, 1)
+        selected = selected_positions(selection, 'alignment', key)
+        rows = [] if selected is None else selected[(selected >= row_start) & (selected < row_start + window_rows)]
+        patched = Patch()
+        patched['layout']['shapes'] = selected_row_shapes(rows - row_start if len(rows) else [])
+        return patched
+
+    @app.callback(
+        Output('sample-map-selection', 'data'),
+        [Input('sample-selection', 'data'),
+         Input('sample-map-key', 'data')]
+    )
+    def count_map_selection(selection, key):
+        """Selected samples per map point; the map page applies them without reloading (MAP_SELECTION_JS)."""
+        import numpy as np
+        from utils.phylo_map import get_map_samples
+        from utils.sample_selection import selected_positions
+
+        samples = get_map_samples(key) if key else None
+        selected = selected_positions(selection, 'map', key)
+        if samples is None or selected is None:
+            return None
+        feature_of_row = samples[1][selected]
+        counts = np.bincount(feature_of_row[feature_of_row >= 0], minlength=int(samples[1].max(initial=-1)) + 1)
+        return {'counts': counts.tolist()}
+
+    app.clientside_callback(MAP_SELECTION_JS, Input('sample-map-selection', 'data'))
+
+
+def register_source(app, source, store):
+    """Records a view's dataset key in the sample index sources when it loads a dataset."""
+    def track_source(key):
+        patched = Patch()
+        patched[source] = key
+        return patched
+
+    track_source.__name__ = f"track_{source}_source"  # ✅ Named per source in /metrics
+    app.callback(
+        Output('sample-index-sources', 'data', allow_duplicate=True),
+        Input(store, 'data'),
+        prevent_initial_call=True
+    )(track_source)
+
+
+def register_selection_graph(app, source, graph, store):
+    """Lasso/box selection in a figure sets the shared selection; the shared selection is patched back into it."""
+    def select_samples(selected_data, sources):
+        from utils.sample_selection import make_selection
+
+        trace = selection_trace_index(source)
+        positions = [point['pointIndex'] for point in (selected_data or {}).get('points', [])
+                     if point.get('curveNumber') == trace and 'pointIndex' in point]
+        names = view_samples(source, (sources or {}).get(source))
+        if names is not None:
+            return make_selection(sources, source, names=[names[i] for i in positions if i < len(names)])
+        return make_selection(sources, source, positions=positions)
+
+    def show_selection(selection, key):
+        from utils.sample_selection import selected_positions
+
+        if not key:
+            raise PreventUpdate
+        positions = selected_positions(selection, source, key, view_samples(source, key))
+        patched = Patch()
+        patched['data'][selection_trace_index(source)]['selectedpoints'] = (
+            None if positions is None else positions.tolist())
+        return patched
+
+    select_samples.__name__ = f"select_{source}_samples"
+    show_selection.__name__ = f"show_{source}_selection"
+    app.callback(
+        Output('sample-selection', 'data', allow_duplicate=True),
+        Input(graph, 'selectedData'),
+        State('sample-index-sources', 'data'),
+        prevent_initial_call=True
+    )(select_samples)
+    app.callback(
+        Output(graph, 'figure', allow_duplicate=True),
+        [Input('sample-selection', 'data'),
+         Input(store, 'data')],
+        prevent_initial_call=True
+    )(show_selection)
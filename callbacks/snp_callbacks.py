@@ -1,83 +1,214 @@
-import base64
-import io
-import pandas as pd
-import plotly.express as px
-from dash import dcc, html, Input, Output, State, dash_table
+import math
+from dash import dcc, html, Input, Output, State, dash_table, no_update
+from dash.exceptions import PreventUpdate
 from config import logger
+from utils.callback_metrics import error_message
+
+TABLE_PAGE_SIZE = 10
+
+
+def table_page(matrix, page):
+    """Rows of one table page, read from the (memory-mapped) matrix."""
+    rows = matrix.iloc[page * TABLE_PAGE_SIZE:(page + 1) * TABLE_PAGE_SIZE]
+    return rows.reset_index(names='Sample').to_dict('records')
+
 
 def register_snp_callbacks(app):
     @app.callback(
         [Output('snp-heatmap-container', 'children'),
-         Output('snp-table-container', 'children')],
+         Output('snp-table-container', 'children'),
+         Output('snp-matrix-key', 'data')],
         [Input('upload-snp-matrix', 'contents'),
-         Input('color-palette-dropdown-heatmap', 'value')],  # ✅ Listen to Dropdown
+         Input('upload-snp-labels', 'contents'),
+         Input('color-palette-dropdown-heatmap', 'value'),  # ✅ Listen to Dropdown
+         Input('project-bundle', 'value')],
         State('upload-snp-matrix', 'filename')
     )
-    def update_snp_heatmap(file_contents, heatmap_palette, file_name):
+    def update_snp_heatmap(file_contents, label_contents, heatmap_palette, project, file_name):
+        """Heatmap and paged table of the SNP matrix; uploads are stored once and memory-mapped."""
+        from utils.snp_heatmap import create_snp_heatmap, subsample_matrix
+        from utils.figure_payload import compact_figure
+        from utils.project_bundle import DEFAULT_FIGURE_OPTIONS, open_bundle
+        from utils.snp_matrix_store import open_matrix, store_uploaded_matrix
+        from utils.sample_selection import has_selection_trace
+        from utils.snp_heatmap import HEATMAP_SELECTION_TRACE
 
-        if not file_contents:
-            return html.Div("No file uploaded yet.", className="text-warning"), html.Div()
+        if not file_contents and not project:
+            return html.Div("No file uploaded yet.", className="text-warning"), html.Div(), None
 
         try:
-            content_type, content_string = file_contents.split(',')
-            decoded = base64.b64decode(content_string)
-            df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), sep='\t')
-
-            df.rename(columns={df.columns[0]: "Sample"}, inplace=True)
-            df_melted = df.melt(id_vars=["Sample"], var_name="Variable", value_name="Value")
-            pivot_df = df_melted.pivot(index="Sample", columns="Variable", values="Value")
-
-            # ✅ Define a color scale mapping dictionary
-            color_scales = {
-                'viridis': px.colors.sequential.Viridis,
-                'plasma': px.colors.sequential.Plasma,
-                'inferno': px.colors.sequential.Inferno,
-                'magma': px.colors.sequential.Magma,
-                'cividis': px.colors.sequential.Cividis,
-                'turbo': px.colors.sequential.Turbo,
-                'blues': px.colors.sequential.Blues,
-                'greens': px.colors.sequential.Greens,
-                'oranges': px.colors.sequential.Oranges,
-                'reds': px.colors.sequential.Reds,
-                'blackbody': px.colors.sequential.Blackbody,
-                'rainbow': px.colors.sequential.Rainbow,
-                'electric': px.colors.sequential.Electric,
-                'hot': px.colors.sequential.Hot
-            }
-
-            # ✅ Ensure valid color scale selection (default to Viridis)
-            if not heatmap_palette:
-                heatmap_palette = 'viridis'  # ✅ Set default if None
-            
-            selected_palette = color_scales.get(heatmap_palette.lower(), px.colors.sequential.Viridis)
-
-            fig = px.imshow(
-                pivot_df,
-                color_continuous_scale=selected_palette,  # ✅ Now correctly maps colors
-                labels={'color': 'SNP Distance'},
-                title=f"SNP Distance Heatmap ({heatmap_palette})"
-            )
+            fig = None
+            if project:
+                # ✅ A selected project wins over uploads; its default heatmap is served pre-built
+                bundle = open_bundle(project)
+                if not bundle.has('matrix'):
+                    return html.Div(f"Project {project} has no SNP matrix.", className="text-warning"), html.Div(), None
+                key, matrix = bundle.key, bundle.snp_matrix()
+                fig = bundle.figure('snp_heatmap') if heatmap_palette == DEFAULT_FIGURE_OPTIONS['heatmap_palette'] else None
+                if fig is not None and not has_selection_trace(fig, HEATMAP_SELECTION_TRACE):
+                    fig = None  # Stored before the shared sample selection
+            else:
+                key = store_uploaded_matrix(file_contents, file_name, label_contents)
+                matrix = open_matrix(key)
 
-            fig.update_layout(
-                xaxis=dict(tickangle=-45),
-                margin=dict(l=40, r=40, t=40, b=40),
-                width=1000,
-                height=800
-            )
-
-            heatmap_graph = dcc.Graph(figure=fig)
+            # ✅ Large matrices are drawn from every k-th sample, so only those rows are read from disk
+            shown, step = subsample_matrix(matrix)
+            fig = fig or compact_figure(create_snp_heatmap(shown.reset_index(names='Sample'), heatmap_palette))
+            heatmap = [dcc.Graph(id='snp-heatmap-graph', figure=fig)]
+            if step > 1:
+                heatmap.insert(0, html.P(f"Showing every {step}th of {len(matrix)} samples; the table and export "
+                                         f"hold the full matrix.", style={'color': 'white'}))
 
             table = dash_table.DataTable(
-                data=df.to_dict("records"),
-                columns=[{"name": i, "id": i} for i in df.columns],
-                page_size=10,
+                id='snp-table',
+                data=table_page(matrix, 0),
+                columns=[{"name": i, "id": i} for i in ['Sample'] + list(matrix.columns)],
+                page_action='custom',
+                page_current=0,
+                page_size=TABLE_PAGE_SIZE,
+                page_count=max(1, math.ceil(len(matrix) / TABLE_PAGE_SIZE)),
                 style_table={'overflowX': 'auto'},
                 style_header={'backgroundColor': 'lightgrey', 'fontWeight': 'bold', 'color': 'black'},
                 style_cell={'textAlign': 'center', 'padding': '10px', 'color': 'black'},
             )
 
-            return heatmap_graph, table
+            return html.Div(heatmap), table, key
 
         except Exception as e:
             logger.error(f"Error processing SNP matrix: {str(e)}")
-            return html.Div(f"Error processing file: {str(e)}", className="text-danger"), html.Div()
+            return error_message(f"Error processing file: {str(e)}"), html.Div(), None
+
+    @app.callback(
+        Output('snp-table', 'data'),
+        [Input('snp-table', 'page_current')],
+        [State('snp-matrix-key', 'data')],
+        prevent_initial_call=True
+    )
+    def page_snp_table(page, key):
+        """Sends one page of the matrix table at a time."""
+        from utils.snp_matrix_store import open_matrix
+
+        matrix = open_matrix(key) if key else None
+        if matrix is None:
+            raise PreventUpdate
+        return table_page(matrix, page or 0)
+
+    @app.callback(
+        Output('download-snp-matrix', 'data'),
+        [Input('snp-export-btn', 'n_clicks')],
+        [State('snp-matrix-key', 'data')],
+        prevent_initial_call=True
+    )
+    def export_snp_matrix(n_clicks, key):
+        """Downloads the matrix as snp_matrix.npy + snp_names.json in a zip, the fastest format to reload."""
+        from utils.snp_matrix_store import EXPORT_FILENAME, export_matrix, open_matrix
+
+        matrix = open_matrix(key) if key else None
+        if matrix is None:
+            raise PreventUpdate
+        return dcc.send_bytes(export_matrix(matrix), EXPORT_FILENAME)
+
+    @app.callback(
+        [Output('nj-tree-key', 'data'),
+         Output('nj-tree-status', 'children')],
+        [Input('build-nj-tree-btn', 'n_clicks')],
+        [State('snp-matrix-key', 'data')],
+        prevent_initial_call=True
+    )
+    def build_nj_tree(n_clicks, key):
+        """Builds the neighbor-joining tree of the matrix once; the tree tabs plot it when no Newick file is uploaded."""
+        import time
+        from utils.neighbor_joining import matrix_tree
+
+        if not key:
+            return no_update, html.Div("Please upload an SNP matrix first.", className="text-warning")
+        try:
+            start = time.perf_counter()
+            tree = matrix_tree(key)
+            if tree is None:
+                return None, html.Div("The SNP matrix is no longer stored on the server, please upload it again.",
+                                      className="text-warning")
+            n_tips = len(tree.get_terminals())
+            return key, (f"Neighbor-joining tree of {n_tips} samples ready in {time.perf_counter() - start:.1f}s; "
+                         "the tree tabs show it when no tree file is uploaded.")
+        except Exception as e:
+            logger.error(f"Error building neighbor-joining tree: {str(e)}")
+            return no_update, error_message(f"Error building tree: {str(e)}")
+
+    @app.callback(
+        [Output('snp-mst-container', 'children'),
+         Output('snp-mst-color-by', 'options')],
+        [Input('snp-matrix-key', 'data'),
+         Input('snp-mst-color-by', 'value'),
+         Input('upload-metadata', 'contents'),
+         Input('project-bundle', 'value')],
+        [State('upload-metadata', 'filename')]
+    )
+    def update_mst_network(matrix_key, color_by, metadata_contents, project, metadata_filename):
+        """Minimum spanning network of the matrix (built once per matrix), nodes colored by a metadata column."""
+        from utils.metadata_loader import load_metadata_table
+        from utils.mst_network import create_mst_figure, matrix_network
+        from utils.figure_payload import compact_figure
+        from utils.project_bundle import open_bundle
+
+        if not matrix_key:
+            return html.Div("Upload an SNP matrix to build its minimum spanning network.", className="text-warning"), []
+
+        try:
+            metadata = None
+            if project:
+                bundle = open_bundle(project)
+                metadata = bundle.metadata() if bundle.has('metadata') else None
+            elif metadata_contents:
+                metadata = load_metadata_table(metadata_contents, metadata_filename)
+            options = [] if metadata is None else [c for c in metadata.columns if c != 'taxa']
+
+            network = matrix_network(matrix_key)
+            if network is None:
+                return html.Div("The SNP matrix is no longer stored on the server, please upload it again.",
+                                className="text-warning"), options
+            fig = create_mst_figure(network, metadata, color_by if color_by in options else None)
+            return dcc.Graph(id='snp-mst-graph', figure=compact_figure(fig)), options
+
+        except Exception as e:
+            logger.error(f"Error building minimum spanning network: {str(e)}")
+            return error_message(f"Error building minimum spanning network: {str(e)}"), []
+
+    @app.callback(
+        Output('snp-consistency-container', 'children'),
+        [Input('snp-matrix-key', 'data'),
+         Input('upload-tree', 'contents'),
+         Input('project-bundle', 'value')]
+    )
+    def update_tree_snp_consistency(matrix_key, tree_contents, project):
+        """Plots patristic vs SNP distance for all shared taxon pairs and lists the most discordant taxa."""
+        from utils.file_processing import decode_uploaded_file, hash_uploaded_contents
+        from utils.snp_matrix_store import open_matrix
+        from utils.tree_arrays import load_tree_arrays
+        from utils.patristic import LCAIndex, compare_tree_to_snp, create_consistency_figure
+        from utils.project_bundle import open_bundle
+
+        snp_matrix = open_matrix(matrix_key) if matrix_key and not project else None
+        if not project and (snp_matrix is None or not tree_contents):
+            return html.Div("Upload both a SNP matrix and a tree to compare them.", className="text-warning")
+
+        try:
+            if project:
+                bundle = open_bundle(project)
+                if not bundle.has('matrix') or not bundle.has('tree'):
+                    return html.Div(f"Project {project} needs both a SNP matrix and a tree to compare them.",
+                                    className="text-warning")
+                tree, snp_matrix = bundle.tree_arrays(), bundle.snp_matrix()
+            else:
+                tree = load_tree_arrays(hash_uploaded_contents(tree_contents), decode_uploaded_file(tree_contents))
+            result = compare_tree_to_snp(LCAIndex(tree), snp_matrix)
+
+            notes = []
+            if result['n_tree_only'] or result['n_matrix_only']:
+                notes.append(html.P(f"{len(result['taxa'])} shared taxa; {result['n_tree_only']} only in the tree, "
+                                    f"{result['n_matrix_only']} only in the matrix.", style={'color': 'white'}))
+            return html.Div(notes + [dcc.Graph(figure=create_consistency_figure(result))])
+
+        except Exception as e:
+            logger.error(f"Error comparing tree and SNP matrix: {str(e)}")
+            return error_message(f"Error comparing tree and SNP matrix: {str(e)}")
@@ -1,49 +1,191 @@
-import base64
-import io
 import tempfile
-import pandas as pd
-import plotly.graph_objects as go
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, Patch, no_update
 from dash.exceptions import PreventUpdate
-from Bio import Phylo
-import plotly.io as pio
-import plotly.express as px
-from utils.file_processing import save_uploaded_tree, save_uploaded_metadata, decode_uploaded_file
-from utils.color_utils import generate_location_colors, generate_mlst_colors
 from config import logger
-from utils.rectangular_tree import create_tree_plot
-from utils.advanced_phylo_tree import plot_tree_circular 
+from utils.callback_metrics import error_message
+
+# ✅ Plotting and parsing modules (pandas, Bio.Phylo, plotly, kaleido) are imported inside the
+# callbacks that use them, so a worker boots without them and loads each on first use
+
+TREE_PLOT_COLUMNS = ['location', 'MLST']
+VIEW_MISSING = "This tree's search index is no longer stored; load the tree again."
+
+
+def uploaded_or_nj_tree(tree_contents, nj_key):
+    """
+    The uploaded Newick tree, or else the neighbor-joining tree of the SNP matrix, rooted at its
+    midpoint for plotting; returns (tree, cache key part).
+    """
+    from utils.file_processing import read_uploaded_tree, hash_uploaded_contents
+    from utils.neighbor_joining import matrix_tree
+
+    if tree_contents:
+        tree = read_uploaded_tree(tree_contents)
+        tree.root_at_midpoint()
+        return tree, hash_uploaded_contents(tree_contents)
+    tree = matrix_tree(nj_key)  # ✅ Already midpoint-rooted on its arrays, in O(n)
+    if tree is None:
+        raise ValueError("the SNP matrix of the neighbor-joining tree is no longer stored, please upload it again")
+    return tree, f"nj-{nj_key}"
+
+
+def search_status(view, query):
+    """Runs a taxon search on a cached view and returns (figure patch, status text)."""
+    match_trace, clade_trace, n_matches, clade_tips = view.highlight(query)
+    patched = Patch()
+    patched['data'][0] = match_trace
+    patched['data'][1] = clade_trace
+    if not query or not query.strip():
+        return patched, ""
+    if n_matches == 0:
+        return patched, f"No taxa match '{query.strip()}'."
+    return patched, f"{n_matches} matching taxa; smallest enclosing clade has {clade_tips} tips."
+
+
+def tip_label_status(view, show_labels, sector, label_r):
+    """Patches the circular tree's tip label trace and sector for a view; returns (figure patch, status text)."""
+    import numpy as np
+    from utils.advanced_phylo_tree import TIP_LABEL_TRACE, tip_label_trace, visible_tip_labels
+
+    sector = tuple(sector or (0, 360))
+    patched = Patch()
+    patched['layout']['polar']['sector'] = list(sector)
+    if not show_labels:
+        patched['data'][TIP_LABEL_TRACE] = tip_label_trace().to_plotly_json()
+        return patched, ""
+
+    # ✅ Tips are laid out in preorder, so their angles are already sorted for the sector lookup
+    angles = view.x[view.tree.tips]
+    shown = visible_tip_labels(angles, sector)
+    names = [view.tree.names[view.tree.tips[i]] for i in shown]
+    patched['data'][TIP_LABEL_TRACE] = tip_label_trace(angles[shown], names, label_r).to_plotly_json()
+    n_sector = int(np.count_nonzero((angles >= np.radians(sector[0])) & (angles < np.radians(sector[1]))))
+    if len(shown) < n_sector:
+        return patched, f"Labelling {len(shown)} of {n_sector} tips in view; narrow the sector to see more."
+    return patched, f"Labelling all {n_sector} tips in view."
+
+
+def update_project_tree(project, show_labels, mlst_palette, location_palette):
+    """Rectangular tree of a project bundle: the stored figure for default options, otherwise re-plotted."""
+    from utils.project_bundle import DEFAULT_FIGURE_OPTIONS, open_bundle
+    from utils.rectangular_tree import create_tree_plot
+    from utils.figure_payload import compact_figure
+    from utils.taxon_search import cache_search_view, get_search_view, search_view_from_arrays
+    from utils.sample_selection import has_selection_trace
+
+    bundle = open_bundle(project)
+    if not bundle.has('tree') or not bundle.has('metadata'):
+        return html.Div(f"Project {project} has no tree and metadata.", className="text-warning"), None
+
+    defaults = (not show_labels and mlst_palette == DEFAULT_FIGURE_OPTIONS['mlst_palette']
+                and location_palette == DEFAULT_FIGURE_OPTIONS['location_palette'])
+    fig = bundle.figure('tree') if defaults else None
+    if fig is None or not has_selection_trace(fig):  # Bundles stored before the shared selection are re-plotted
+        fig = compact_figure(create_tree_plot(bundle.tree(), bundle.metadata(TREE_PLOT_COLUMNS), show_labels,
+                                              mlst_palette, location_palette))
+
+    search_key = f"rect-project-{project}-{bundle.manifest['created']}"
+    if get_search_view(search_key) is None:
+        x, y = bundle.layout('rectangular')
+        cache_search_view(search_key, search_view_from_arrays(bundle.tree_arrays(), x, y, bundle.metadata()))
+    return dcc.Graph(id='tree-graph', figure=fig), search_key
+
+
+def update_project_large_tree(project):
+    """Circular tree of a project bundle, coloured by the run's iTOL files (or its metadata 'color' column)."""
+    from utils.project_bundle import open_bundle
+    from utils.advanced_phylo_tree import has_tip_label_trace, plot_tree_circular, tip_label_radius
+    from utils.figure_payload import compact_figure
+    from utils.taxon_search import cache_search_view, get_search_view, search_view_from_arrays
+
+    bundle = open_bundle(project)
+    if not bundle.has('tree'):
+        return html.Div(f"Project {project} has no tree.", className="text-warning"), None, None
+
+    colors, datasets, search_table = bundle.tree_annotations()
+    fig = bundle.figure('tree_circular')
+    if fig is None or not has_tip_label_trace(fig):  # Bundles stored before tip labels and selection are re-plotted
+        fig = compact_figure(plot_tree_circular(bundle.tree(), bundle.tip_colors(colors), datasets))
+
+    search_key = f"circ-project-{project}-{bundle.manifest['created']}"
+    if get_search_view(search_key) is None:
+        if search_table is None and bundle.has('metadata'):
+            search_table = bundle.metadata()
+        x, y = bundle.layout('circular')
+        cache_search_view(search_key, search_view_from_arrays(bundle.tree_arrays(), x, y, search_table, polar=True))
+    return dcc.Graph(id='large-tree-graph', figure=fig), search_key, tip_label_radius(fig)
 
 
 def register_tree_callbacks(app):
     """Registers all tree-related callbacks for Dash."""
     @app.callback(
-        Output('tree-graph-container', 'children'),
+        [Output('tree-graph-container', 'children'),
+        Output('tree-search-key', 'data')],
         [Input('upload-tree', 'contents'),
         Input('upload-metadata', 'contents'),
         Input('show-tip-labels', 'value'),
         Input('color-palette-dropdown', 'value'),
-        Input('color-palette-dropdown-location', 'value')],
+        Input('color-palette-dropdown-location', 'value'),
+        Input('project-bundle', 'value'),
+        Input('nj-tree-key', 'data')],
         [State('upload-tree', 'filename'),
         State('upload-metadata', 'filename')]
     )
-    def update_tree(tree_contents, metadata_contents, show_labels, mlst_palette, location_palette, tree_filename, metadata_filename):
+    def update_tree(tree_contents, metadata_contents, show_labels, mlst_palette, location_palette, project, nj_key,
+                    tree_filename, metadata_filename):
         """Callback to update the REGULAR phylogenetic tree (Rectangular Plot)."""
-        if not tree_contents or not metadata_contents:
-            return html.Div("Please upload both a tree file and metadata file.", className="text-warning")
+        from utils.file_processing import hash_uploaded_contents
+        from utils.metadata_loader import load_metadata_table
+        from utils.rectangular_tree import create_tree_plot, rectangular_coordinates
+        from utils.figure_payload import compact_figure
+        from utils.taxon_search import build_search_view, cache_search_view, get_search_view
+
+        if project:
+            try:
+                return update_project_tree(project, show_labels, mlst_palette, location_palette)
+            except Exception as e:
+                logger.error(f"Error loading project tree: {str(e)}")
+                return error_message(f"Error loading project {project}: {str(e)}"), None
+
+        if not (tree_contents or nj_key) or not metadata_contents:
+            return html.Div("Please upload both a tree file and metadata file.", className="text-warning"), None
 
         try:
-            tree_file = save_uploaded_tree(tree_contents)
-            metadata_file = save_uploaded_metadata(metadata_contents)
+            tree, tree_key = uploaded_or_nj_tree(tree_contents, nj_key)
+            metadata = load_metadata_table(metadata_contents, metadata_filename, columns=TREE_PLOT_COLUMNS)
+
+            # ✅ Pass the palettes to the function; one trace per style and typed arrays keep the response small
+            fig = compact_figure(create_tree_plot(tree, metadata, show_labels, mlst_palette, location_palette))
 
-            # ✅ Pass the palettes to the function
-            fig = create_tree_plot(tree_file, metadata_file, show_labels, mlst_palette, location_palette)
+            # ✅ Index tip names and metadata once per upload so searches only patch the highlight traces
+            search_key = f"rect-{tree_key}-{hash_uploaded_contents(metadata_contents)}"
+            if get_search_view(search_key) is None:
+                x_coords, y_coords, _ = rectangular_coordinates(tree)
+                all_metadata = load_metadata_table(metadata_contents, metadata_filename)
+                cache_search_view(search_key, build_search_view(tree, x_coords, y_coords, all_metadata))
 
-            return dcc.Graph(figure=fig)
+            return dcc.Graph(id='tree-graph', figure=fig), search_key
 
         except Exception as e:
             logger.error(f"Error processing tree file: {str(e)}")
-            return html.Div(f"Error processing tree file: {str(e)}", className="text-danger")
+            return error_message(f"Error processing tree file: {str(e)}"), None
+
+    @app.callback(
+        [Output('tree-graph', 'figure', allow_duplicate=True),
+        Output('tree-search-status', 'children')],
+        [Input('tree-search-input', 'value'),
+        Input('tree-search-key', 'data')],
+        prevent_initial_call=True
+    )
+    def search_tree(query, search_key):
+        """Highlights tips matching the search box (name or metadata substring) and their common clade."""
+        from utils.taxon_search import get_search_view
+        if not search_key:
+            raise PreventUpdate
+        view = get_search_view(search_key)  # ✅ Stored on disk, so any worker can answer
+        if view is None:
+            return no_update, VIEW_MISSING
+        return search_status(view, query)
 
 
 
@@ -55,24 +197,29 @@ def register_tree_callbacks(app):
         State('upload-metadata', 'contents'),
         State('show-tip-labels', 'value'),
         State('color-palette-dropdown', 'value'),
-        State('color-palette-dropdown-location', 'value')],
+        State('color-palette-dropdown-location', 'value'),
+        State('upload-metadata', 'filename'),
+        State('nj-tree-key', 'data')],
         prevent_initial_call=True
     )
-    def export_svg(n_clicks, tree_contents, metadata_contents, show_labels, selected_palette, selected_location_palette):
+    def export_svg(n_clicks, tree_contents, metadata_contents, show_labels, selected_palette, selected_location_palette,
+                   metadata_filename, nj_key):
         """Exports the phylogenetic tree as an SVG file with the correct color palettes."""
-        
-        if not tree_contents or not metadata_contents:
+        from utils.metadata_loader import load_metadata_table
+        from utils.rectangular_tree import create_tree_plot
+
+        if not (tree_contents or nj_key) or not metadata_contents:
             raise PreventUpdate  # Ensure function does not execute if no files are uploaded
 
         show_tip_labels = 'SHOW' in show_labels
 
         # ✅ Save uploaded files properly
-        tree_file = save_uploaded_tree(tree_contents)
-        metadata_file = save_uploaded_metadata(metadata_contents)
+        tree, _ = uploaded_or_nj_tree(tree_contents, nj_key)
+        metadata = load_metadata_table(metadata_contents, metadata_filename, columns=TREE_PLOT_COLUMNS)
 
         # ✅ Pass palette names (not color lists) to `create_tree_plot`
         tree_fig = create_tree_plot(
-            tree_file, metadata_file, show_tip_labels, selected_palette, selected_location_palette
+            tree, metadata, show_tip_labels, selected_palette, selected_location_palette
         )
         
         # ✅ Save as SVG
@@ -84,41 +231,97 @@ def register_tree_callbacks(app):
 
 
     @app.callback(
-        Output('large-tree-graph-container', 'children'),
+        [Output('large-tree-graph-container', 'children'),
+        Output('large-tree-search-key', 'data'),
+        Output('large-tree-label-radius', 'data')],
         [Input('upload-large-tree', 'contents'),
         Input('upload-large-metadata', 'contents'),
-        Input('toggle-large-tip-labels', 'value'),
-        Input('color-by-metadata', 'value')],
+        Input('color-by-metadata', 'value'),
+        Input('project-bundle', 'value'),
+        Input('nj-tree-key', 'data')],
         [State('upload-large-tree', 'filename'),
         State('upload-large-metadata', 'filename')]
     )
-    def update_large_tree(tree_contents, metadata_contents, show_labels, color_by, tree_filename, metadata_filename):
-        """Callback to update the large phylogenetic tree visualization."""
-        if not tree_contents or not metadata_contents:
-            return html.Div("Please upload both a large tree file and metadata file.", className="text-warning")
+    def update_large_tree(tree_contents, metadata_contents, color_by, project, nj_key, tree_filename, metadata_filename):
+        """Callback to update the large phylogenetic tree visualization; tip labels are patched in by update_tip_labels."""
+        from utils.file_processing import hash_uploaded_contents, decode_uploaded_bytes
+        from utils.advanced_phylo_tree import plot_tree_circular, circular_coordinates, tip_label_radius
+        from utils.figure_payload import compact_figure
+        from utils.taxon_search import build_search_view, cache_search_view, get_search_view
+        from utils.itol import load_tree_annotations
 
-        try:
-            tree_file = save_uploaded_tree(tree_contents, filename="large_tree.tree")
-            metadata_file = save_uploaded_metadata(metadata_contents, filename="large_metadata.tsv")
+        if project:
+            try:
+                return update_project_large_tree(project)
+            except Exception as e:
+                return error_message(f"Error loading project {project}: {str(e)}"), None, None
 
-            tree = Phylo.read(tree_file, 'newick')
-            tree.root_at_midpoint()
+        if not (tree_contents or nj_key) or not metadata_contents:
+            return html.Div("Please upload both a large tree file and metadata file.", className="text-warning"), None, None
+
+        try:
+            tree, tree_key = uploaded_or_nj_tree(tree_contents, nj_key)
 
-            # Load metadata
-            metadata = pd.read_csv(metadata_file, sep='\t', skiprows=3, header=None, names=["taxa", "type", "color", "region"])
-            metadata["taxa"] = metadata["taxa"].str.replace("'", "").str.strip()
-            metadata_dict = dict(zip(metadata["taxa"], metadata["color"]))
+            # Load annotations: any number of iTOL dataset files and/or tables with a 'color' column
+            if not isinstance(metadata_contents, list):
+                metadata_contents, metadata_filename = [metadata_contents], [metadata_filename]
+            tips, _, x_coords, y_coords = circular_coordinates(tree)
+            tip_names = [clade.name.strip() if clade.name else None for clade in tips]
+            files = [(decode_uploaded_bytes(c), name) for c, name in zip(metadata_contents, metadata_filename)]
+            metadata_dict, datasets, search_table = load_tree_annotations(files, tip_names)
 
-            # Normalize tree taxa names
-            tree_taxa = {clade.name.strip(): clade.name.strip() for clade in tree.get_terminals() if clade.name}
-            fixed_metadata_dict = {tree_taxa.get(taxon, taxon): color for taxon, color in metadata_dict.items()}
+            # Key colours by the tree's own (unstripped) tip names
+            fixed_metadata_dict = {clade.name: metadata_dict[name] for clade, name in zip(tips, tip_names)
+                                   if name in metadata_dict}
 
             # Generate the circular tree plot
-            fig = plot_tree_circular(tree, fixed_metadata_dict)
-            return dcc.Graph(id='large-tree-graph', figure=fig)
+            fig = compact_figure(plot_tree_circular(tree, fixed_metadata_dict, datasets))
+
+            metadata_key = "-".join(hash_uploaded_contents(contents) for contents in metadata_contents)
+            search_key = f"circ-{tree_key}-{metadata_key}"
+            if get_search_view(search_key) is None:
+                cache_search_view(search_key, build_search_view(tree, x_coords, y_coords, search_table, polar=True))
+
+            return dcc.Graph(id='large-tree-graph', figure=fig), search_key, tip_label_radius(fig)
 
         except Exception as e:
-            return html.Div(f"Error processing tree file: {str(e)}", className="text-danger")
+            return error_message(f"Error processing tree file: {str(e)}"), None, None
+
+    @app.callback(
+        [Output('large-tree-graph', 'figure', allow_duplicate=True),
+        Output('large-tree-search-status', 'children')],
+        [Input('large-tree-search-input', 'value'),
+        Input('large-tree-search-key', 'data')],
+        prevent_initial_call=True
+    )
+    def search_large_tree(query, search_key):
+        """Highlights matching tips on the circular tree without re-rendering it."""
+        from utils.taxon_search import get_search_view
+        if not search_key:
+            raise PreventUpdate
+        view = get_search_view(search_key)
+        if view is None:
+            return no_update, VIEW_MISSING
+        return search_status(view, query)
+
+    @app.callback(
+        [Output('large-tree-graph', 'figure', allow_duplicate=True),
+        Output('large-tree-label-status', 'children')],
+        [Input('toggle-large-tip-labels', 'value'),
+        Input('large-tree-sector', 'value'),
+        Input('large-tree-search-key', 'data')],
+        [State('large-tree-label-radius', 'data')],
+        prevent_initial_call=True
+    )
+    def update_tip_labels(show_labels, sector, search_key, label_r):
+        """Shows the tip labels that fit the current sector, from the cached layout, without re-rendering the tree."""
+        from utils.taxon_search import get_search_view
+        if not search_key or label_r is None:
+            raise PreventUpdate
+        view = get_search_view(search_key)  # ✅ The stored layout, when another worker drew the tree
+        if view is None:
+            return no_update, VIEW_MISSING
+        return tip_label_status(view, 'SHOW' in (show_labels or []), sector, label_r)
 
     # 🔥 FIX: Correct SVG Export for Advanced Phylogenetic Tree
     @app.callback(
@@ -129,6 +332,7 @@ def register_tree_callbacks(app):
     )
     def export_large_tree_svg(n_clicks, figure):
         """Exports the large circular phylogenetic tree as an SVG file."""
+        import plotly.io as pio
         if not figure:
             raise PreventUpdate  # Ensure function does not execute if no tree is loaded
 
@@ -2,8 +2,7 @@ import os
 import logging
 import dotenv
 import certifi
-import ssl
-import urllib3
+import tempfile
 
 # ✅ Load environment variables from a .env file (if exists)
 dotenv.load_dotenv()
@@ -22,8 +21,22 @@ logger = logging.getLogger(__name__)
 # ✅ Secure SSL configuration
 os.environ['SSL_CERT_FILE'] = certifi.where()
 os.environ['SSL_CERT_DIR'] = certifi.where()
-ssl_context = ssl.create_default_context(cafile=certifi.where())
-http = urllib3.PoolManager(cert_reqs="CERT_REQUIRED", ca_certs=certifi.where())
+_clients = {}
+
+
+def __getattr__(name):
+    """`ssl_context` and `http` are built on first access (loading the CA bundle slows startup)."""
+    if name not in ('ssl_context', 'http'):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if name not in _clients:
+        if name == 'ssl_context':
+            import ssl
+            _clients[name] = ssl.create_default_context(cafile=certifi.where())
+        else:
+            import urllib3
+            _clients[name] = urllib3.PoolManager(cert_reqs="CERT_REQUIRED", ca_certs=certifi.where())
+    return _clients[name]
+
 
 # ✅ External API Keys (Load from Environment)
 OPENCAGE_API_KEY = os.getenv("OPENCAGE_API_KEY", "")
@@ -31,9 +44,37 @@ OPENCAGE_API_KEY = os.getenv("OPENCAGE_API_KEY", "")
 if not OPENCAGE_API_KEY:
     logger.warning("⚠️  OPENCAGE_API_KEY is missing! Geolocation features may not work.")
 
+# ✅ Geocoding cache and request limits
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", os.path.join(tempfile.gettempdir(), "snp_wf_geocode.sqlite"))
+GEOCODE_CACHE_TTL_DAYS = float(os.getenv("GEOCODE_CACHE_TTL_DAYS", 90))
+GEOCODE_NEGATIVE_TTL_DAYS = float(os.getenv("GEOCODE_NEGATIVE_TTL_DAYS", 1))
+GEOCODE_RATE_LIMIT = float(os.getenv("GEOCODE_RATE_LIMIT", 1))  # Requests per second (OpenCage free tier)
+GEOCODE_MAX_WORKERS = int(os.getenv("GEOCODE_MAX_WORKERS", 4))
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "")  # Offline place index built with `python -m utils.gazetteer`
+
 # ✅ Define Global App Settings
 APP_PORT = int(os.getenv("APP_PORT", 8051))  # Default port
 APP_DEBUG = os.getenv("APP_DEBUG", "True").lower() in ["true", "1"]
 
+# ✅ Where encoded alignments are kept between callbacks (shared by all workers on a host)
+ALIGNMENT_STORE_DIR = os.getenv("ALIGNMENT_STORE_DIR", os.path.join(tempfile.gettempdir(), "snp_wf_alignments"))
+SNP_MATRIX_STORE_DIR = os.getenv("SNP_MATRIX_STORE_DIR", os.path.join(tempfile.gettempdir(), "snp_wf_matrices"))
+VIEW_STORE_DIR = os.getenv("VIEW_STORE_DIR", os.path.join(tempfile.gettempdir(), "snp_wf_views"))
+# Uploaded alignments and stored views not opened for this long are removed whenever a new one is stored
+ALIGNMENT_STORE_MAX_AGE_DAYS = float(os.getenv("ALIGNMENT_STORE_MAX_AGE_DAYS", 7))
+
+# ✅ Server-side directory of ingested run bundles (`python -m utils.project_bundle <run_dir>`)
+PROJECT_DIR = os.getenv("PROJECT_DIR", "projects")
+
+# ✅ Callback instrumentation, exposed in Prometheus format at /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() in ["true", "1"]
+METRICS_MEMORY_SAMPLE_RATE = float(os.getenv("METRICS_MEMORY_SAMPLE_RATE", 0))  # Share of calls traced with tracemalloc
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile-Callback")  # Requests with this header are profiled...
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "False").lower() in ["true", "1"]  # ...only when this is on
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "snp_wf_profiles"))
+
+# ✅ Gzip callback and layout responses (turn off when a reverse proxy already compresses)
+COMPRESS_RESPONSES = os.getenv("COMPRESS_RESPONSES", "True").lower() in ["true", "1"]
+
 logger.info(f"🌍 App running on port {APP_PORT} (Debug mode: {APP_DEBUG})")
 
@@ -1,54 +1,72 @@
 from dash import dcc, html
 import dash_bootstrap_components as dbc
 
-advanced_phylo_tree_layout = dcc.Tab(label='Advanced Phylogenetic Tree', children=[
-    dbc.Container([
-        dbc.Row([
-            dbc.Col(html.H5("Upload a Large Tree File and Metadata", className="text-center", style={'color': 'white'}))
-        ]),
-        dbc.Row([
-            dbc.Col([
-                dcc.Upload(
-                    id='upload-large-tree',
-                    children=dbc.Button("Upload Large Tree File", color="primary", className="mt-2"),
-                    style={'width': '100%', 'height': '60px', 'lineHeight': '60px',
-                           'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
-                           'textAlign': 'center', 'margin': '10px'},
-                    multiple=False
-                ),
-                dcc.Upload(
-                    id='upload-large-metadata',
-                    children=dbc.Button("Upload Metadata File", color="primary", className="mt-2"),
-                    style={'width': '100%', 'height': '60px', 'lineHeight': '60px',
-                           'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
-                           'textAlign': 'center', 'margin': '10px'},
-                    multiple=False
-                ),
-                dcc.Checklist(
-                    id='toggle-large-tip-labels',
-                    options=[{'label': 'Show Tip Labels', 'value': 'SHOW'}],
-                    value=[],  
-                    style={"marginTop": "10px"}
-                ),
-                dcc.Dropdown(
-                    id='color-by-metadata',
-                    options=[],
-                    placeholder='Color by Metadata Column...',
-                    className="mt-2"
-                ),
-            ], width=12)
-        ]),
-        dbc.Row([
-            dbc.Col(html.Div(id='large-tree-graph-container'), width=12),
-        ]),
-        html.Br(),
 
-        # 🔥 FIX: Change Download Button & Download Component IDs
-        dbc.Row([
-            dbc.Col([
-                dbc.Button("Download Tree as SVG", id="download-large-svg-btn", color="success", className="mt-3"),
-                dcc.Download(id="download-large-svg")
-            ], width=12, className="d-flex justify-content-center"),
+def advanced_phylo_tree_layout():
+    """Contents of the Advanced Phylogenetic Tree tab, built the first time the tab is opened."""
+    return [
+        dbc.Container([
+            dbc.Row([
+                dbc.Col(html.H5("Upload a Large Tree File and Metadata", className="text-center", style={'color': 'white'}))
+            ]),
+            dbc.Row([
+                dbc.Col([
+                    dcc.Upload(
+                        id='upload-large-tree',
+                        children=dbc.Button("Upload Large Tree File", color="primary", className="mt-2"),
+                        style={'width': '100%', 'height': '60px', 'lineHeight': '60px',
+                               'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
+                               'textAlign': 'center', 'margin': '10px'},
+                        multiple=False
+                    ),
+                    dcc.Upload(
+                        id='upload-large-metadata',
+                        children=dbc.Button("Upload Metadata / iTOL Dataset Files", color="primary", className="mt-2"),
+                        style={'width': '100%', 'height': '60px', 'lineHeight': '60px',
+                               'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
+                               'textAlign': 'center', 'margin': '10px'},
+                        multiple=True
+                    ),
+                    dcc.Checklist(
+                        id='toggle-large-tip-labels',
+                        options=[{'label': 'Show Tip Labels', 'value': 'SHOW'}],
+                        value=[],  
+                        style={"marginTop": "10px"}
+                    ),
+                    html.Label("Zoom to Sector (degrees); narrower sectors show more tip labels:",
+                               style={'color': 'white', 'marginTop': '10px'}),
+                    dcc.RangeSlider(
+                        id='large-tree-sector',
+                        min=0, max=360, step=5, value=[0, 360],
+                        marks={angle: f"{angle}°" for angle in range(0, 361, 45)},
+                        allowCross=False
+                    ),
+                    html.Div(id='large-tree-label-status', style={'color': 'white', 'marginTop': '5px'}),
+                    dcc.Store(id='large-tree-label-radius'),
+                    dcc.Dropdown(
+                        id='color-by-metadata',
+                        options=[],
+                        placeholder='Color by Metadata Column...',
+                        className="mt-2"
+                    ),
+                    dcc.Input(id='large-tree-search-input', type='text', debounce=0.2,
+                              placeholder='Search taxa or metadata...',
+                              className="mt-2", style={'width': '100%'}),
+                    html.Div(id='large-tree-search-status', style={'color': 'white', 'marginTop': '5px'}),
+                    dcc.Store(id='large-tree-search-key'),
+                ], width=12)
+            ]),
+            dbc.Row([
+                dbc.Col(html.Div(id='large-tree-graph-container'), width=12),
+            ]),
+            html.Br(),
+
+            # 🔥 FIX: Change Download Button & Download Component IDs
+            dbc.Row([
+                dbc.Col([
+                    dbc.Button("Download Tree as SVG", id="download-large-svg-btn", color="success", className="mt-3"),
+                    dcc.Download(id="download-large-svg")
+                ], width=12, className="d-flex justify-content-center"),
+            ])
         ])
-    ])
-])
+    ]
@@ -32,13 +32,19 @@ how_to_use_content = dbc.Container([
     html.P("Follow these steps to use the application effectively:"),
     html.Ol([
         html.Li("Upload a fasta file in the MSA Visualization tab."),
+        html.Li("Click the alignment overview or use the sliders to move the MSA window through large alignments."),
         html.Li("Upload a Newick tree file in the Phylogenetic Tree Visualization tab."),
         html.Li("Upload a corresponding metadata file for additional information."),
         html.Li("Toggle the tip labels to show or hide tree node names."),
-        html.Li("Upload a SNP Distance Matrix TSV file for SNP distance heatmap.")
+        html.Li("Upload a SNP Distance Matrix TSV file for SNP distance heatmap."),
+        html.Li("Open the Sample Map tab to see where the samples in the uploaded metadata come from."),
+        html.Li("Type in the tree search box to highlight matching taxa (by name or metadata value) and their common clade."),
+        html.Li("Upload several Newick trees in the Tree Comparison tab for RF distances, split support and a tanglegram."),
+        html.Li("In the Advanced Phylogenetic Tree tab, upload one or more iTOL dataset files (colour strip, binary, heatmap, bar) to draw them as rings."),
+        html.Li("Pick an ingested run in the Project selector above the tabs to load its tree, SNP matrix, alignment and metadata at once; clear it to use uploaded files again.")
     ]),
 
-    html.P("The metadata file for uploading in the Phylogenetic Tree Visualization tab must be a tab-delimited text file with the following columns:"),
+    html.P("The metadata file for uploading in the Phylogenetic Tree Visualization tab must be a tab- or comma-delimited text file or an Excel sheet with the following columns:"),
     html.Ol([
         html.Li("taxa"),
         html.Li("date (optional)"),
@@ -68,5 +74,5 @@ how_to_use_content = dbc.Container([
 
 
 # Exporting the layouts
-about_tab = dcc.Tab(label='About', children=[about_content])
-how_to_use_tab = dcc.Tab(label='How to Use', children=[how_to_use_content])
\ No newline at end of file
+about_tab = dcc.Tab(label='About', value='about', children=[about_content])
+how_to_use_tab = dcc.Tab(label='How to Use', value='how-to-use', children=[how_to_use_content])
\ No newline at end of file
@@ -4,7 +4,26 @@ from .msa_layout import msa_layout
 from .phylo_tree_layout import phylo_tree_layout
 from .snp_heatmap_layout import snp_heatmap_layout
 from .advanced_phylo_tree_layout import advanced_phylo_tree_layout  # ✅ Import the tab
+from .sample_map_layout import sample_map_layout
+from .tree_comparison_layout import tree_comparison_layout
 from .info_layout import about_tab, how_to_use_tab
+from .project_layout import project_selector
+from .selection_layout import selection_bar
+
+# ✅ Tabs whose contents are only sent once the tab is first selected (see callbacks/layout_callbacks.py).
+# The MSA and tree tabs stay in the initial layout: the other tabs read the tree and metadata uploads.
+LAZY_TABS = {
+    'advanced-tree': ('Advanced Phylogenetic Tree', advanced_phylo_tree_layout),
+    'tree-comparison': ('Tree Comparison', tree_comparison_layout),
+    'snp-heatmap': ('SNP Distance Heatmap', snp_heatmap_layout),
+    'sample-map': ('Sample Map', sample_map_layout),
+}
+
+
+def lazy_tab(value):
+    label, _ = LAZY_TABS[value]
+    return dcc.Tab(label=label, value=value, children=html.Div(id=f'tab-body-{value}'))
+
 
 app_layout = dbc.Container([
     dbc.NavbarSimple(
@@ -13,11 +32,15 @@ app_layout = dbc.Container([
         color="primary",
         dark=True,
     ),
-    dcc.Tabs([
+    project_selector,
+    selection_bar,
+    dcc.Tabs(id='main-tabs', value='msa', children=[
         msa_layout,
         phylo_tree_layout,
-        advanced_phylo_tree_layout,  # ✅ Add the "Advanced Phylogenetic Tree" tab
-        snp_heatmap_layout,
+        lazy_tab('advanced-tree'),  # ✅ Add the "Advanced Phylogenetic Tree" tab
+        lazy_tab('tree-comparison'),
+        lazy_tab('snp-heatmap'),
+        lazy_tab('sample-map'),
         about_tab,
         how_to_use_tab
     ],
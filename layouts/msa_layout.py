@@ -1,7 +1,7 @@
 from dash import dcc, html
 import dash_bootstrap_components as dbc
 
-msa_layout = dcc.Tab(label='MSA Visualization', children=[
+msa_layout = dcc.Tab(label='MSA Visualization', value='msa', children=[
     dbc.Container([
         dbc.Row([
             dbc.Col(html.H5("Upload a FASTA File to Visualize MSA", className="text-center", style={'color': 'white'}))
@@ -18,7 +18,9 @@ msa_layout = dcc.Tab(label='MSA Visualization', children=[
                     },
                     multiple=False
                 ),
-                html.Div(id='output-alignment-chart', className="mt-4"),
+                # ✅ Key of the server-side encoded alignment (the FASTA itself never goes back to the browser)
+                dcc.Store(id='msa-alignment-key'),
+                html.Div(id='msa-alignment-summary', className="mt-2"),
                 dcc.Dropdown(
                     id='alignment-colorscale',
                     options=[
@@ -30,7 +32,73 @@ msa_layout = dcc.Tab(label='MSA Visualization', children=[
                     placeholder="Select Color Scale",
                     className="mt-2"
                 ),
+                # ✅ Only draw polymorphic columns (original coordinates are kept on the axis)
+                dcc.Checklist(
+                    id='msa-variable-sites-only',
+                    options=[{'label': 'Variable Sites Only', 'value': 'VARIABLE'}],
+                    value=[],
+                    style={"marginTop": "10px", 'color': 'white'}
+                ),
+                # ✅ Per-column summary tracks drawn above the alignment window
+                dcc.Checklist(
+                    id='msa-tracks',
+                    options=[
+                        {'label': 'Consensus', 'value': 'consensus'},
+                        {'label': 'Entropy', 'value': 'entropy'},
+                        {'label': 'Gap Fraction', 'value': 'gap_fraction'},
+                        {'label': 'Coverage', 'value': 'coverage'}
+                    ],
+                    value=['consensus', 'entropy', 'gap_fraction', 'coverage'],
+                    inline=True,
+                    inputStyle={'marginRight': '5px', 'marginLeft': '10px'},
+                    style={"marginTop": "10px", 'color': 'white'}
+                ),
             ], width=12)
-        ])
+        ]),
+
+        # Overview of the whole alignment; click to jump the window
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='msa-overview-graph', style={'display': 'none'}), width=12),
+        ]),
+
+        # Window controls
+        dbc.Row([
+            dbc.Col([
+                html.Label("Window Width (columns):", style={'color': 'white'}),
+                dcc.Dropdown(
+                    id='msa-window-width',
+                    options=[{'label': str(n), 'value': n} for n in [50, 100, 200, 500, 1000]],
+                    value=100,
+                    clearable=False,
+                    style={'color': '#000000', 'backgroundColor': '#ffffff'}
+                ),
+            ], width=6),
+            dbc.Col([
+                html.Label("Window Height (sequences):", style={'color': 'white'}),
+                dcc.Dropdown(
+                    id='msa-window-rows',
+                    options=[{'label': str(n), 'value': n} for n in [10, 25, 50, 100]],
+                    value=25,
+                    clearable=False,
+                    style={'color': '#000000', 'backgroundColor': '#ffffff'}
+                ),
+            ], width=6),
+        ], className="mt-2"),
+        dbc.Row([
+            dbc.Col([
+                html.Label("First Column:", style={'color': 'white'}),
+                dcc.Slider(id='msa-column-start', min=0, max=0, step=1, value=0,
+                           marks=None, tooltip={'placement': 'bottom'}, updatemode='mouseup'),
+            ], width=12),
+            dbc.Col([
+                html.Label("First Sequence:", style={'color': 'white'}),
+                dcc.Slider(id='msa-row-start', min=0, max=0, step=1, value=0,
+                           marks=None, tooltip={'placement': 'bottom'}, updatemode='mouseup'),
+            ], width=12),
+        ], className="mt-2"),
+
+        dbc.Row([
+            dbc.Col(html.Div(id='output-alignment-chart', className="mt-4"), width=12),
+        ]),
     ])
 ])
@@ -1,10 +1,12 @@
 from dash import dcc, html
 import dash_bootstrap_components as dbc
 
-phylo_tree_layout = dcc.Tab(label='Phylogenetic Tree Visualization', children=[
+phylo_tree_layout = dcc.Tab(label='Phylogenetic Tree Visualization', value='tree', children=[
     dbc.Container([
         dbc.Row([
-            dbc.Col(html.H5("Upload a Newick Tree File, Metadata File, and Optional Color Map", className="text-center", style={'color': 'white'}))
+            dbc.Col(html.H5("Upload a Newick Tree File, Metadata File, and Optional Color Map", className="text-center", style={'color': 'white'})),
+            dbc.Col(html.P("Without a tree file, a tree built from the SNP matrix (SNP Distance Heatmap tab) is shown.",
+                           className="text-center", style={'color': 'white'}), width=12)
         ]),
 
         # Upload Section
@@ -91,6 +93,17 @@ phylo_tree_layout = dcc.Tab(label='Phylogenetic Tree Visualization', children=[
         ]),
 
         html.Hr(),  # Horizontal Lin
+        # ✅ Taxon search: highlights matching tips and their smallest enclosing clade
+        dbc.Row([
+            dbc.Col([
+                dcc.Input(id='tree-search-input', type='text', debounce=0.2,
+                          placeholder='Search taxa or metadata (e.g. a name, location or MLST)...',
+                          style={'width': '100%'}),
+                html.Div(id='tree-search-status', style={'color': 'white', 'marginTop': '5px'}),
+                dcc.Store(id='tree-search-key'),
+                dcc.Store(id='nj-tree-key'),  # ✅ SNP matrix whose NJ tree replaces a missing Newick upload
+            ], width=12)
+        ]),
         # Phylogenetic Tree Graph Display
         dbc.Row([
             dbc.Col(html.Div(id='tree-graph-container'), width=12),
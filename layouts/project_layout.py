@@ -0,0 +1,13 @@
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+
+# ✅ Project selector shown above all tabs: a selected bundle replaces the uploads in every tab
+project_selector = dbc.Row([
+    dbc.Col(html.Label("Project:", style={'color': 'white'}), width="auto", className="pt-2"),
+    dbc.Col(dcc.Dropdown(id='project-bundle', options=[], placeholder="Use uploaded files",
+                         style={'color': '#000000', 'backgroundColor': '#ffffff'}),
+            className="dbc", width=4),
+    dbc.Col(dbc.Button("Refresh", id='project-refresh', color="secondary", size="sm", className="mt-1"),
+            width="auto"),
+    dbc.Col(html.Div(id='project-summary', style={'color': 'white'}, className="pt-2")),
+], className="my-2")
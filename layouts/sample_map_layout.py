@@ -0,0 +1,23 @@
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+
+
+def sample_map_layout():
+    """Contents of the Sample Map tab, built the first time the tab is opened."""
+    return [
+        dbc.Container([
+            dbc.Row([
+                dbc.Col(html.H5("Sample Locations from the Metadata File", className="text-center", style={'color': 'white'}))
+            ]),
+            dbc.Row([
+                dbc.Col(html.P("Upload a metadata file with a 'location' column in the Phylogenetic Tree Visualization tab. "
+                               "Samples from the same place are grouped into one point; click a point for its breakdown.",
+                               className="text-center", style={'color': 'white'}))
+            ]),
+            dbc.Row([
+                dbc.Col(dcc.Loading(html.Div(id='sample-map-container', className="mt-4")), width=12),
+            ]),
+            dcc.Store(id='sample-map-key'),
+            dcc.Store(id='sample-map-selection'),
+        ])
+    ]
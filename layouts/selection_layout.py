@@ -0,0 +1,12 @@
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+
+# ✅ Shared sample selection shown above all tabs: a lasso selection in one view highlights the same
+# samples in every other one (see utils/sample_selection.py)
+selection_bar = dbc.Row([
+    dbc.Col(html.Div(id='sample-selection-status', style={'color': 'white'}, className="pt-1")),
+    dbc.Col(dbc.Button("Clear Selection", id='clear-sample-selection', color="secondary", size="sm"),
+            width="auto"),
+    dcc.Store(id='sample-index-sources', data={}),
+    dcc.Store(id='sample-selection'),
+], className="mb-2")
@@ -1,57 +1,93 @@
 from dash import dcc, html
 import dash_bootstrap_components as dbc
 
-snp_heatmap_layout = dcc.Tab(label='SNP Distance Heatmap', children=[
-    dbc.Container([
-        dbc.Row([
-            dbc.Col(html.H5("Upload SNP Distance Matrix to Generate Heatmap", className="text-center", style={'color': 'white'}))
-        ]),
-        dbc.Row([
-            dbc.Col([
-                dcc.Upload(
-                    id='upload-snp-matrix',
-                    children=dbc.Button("Select SNP Matrix File", color="primary", className="mt-2"),
-                    style={
-                        'width': '100%', 'height': '60px', 'lineHeight': '60px',
-                        'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
-                        'textAlign': 'center', 'margin': '10px'
-                    },
-                    multiple=False
-                ),
 
-            dbc.Col([
-                html.Label("Select Color Palette for Location Labels:", style={'color': 'white'}),
-                dcc.Dropdown(
-                    id='color-palette-dropdown-heatmap',
-                    options=[
-                        {'label': 'Viridis', 'value': 'viridis'},
-                        {'label': 'Plasma', 'value': 'plasma'},
-                        {'label': 'Inferno', 'value': 'inferno'},
-                        {'label': 'Magma', 'value': 'magma'},
-                        {'label': 'Cividis', 'value': 'cividis'},
-                        {'label': 'Turbo', 'value': 'turbo'},
-                        {'label': 'Blues', 'value': 'blues'},
-                        {'label': 'Greens', 'value': 'greens'},
-                        {'label': 'Oranges', 'value': 'oranges'},
-                        {'label': 'Reds', 'value': 'reds'},
-                        {'label': 'Blackbody', 'value': 'blackbody'},
-                        {'label': 'Rainbow', 'value': 'rainbow'},
-                        {'label': 'Electric', 'value': 'electric'},
-                        {'label': 'Hot', 'value': 'hot'}
-                    ],
-                    value='viridis',
-                    clearable=False,
-                    style={'color': '#000000', 'backgroundColor': '#ffffff'}
-                ),
+def snp_heatmap_layout():
+    """Contents of the SNP Distance Heatmap tab, built the first time the tab is opened."""
+    return [
+        dbc.Container([
+            dbc.Row([
+                dbc.Col(html.H5("Upload SNP Distance Matrix to Generate Heatmap", className="text-center", style={'color': 'white'}))
+            ]),
+            dbc.Row([
+                dbc.Col([
+                    dcc.Upload(
+                        id='upload-snp-matrix',
+                        children=dbc.Button("Select SNP Matrix File", color="primary", className="mt-2"),
+                        style={
+                            'width': '100%', 'height': '60px', 'lineHeight': '60px',
+                            'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
+                            'textAlign': 'center', 'margin': '10px'
+                        },
+                        multiple=False
+                    ),
+                    dcc.Upload(
+                        id='upload-snp-labels',
+                        children=dbc.Button("Select Label File", color="secondary", className="mt-2"),
+                        style={
+                            'width': '100%', 'height': '60px', 'lineHeight': '60px',
+                            'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
+                            'textAlign': 'center', 'margin': '10px'
+                        },
+                        multiple=False
+                    ),
+                    html.P("snp-dists text (.tsv/.csv), .npy with a label file (one sample name per line), an exported "
+                           ".zip, Parquet/Arrow or HDF5.", style={'color': 'white'}),
+                    dcc.Store(id='snp-matrix-key'),
 
-            ], width=6),
+                dbc.Col([
+                    html.Label("Select Color Palette for Location Labels:", style={'color': 'white'}),
+                    dcc.Dropdown(
+                        id='color-palette-dropdown-heatmap',
+                        options=[
+                            {'label': 'Viridis', 'value': 'viridis'},
+                            {'label': 'Plasma', 'value': 'plasma'},
+                            {'label': 'Inferno', 'value': 'inferno'},
+                            {'label': 'Magma', 'value': 'magma'},
+                            {'label': 'Cividis', 'value': 'cividis'},
+                            {'label': 'Turbo', 'value': 'turbo'},
+                            {'label': 'Blues', 'value': 'blues'},
+                            {'label': 'Greens', 'value': 'greens'},
+                            {'label': 'Oranges', 'value': 'oranges'},
+                            {'label': 'Reds', 'value': 'reds'},
+                            {'label': 'Blackbody', 'value': 'blackbody'},
+                            {'label': 'Rainbow', 'value': 'rainbow'},
+                            {'label': 'Electric', 'value': 'electric'},
+                            {'label': 'Hot', 'value': 'hot'}
+                        ],
+                        value='viridis',
+                        clearable=False,
+                        style={'color': '#000000', 'backgroundColor': '#ffffff'}
+                    ),
 
+                ], width=6),
 
-                html.Div(id='snp-heatmap-container', className="mt-4"),
-                html.Hr(),
-                html.H5("SNP Distance Matrix Table", className="text-center mt-4", style={'color': 'white'}),
-                html.Div(id='snp-table-container', className="mt-4"),
-            ], width=12)
+
+                    html.Div(id='snp-heatmap-container', className="mt-4"),
+                    html.Hr(),
+                    html.H5("SNP Distance Matrix Table", className="text-center mt-4", style={'color': 'white'}),
+                    html.Div(id='snp-table-container', className="mt-4"),
+                    dbc.Button("Export Matrix (.zip)", id='snp-export-btn', color="success", className="mt-2"),
+                    dcc.Download(id='download-snp-matrix'),
+                    dbc.Button("Build Neighbor-Joining Tree", id='build-nj-tree-btn', color="primary", className="mt-2 ms-2"),
+                    dcc.Loading(html.Div(id='nj-tree-status', className="mt-2", style={'color': 'white'})),
+                    html.Hr(),
+                    html.H5("Minimum Spanning Network", className="text-center mt-4", style={'color': 'white'}),
+                    html.P("Isolates with identical SNP profiles are merged into one node, sized by isolate count; "
+                           "nodes are colored by the metadata uploaded in the Phylogenetic Tree Visualization tab.",
+                           className="text-center", style={'color': 'white'}),
+                    dcc.Dropdown(
+                        id='snp-mst-color-by',
+                        placeholder='Color nodes by metadata column...',
+                        style={'color': '#000000', 'backgroundColor': '#ffffff'}
+                    ),
+                    dcc.Loading(html.Div(id='snp-mst-container', className="mt-4")),
+                    html.Hr(),
+                    html.H5("Tree vs SNP Distance Consistency", className="text-center mt-4", style={'color': 'white'}),
+                    html.P("Compares patristic distances in the tree uploaded in the Phylogenetic Tree Visualization tab "
+                           "with this SNP matrix.", className="text-center", style={'color': 'white'}),
+                    dcc.Loading(html.Div(id='snp-consistency-container', className="mt-4")),
+                ], width=12)
+            ])
         ])
-    ])
-])
+    ]
@@ -0,0 +1,47 @@
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+
+
+def tree_comparison_layout():
+    """Contents of the Tree Comparison tab, built the first time the tab is opened."""
+    return [
+        dbc.Container([
+            dbc.Row([
+                dbc.Col(html.H5("Compare Several Newick Trees (callers, bootstrap replicates or runs)", className="text-center", style={'color': 'white'}))
+            ]),
+            dbc.Row([
+                dbc.Col([
+                    dcc.Upload(
+                        id='upload-compare-trees',
+                        children=dbc.Button("Select Tree Files", color="primary", className="mt-2"),
+                        style={'width': '100%', 'height': '60px', 'lineHeight': '60px',
+                               'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
+                               'textAlign': 'center', 'margin': '10px'},
+                        multiple=True
+                    ),
+                    dcc.Store(id='compare-trees-key'),
+                    html.Div(id='compare-trees-summary', style={'color': 'white'}),
+                ], width=12)
+            ]),
+            dbc.Row([
+                dbc.Col([
+                    html.Label("Displayed Tree:", style={'color': 'white'}),
+                    dcc.Dropdown(id='compare-reference-tree', options=[], clearable=False,
+                                 style={'color': '#000000', 'backgroundColor': '#ffffff'}),
+                ], className="dbc", width=6),
+                dbc.Col([
+                    html.Label("Compare With (Tanglegram):", style={'color': 'white'}),
+                    dcc.Dropdown(id='compare-second-tree', options=[], clearable=False,
+                                 style={'color': '#000000', 'backgroundColor': '#ffffff'}),
+                ], className="dbc", width=6),
+            ]),
+            html.Hr(),
+            dbc.Row([
+                dbc.Col(dcc.Loading(html.Div(id='tree-distance-container')), width=12),
+            ]),
+            dbc.Row([
+                dbc.Col(dcc.Loading(html.Div(id='tree-support-container')), width=6),
+                dbc.Col(dcc.Loading(html.Div(id='tanglegram-container')), width=6),
+            ]),
+        ])
+    ]
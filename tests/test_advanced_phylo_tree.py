@@ -0,0 +1,90 @@
+import io
+
+import numpy as np
+import pytest
+from Bio import Phylo
+
+from utils.advanced_phylo_tree import (FULL_CIRCLE, LABEL_CIRCLE_PX, LABEL_SPACING_PX, RING_WIDTH, circular_coordinates,
+                                       dataset_ring_traces, sector_zoom, visible_tip_labels)
+from utils.itol import parse_itol
+from utils.synthetic_data import newick_tree
+
+TIPS = ['A', 'B', 'C']
+
+
+def _rings(text):
+    datasets = parse_itol(io.StringIO(text), TIPS)
+    traces, _ = dataset_ring_traces(datasets, np.linspace(0, np.pi, len(TIPS)), TIPS, 1.0)
+    return traces
+
+
+def test_heatmap_color_range_follows_the_data():
+    traces = _rings("DATASET_HEATMAP\nSEPARATOR TAB\nFIELD_LABELS\tf1\nDATA\nA\t5\nB\t7.5\nC\t10\n")
+    assert (traces[0].marker.cmin, traces[0].marker.cmax) == pytest.approx((5, 10))
+
+    traces = _rings("DATASET_HEATMAP\nSEPARATOR TAB\nFIELD_LABELS\tf1\nDATA\nA\t0.01\nB\t0.1\nC\t0.2\n")
+    assert (traces[0].marker.cmin, traces[0].marker.cmax) == pytest.approx((0.01, 0.2))
+
+
+def test_negative_bars_are_drawn():
+    traces = _rings("DATASET_SIMPLEBAR\nSEPARATOR TAB\nDATA\nA\t-1\nB\t-4\nC\t-2\n")
+    assert len(traces[0].theta) == 3
+    assert max(traces[0].r) == pytest.approx(3 * RING_WIDTH)
+
+
+def _label_sides(angles, shown, sector):
+    """Sorted baselines (px) of the shown labels on each side of the circle."""
+    radius = LABEL_CIRCLE_PX * sector_zoom(sector)
+    theta = angles[shown]
+    return [np.sort(radius * np.sin(theta[side])) for side in (np.cos(theta) >= 0, np.cos(theta) < 0)]
+
+
+def test_sector_zoom():
+    assert sector_zoom(FULL_CIRCLE) == 1.0
+    assert sector_zoom((0, 180)) == pytest.approx(1.0)
+    assert sector_zoom((0, 90)) == pytest.approx(2.0)
+    assert sector_zoom((45, 135)) == pytest.approx(np.sqrt(2))
+    assert sector_zoom((30, 60)) > sector_zoom((0, 90))  # The plot also spans the centre of the circle
+
+
+@pytest.mark.parametrize('sector', [FULL_CIRCLE, (0, 180), (45, 135), (0, 30), (200, 205)])
+def test_visible_tip_labels_do_not_overlap(sector):
+    angles = np.linspace(0, 2 * np.pi, 10_000, endpoint=False)
+    shown = visible_tip_labels(angles, sector)
+    assert len(shown) > 0
+    assert np.all(np.degrees(angles[shown]) >= sector[0]) and np.all(np.degrees(angles[shown]) < sector[1])
+    for baselines in _label_sides(angles, shown, sector):
+        assert np.all(np.diff(baselines) >= LABEL_SPACING_PX - 1e-9)
+
+    # Candidates are limited by the arc length in pixels, not by the 10,000 tips
+    radius = LABEL_CIRCLE_PX * sector_zoom(sector)
+    assert len(shown) <= np.radians(sector[1] - sector[0]) * radius / LABEL_SPACING_PX + 1
+
+
+def test_narrower_sectors_show_more_labels():
+    angles = np.linspace(0, 2 * np.pi, 10_000, endpoint=False)
+    in_view = lambda shown, end: int(np.count_nonzero(np.degrees(angles[shown]) < end))
+    full = visible_tip_labels(angles, FULL_CIRCLE)
+    quarter = visible_tip_labels(angles, (0, 90))
+    slice_ = visible_tip_labels(angles, (0, 30))
+    assert in_view(full, 30) < in_view(quarter, 30) <= len(slice_)
+    assert visible_tip_labels(np.radians([10.0, 60.0, 200.0]), FULL_CIRCLE).tolist() == [0, 1, 2]  # Few tips: all shown
+
+
+def test_circular_coordinates():
+    tree = Phylo.read(io.StringIO("((a:1,b:2):1,c:3);"), 'newick')
+    leaves, leaf_angles, theta, radius = circular_coordinates(tree)
+    ab = tree.common_ancestor('a', 'b')
+    assert [leaf.name for leaf in leaves] == ['a', 'b', 'c']
+    assert [leaf_angles[leaf] for leaf in leaves] == pytest.approx([0, 2 * np.pi / 3, 4 * np.pi / 3])
+    assert theta[ab] == pytest.approx(np.pi / 3)
+    assert theta[tree.root] == pytest.approx(5 * np.pi / 6)
+    assert [radius[c] for c in (tree.root, ab, *leaves)] == pytest.approx([0, 13 / 3, 26 / 3, 13, 13])
+
+
+def test_circular_coordinates_of_a_deep_ladder():
+    tree = Phylo.read(io.StringIO(newick_tree(3000, 'ladder')), 'newick')
+    leaves, _, theta, radius = circular_coordinates(tree)
+    assert len(leaves) == 3000
+    assert max(radius.values()) == pytest.approx(13)
+    assert all(0 <= angle < 2 * np.pi for angle in theta.values())
@@ -0,0 +1,31 @@
+import os
+import time
+
+from utils import alignment_store
+from utils.alignment_store import build_alignment_store, get_alignment, prune_alignment_stores
+from utils.lru_cache import LRUCache
+
+FASTA = b">s1\nACGT\n>s2\nAC-T\n"
+
+
+def test_unused_stores_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(alignment_store, 'store_path', lambda key: str(tmp_path / key))
+    for key in ('old', 'used'):
+        build_alignment_store(key, FASTA, directory=str(tmp_path / key))
+    week_ago = time.time() - 8 * 24 * 60 * 60
+    for key in ('old', 'used'):
+        os.utime(tmp_path / key / 'meta.json', (week_ago, week_ago))
+    get_alignment('used')  # Opening a store marks it as in use
+
+    assert prune_alignment_stores(7, str(tmp_path)) == 1
+    assert sorted(os.listdir(tmp_path)) == ['used']
+    assert prune_alignment_stores(0, str(tmp_path)) == 0
+
+
+def test_open_stores_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(alignment_store, 'store_path', lambda key: str(tmp_path / key))
+    monkeypatch.setattr(alignment_store, '_OPEN_STORES', LRUCache('alignment', alignment_store.OPEN_STORE_CACHE_SIZE))
+    for k in range(alignment_store.OPEN_STORE_CACHE_SIZE + 3):
+        build_alignment_store(f"a{k}", FASTA, directory=str(tmp_path / f"a{k}"))
+        assert get_alignment(f"a{k}").sequence('s2') == 'AC-T'
+    assert len(alignment_store._OPEN_STORES) == alignment_store.OPEN_STORE_CACHE_SIZE
@@ -0,0 +1,24 @@
+import os
+
+import numpy as np
+
+from utils import alignment_tracks
+from utils.alignment_tracks import TRACK_CACHE_SIZE, TRACK_NAMES, get_alignment_tracks
+from utils.lru_cache import LRUCache
+
+
+def test_tracks_are_saved_whole_and_cached_in_a_bounded_lru(tmp_path, monkeypatch):
+    monkeypatch.setattr(alignment_tracks, 'store_path', lambda key: str(tmp_path / key))
+    monkeypatch.setattr(alignment_tracks, '_TRACK_CACHE', LRUCache('alignment_tracks', TRACK_CACHE_SIZE))
+    matrix = np.frombuffer(b"ACGTAC-ACGTNNA", dtype=np.uint8).reshape(2, 7)
+
+    for k in range(TRACK_CACHE_SIZE + 2):
+        os.makedirs(tmp_path / f"a{k}")
+        tracks = get_alignment_tracks(f"a{k}", matrix)
+        assert sorted(os.listdir(tmp_path / f"a{k}")) == ['tracks.npz']  # No temporary file left behind
+    assert len(alignment_tracks._TRACK_CACHE) == TRACK_CACHE_SIZE
+    assert bytes(tracks['consensus'][:4]) == b'ACGT'
+
+    alignment_tracks._TRACK_CACHE.pop('a3')
+    reloaded = get_alignment_tracks('a3', matrix)  # Read back from tracks.npz
+    assert all(np.array_equal(reloaded[name], tracks[name]) for name in TRACK_NAMES)
@@ -0,0 +1,36 @@
+import json
+
+from flask import Flask
+
+from utils import callback_metrics
+from utils.callback_metrics import ERROR_HEADER, error_message, instrument
+
+
+def _failing():
+    return json.dumps({'response': {'out': {'children': error_message('Error processing file: boom').to_plotly_json()}}},
+                      default=str)
+
+
+def test_error_messages_count_as_errors():
+    def working():
+        return json.dumps({'response': {'out': {'children': 'fine'}}})
+
+    def warning():
+        return json.dumps({'response': {'out': {'children': {
+            'props': {'children': 'Mentions text-danger but is no error', 'className': 'text-warning'}}}}})
+
+    instrument(_failing, 'test_failing')()
+    instrument(working, 'test_working')()
+    instrument(warning, 'test_warning')()
+    assert dict(callback_metrics._callbacks['test_failing'].outcomes) == {'error': 1}
+    assert dict(callback_metrics._callbacks['test_working'].outcomes) == {'ok': 1}
+    assert dict(callback_metrics._callbacks['test_warning'].outcomes) == {'ok': 1}
+
+
+def test_error_messages_set_the_error_header():
+    app = Flask(__name__)
+    app.add_url_rule('/fail', 'fail', instrument(_failing, 'test_header_failing'))
+    app.add_url_rule('/ok', 'ok', instrument(lambda: 'fine', 'test_header_ok'))
+    client = app.test_client()
+    assert client.get('/fail').headers.get(ERROR_HEADER) == '1'
+    assert ERROR_HEADER not in client.get('/ok').headers
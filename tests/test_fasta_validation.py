@@ -0,0 +1,48 @@
+import io
+
+import pytest
+
+from utils.fasta_validation import FastaValidationError, FastaValidator, iter_fasta_records
+
+
+def validate(text, block_size=8):
+    validator = FastaValidator(max_problems=5)
+    for name, sequence in iter_fasta_records(io.BytesIO(text), block_size=block_size):
+        validator.add(name, sequence)
+    return validator.report()
+
+
+def test_records_are_split_across_small_blocks():
+    text = b">s1 first\nACGT\nAC\n>s2\nAC-TNN\n\n>s3\nacgtac\n"
+    records = list(iter_fasta_records(io.BytesIO(text), block_size=3))
+    assert records == [('s1', b'ACGTAC'), ('s2', b'AC-TNN'), ('s3', b'acgtac')]
+
+
+def test_statistics_of_a_valid_alignment():
+    report = validate(b">s1\nACGTAC\n>s2\nAC-TNN\n")
+    assert report.ok and report.n_sequences == 2 and report.alignment_length == 6
+    assert report.gap_counts.tolist() == [0, 1]
+    assert report.n_counts.tolist() == [0, 2]
+    assert report.completeness.tolist() == pytest.approx([1.0, 0.5])
+
+
+def test_problems_are_reported():
+    report = validate(b">s1\nACGT\n>s1\nACGT\n>s3\nAC1T\n>s4\nACG\n>\nACGT\n")
+    assert not report.ok
+    assert report.n_problems == 4
+    assert any("duplicate name 's1'" in p for p in report.problems)
+    assert any("invalid characters '1'" in p for p in report.problems)
+    assert any("length 3 differs" in p for p in report.problems)
+    assert any("empty header" in p for p in report.problems)
+
+
+def test_problem_list_is_capped():
+    text = b"".join(b">s%d\nA%s\n" % (i, b"C" * i) for i in range(10))
+    report = validate(text)
+    assert report.n_problems == 9
+    assert len(report.problems) == 5
+
+
+def test_data_before_the_first_header_is_rejected():
+    with pytest.raises(FastaValidationError, match="before the first"):
+        list(iter_fasta_records(io.BytesIO(b"ACGT\n>s1\nACGT\n")))
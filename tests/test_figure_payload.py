@@ -0,0 +1,43 @@
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+
+from utils.figure_payload import DISPLAY_MANTISSA_BITS, _decode_typed_array, compact_figure
+
+RTOL = 2.0 ** -DISPLAY_MANTISSA_BITS  # Rounding to DISPLAY_MANTISSA_BITS keeps half of this
+
+
+def _decoded(value):
+    return _decode_typed_array(value) if isinstance(value, dict) else np.array(value, dtype=float)
+
+
+def test_compact_figure_round_trips_coordinates():
+    rng = np.random.default_rng(0)
+    branches = [(rng.uniform(-50, 50, 2), rng.uniform(0, 1000, 2)) for _ in range(20)]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=[None], y=[None], name='highlight'))
+    for x, y in branches:
+        fig.add_trace(go.Scatter(x=x, y=y, mode='lines', line=dict(color='black'), showlegend=False))
+    fig.add_trace(go.Scatter(x=np.arange(10), y=np.arange(10) * 3, mode='markers', name='tips'))
+
+    figure = compact_figure(fig)
+    assert [trace.get('name') for trace in figure['data']] == ['highlight', None, 'tips']
+
+    lines = figure['data'][1]
+    expected_x = np.concatenate([np.r_[x, np.nan] for x, _ in branches])[:-1]
+    expected_y = np.concatenate([np.r_[y, np.nan] for _, y in branches])[:-1]
+    x, y = _decoded(lines['x']), _decoded(lines['y'])
+    assert lines['x']['dtype'] == 'f4'
+    np.testing.assert_allclose(x, expected_x, rtol=RTOL)
+    np.testing.assert_allclose(y, expected_y, rtol=RTOL)
+
+    tips = figure['data'][2]
+    assert np.array_equal(_decoded(tips['x']), np.arange(10))  # Integers are exact
+    assert np.array_equal(_decoded(tips['y']), np.arange(10) * 3)
+    assert len(fig.data) == 22  # The go.Figure is left as it was
+
+
+def test_compact_figure_accepts_dicts():
+    x = np.linspace(0, 1, 50)
+    figure = compact_figure({'data': [{'type': 'scatter', 'x': x.tolist(), 'y': (x ** 2).tolist()}], 'layout': {}})
+    np.testing.assert_allclose(_decoded(figure['data'][0]['y']), x ** 2, rtol=RTOL, atol=1e-12)
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from utils.gazetteer import FallbackBackend, Gazetteer, GazetteerBackend, build_gazetteer, normalize_place
+from utils.geocoding import StubBackend
+
+# GeoNames rows: id, name, asciiname, alternatenames, lat, lon, ..., country (8), ..., admin1 (10), ..., population (14)
+PLACES = [
+    ('Atlanta', 'Atlanta', '', 33.749, -84.388, 'US', 'GA', 498715),
+    ('Athens', 'Athens', '', 33.9609, -83.3779, 'US', 'GA', 127315),
+    ('Athens', 'Athens', 'Athina', 37.9838, 23.7278, 'GR', 'ESYE31', 664046),
+    ('São Paulo', 'Sao Paulo', '', -23.5475, -46.6361, 'BR', '27', 10021295),
+    ('Paris', 'Paris', '', 48.8534, 2.3488, 'FR', '11', 2138551),
+]
+
+
+def _row(k, name, ascii_name, alternate, lat, lon, country, admin1, population):
+    fields = [''] * 19
+    fields[:6] = [str(k), name, ascii_name, alternate, str(lat), str(lon)]
+    fields[8], fields[10], fields[14] = country, admin1, str(population)
+    return "\t".join(fields)
+
+
+@pytest.fixture(scope='module')
+def gazetteer(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('gazetteer')
+    (directory / 'geonames.txt').write_text("\n".join(_row(k, *p) for k, p in enumerate(PLACES)) + "\n", encoding='utf-8')
+    build_gazetteer(str(directory / 'geonames.txt'), str(directory / 'gazetteer.npz'))
+    return Gazetteer.load(str(directory / 'gazetteer.npz'))
+
+
+def test_normalize_place():
+    assert normalize_place("  São  Paulo, SP! ") == "sao paulo sp"
+    assert normalize_place("Saint-Étienne") == "saint etienne"
+
+
+def test_exact_match_prefers_the_most_populous_place(gazetteer):
+    assert gazetteer.exact("SAO PAULO") == pytest.approx((-23.5475, -46.6361))
+    assert gazetteer.exact("Athens") == pytest.approx((37.9838, 23.7278))
+    assert gazetteer.exact("Athens, GA") == pytest.approx((33.9609, -83.3779))  # Qualified by admin1
+    assert gazetteer.exact("Athens GR") == pytest.approx((37.9838, 23.7278))
+    assert gazetteer.exact("Lyon") is None
+
+
+def test_city_state_falls_back_to_the_city(gazetteer):
+    assert gazetteer.lookup("Atlanta, Fulton County") == pytest.approx((33.749, -84.388))
+
+
+def test_prefix(gazetteer):
+    keys = [key for key, _, _ in gazetteer.prefix("Ath", limit=10)]
+    assert keys[0] == 'athens' and 'athens ga us' in keys and all(key.startswith('ath') for key in keys)
+    assert len(gazetteer.prefix("a", limit=2)) == 2
+    assert gazetteer.prefix("zz") == []
+
+
+def test_fuzzy_finds_names_one_edit_away(gazetteer):
+    for typo in ("Atlnta", "Atlantaa", "Atalnta", "Atlanto", "Sao Paolo", "Parris"):
+        assert gazetteer.lookup(typo) is not None, typo
+    assert gazetteer.fuzzy("Atlnta") == pytest.approx((33.749, -84.388))
+    assert gazetteer.fuzzy("Pa") is None
+    assert gazetteer.fuzzy("Helsinki") is None
+
+
+def test_fuzzy_index_is_built_for_older_index_files(gazetteer):
+    older = Gazetteer(gazetteer.keys, gazetteer.lat, gazetteer.lon)
+    assert older.fuzzy("Atlnta") == gazetteer.fuzzy("Atlnta")
+
+
+def test_fuzzy_lookup_does_not_scan_a_large_index():
+    keys = sorted({f"sa{i:06d}town" for i in range(30_000)} | {"san jose"})
+    gazetteer = Gazetteer(keys, [0.0] * len(keys), [1.0] * len(keys))
+    gazetteer.fuzzy("san jse")  # Builds the index
+    start = time.perf_counter()
+    for _ in range(100):
+        assert gazetteer.fuzzy("san jse") == (0.0, 1.0)
+    assert (time.perf_counter() - start) / 100 < 0.002
+
+
+def test_misses_fall_back_to_the_online_backend(gazetteer):
+    online = StubBackend({'lyon': (45.764, 4.8357), 'atlanta': (0.0, 0.0)})
+    backend = FallbackBackend(GazetteerBackend(gazetteer), online)
+    assert backend.lookup('Atlanta') == pytest.approx((33.749, -84.388))
+    assert online.calls == 0
+    assert backend.lookup('lyon') == (45.764, 4.8357)
+    assert online.calls == 1
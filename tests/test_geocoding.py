@@ -0,0 +1,52 @@
+from utils import geocoding
+from utils.geocoding import GeocodeCache, GeocodingService, RateLimiter, StubBackend
+
+COORDINATES = {'Paris': (48.8566, 2.3522), 'Lyon': (45.764, 4.8357)}
+
+
+def test_spellings_of_one_place_are_looked_up_once(tmp_path):
+    backend = StubBackend(COORDINATES)
+    service = GeocodingService(backend, GeocodeCache(str(tmp_path / 'geocode.sqlite')))
+
+    results = service.resolve_many(['Paris', ' paris ', 'PARIS', 'Lyon', '', None])
+    assert backend.calls == 2
+    assert results['Paris'] == results[' paris '] == results['PARIS'] == (48.8566, 2.3522, None)
+    assert set(results) == {'Paris', ' paris ', 'PARIS', 'Lyon'}
+
+    service.resolve_many(['Paris', 'Lyon'])
+    assert backend.calls == 2  # Both come from the cache
+
+
+def test_misses_are_cached_until_the_negative_ttl_expires(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(geocoding.time, 'time', lambda: now[0])
+    backend = StubBackend(COORDINATES)
+    cache = GeocodeCache(str(tmp_path / 'geocode.sqlite'), ttl_days=30, negative_ttl_days=1)
+    service = GeocodingService(backend, cache)
+
+    assert service.resolve('Atlantis') == (None, None, "⚠️ City not found.")
+    assert service.resolve('Paris')[2] is None
+    assert backend.calls == 2
+
+    now[0] += geocoding.DAY_SECONDS / 2
+    service.resolve_many(['Atlantis', 'Paris'])
+    assert backend.calls == 2
+
+    now[0] += geocoding.DAY_SECONDS
+    service.resolve_many(['Atlantis', 'Paris'])
+    assert backend.calls == 3  # Only the miss is looked up again
+
+
+def test_rate_limiter_spaces_calls(monkeypatch):
+    clock, sleeps = [0.0], []
+    monkeypatch.setattr(geocoding.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(geocoding.time, 'sleep', sleeps.append)
+
+    limiter = RateLimiter(4)
+    for _ in range(3):
+        limiter.wait()
+    assert sleeps == [0.25, 0.5]
+
+    clock[0] = 10.0
+    limiter.wait()
+    assert sleeps == [0.25, 0.5]  # Idle time is not carried over as a burst
@@ -0,0 +1,34 @@
+import threading
+
+from utils.lru_cache import LRUCache
+
+
+def test_least_recently_used_is_evicted():
+    cache = LRUCache('test', 2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+    cache.put('c', 3)
+    assert 'b' not in cache and cache.get('a') == 1 and cache.get('c') == 3
+    assert len(cache) == 2
+
+
+def test_concurrent_hits_and_evictions():
+    cache = LRUCache('test', 4)
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(5000):
+                key = (i + offset) % 8
+                if cache.get(key) is None:
+                    cache.put(key, key)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(cache) == 4
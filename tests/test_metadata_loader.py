@@ -0,0 +1,33 @@
+import numpy as np
+
+from utils.metadata_loader import detect_metadata_format, read_metadata_bytes
+
+ITOL = b"""DATASET_COLORSTRIP
+SEPARATOR COMMA
+DATASET_LABEL,Country
+COLOR,#ff0000
+DATA
+#ID,colour,label
+'A',#ff0000,France
+B,#00ff00,Spain
+DATASET_SIMPLEBAR
+SEPARATOR SPACE
+DATASET_LABEL Load
+FIELD_LABELS reads
+DATA
+B 12.5
+C 3
+"""
+
+
+def test_itol_metadata_uses_the_itol_parser():
+    assert detect_metadata_format(ITOL) == 'itol'
+    df = read_metadata_bytes(ITOL)
+    assert df['taxa'].tolist() == ['A', 'B', 'C']
+    assert df['Country (1)'].tolist()[:2] == ['France', 'Spain'] and df['Country (1)'].isna().tolist()[2]
+    assert np.allclose(df['Load reads (2)'], [np.nan, 12.5, 3.0], equal_nan=True)
+
+
+def test_itol_metadata_reads_only_requested_columns():
+    df = read_metadata_bytes(ITOL, columns=['Country (1)'])
+    assert df.columns.tolist() == ['taxa', 'Country (1)']
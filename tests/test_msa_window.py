@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from utils.alignment_store import EncodedAlignment
+from utils.msa_window import clamp_window, create_overview_figure, create_window_figure, window_positions
+
+SEQUENCES = {'s1': 'ACGTACGTAC', 's2': 'ACGTTCGTAC', 's3': 'AC-TACGAAC', 's4': 'NCGTACGTAG'}
+
+
+def _alignment():
+    matrix = np.frombuffer(''.join(SEQUENCES.values()).encode(), dtype=np.uint8).reshape(len(SEQUENCES), -1)
+    return EncodedAlignment(list(SEQUENCES), matrix)
+
+
+def test_clamp_window():
+    alignment = _alignment()
+    assert clamp_window(alignment, 1, 2, 2, 3) == (1, 2, 2, 3)
+    assert clamp_window(alignment, 3, 9, 2, 3) == (2, 7, 2, 3)  # Moved back inside
+    assert clamp_window(alignment, -5, None, 50, 50) == (0, 0, 4, 10)  # Shrunk to the alignment
+    assert clamp_window(alignment, 0, 5, 1, 3, columns=[2, 4, 7, 9]) == (0, 1, 1, 3)
+
+
+def test_window_figure_shows_only_the_window():
+    trace = create_window_figure(_alignment(), 1, 2, 2, 3).data[0]
+    assert list(trace.y) == ['s2', 's3']
+    assert list(trace.x) == [3, 4, 5]
+    assert [list(row) for row in trace.text] == [['G', 'T', 'T'], ['-', 'T', 'A']]
+    assert np.asarray(trace.z).shape == (2, 3)
+
+
+def test_window_figure_of_selected_columns_keeps_alignment_positions():
+    columns = np.array([2, 4, 7, 9])
+    assert window_positions(1, 2, columns).tolist() == [4, 7]
+    trace = create_window_figure(_alignment(), 0, 1, 4, 2, columns=columns).data[0]
+    assert list(trace.x) == [5, 8]
+    assert [''.join(row) for row in trace.text] == ['AT', 'TT', 'AA', 'AT']
+
+
+def test_overview_is_binned():
+    alignment = _alignment()
+    variable = np.array([1, 0, 1, 0, 1, 0, 0, 1, 0, 1], dtype=bool)
+    bar = create_overview_figure(alignment, variable, max_bins=4).data[0]
+    # Bin edges 0, 2, 5, 7, 10
+    assert list(bar.x) == [1, 3, 6, 8]
+    assert list(bar.width) == [2, 3, 2, 3]
+    assert list(bar.y) == pytest.approx([0.5, 2 / 3, 0, 2 / 3], abs=1e-4)
+
+
+def test_short_alignment_overview_has_one_bin_per_column():
+    variable = np.zeros(10, dtype=bool)
+    variable[3] = True
+    bar = create_overview_figure(_alignment(), variable).data[0]
+    assert len(bar.x) == 10
+    assert list(bar.y) == [0, 0, 0, 1, 0, 0, 0, 0, 0, 0]
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from utils.mst_network import MAX_COLOR_CATEGORIES, build_network, create_mst_figure, node_categories
+
+
+def _network(n):
+    d = np.abs(np.arange(n)[:, None] - np.arange(n)[None, :])
+    network = build_network(d)
+    network['names'] = [f"s{i}" for i in range(n)]
+    return network
+
+
+def test_spanning_tree_of_a_line_joins_neighbours():
+    network = _network(10)
+    assert network['weight'].sum() == 9
+    assert (network['parent'] >= 0).sum() == 9
+
+
+def test_identical_isolates_are_collapsed():
+    d = np.array([[0, 0, 4], [0, 0, 4], [4, 4, 0]])
+    network = build_network(d)
+    assert network['counts'].tolist() == [2, 1]
+    assert network['group'].tolist() == [0, 0, 1]
+
+
+def test_many_categorical_values_are_grouped_as_other():
+    n = 2 * MAX_COLOR_CATEGORIES
+    network = _network(n)
+    metadata = pd.DataFrame({'taxa': network['names'], 'location': [f"place{i}" for i in range(n)]})
+    metadata['location'] = metadata['location'].astype('category')
+
+    labels, in_majority, colors = node_categories(network, metadata, 'location')
+    assert 'Other' in set(labels)
+    assert len(set(labels)) == MAX_COLOR_CATEGORIES
+    assert (in_majority == 1).all()
+    assert set(labels) <= set(colors)
+    create_mst_figure(network, metadata, 'location')
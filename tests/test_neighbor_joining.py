@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from utils.neighbor_joining import midpoint_root, neighbor_joining
+from utils.snp_matrix_store import read_matrix
+
+
+def naive_neighbor_joining(d):
+    """Textbook O(n^3) neighbor joining: {tip set below an edge: branch length}."""
+    d = np.array(d, dtype=np.float64)
+    nodes = [frozenset([i]) for i in range(len(d))]
+    edges = {}
+    while len(nodes) > 3:
+        m = len(nodes)
+        r = d.sum(axis=1)
+        q = (m - 2) * d - r[:, None] - r[None, :]
+        np.fill_diagonal(q, np.inf)
+        i, j = sorted(np.unravel_index(np.argmin(q), q.shape))
+        li = d[i, j] / 2 + (r[i] - r[j]) / (2 * (m - 2))
+        edges[nodes[i]], edges[nodes[j]] = max(li, 0.0), max(d[i, j] - li, 0.0)
+        new = (d[i] + d[j] - d[i, j]) / 2
+        keep = [k for k in range(m) if k not in (i, j)]
+        d = np.block([[d[np.ix_(keep, keep)], new[keep, None]], [new[None, keep], np.zeros((1, 1))]])
+        nodes = [nodes[k] for k in keep] + [nodes[i] | nodes[j]]
+    (a, b, c), dm = nodes, d
+    edges[a] = max((dm[0, 1] + dm[0, 2] - dm[1, 2]) / 2, 0.0)
+    edges[b] = max((dm[0, 1] + dm[1, 2] - dm[0, 2]) / 2, 0.0)
+    edges[c] = max((dm[0, 2] + dm[1, 2] - dm[0, 1]) / 2, 0.0)
+    return edges
+
+
+def tree_edges(parent, branch_length, n):
+    """{tip set below an edge: branch length} of (parent, branch_length) arrays."""
+    below = [frozenset([v]) if v < n else frozenset() for v in range(len(parent))]
+    for v in range(len(parent)):  # Children are numbered before their parents
+        if parent[v] >= 0:
+            below[parent[v]] = below[parent[v]] | below[v]
+    return {below[v]: branch_length[v] for v in range(len(parent)) if parent[v] >= 0}
+
+
+def canonical(edges, n):
+    """Edges keyed by the side without tip 0, so rooting differences do not matter."""
+    everything = frozenset(range(n))
+    return {(everything - s if 0 in s else s): length for s, length in edges.items()}
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_matches_naive_neighbor_joining(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(4, 30))
+    points = rng.normal(size=(n, 3))
+    d = np.sqrt(((points[:, None] - points[None]) ** 2).sum(axis=2)) * 10 + rng.random((n, n))
+    d = (d + d.T) / 2
+    np.fill_diagonal(d, 0)
+
+    expected = canonical(naive_neighbor_joining(d), n)
+    parent, branch_length = neighbor_joining(d)
+    got = canonical(tree_edges(parent, branch_length, n), n)
+    assert set(got) == set(expected)
+    for split, length in expected.items():
+        assert got[split] == pytest.approx(length, abs=1e-3)
+
+
+def test_midpoint_root_is_halfway_between_the_farthest_tips():
+    d = np.array([[0, 2, 7, 9], [2, 0, 7, 9], [7, 7, 0, 4], [9, 9, 4, 0]], dtype=float)
+    parent, branch_length = midpoint_root(*neighbor_joining(d))
+    assert (parent == -1).sum() == 1
+
+    def depth(v):
+        total = 0.0
+        while parent[v] >= 0:
+            total, v = total + branch_length[v], parent[v]
+        return total
+
+    deepest = sorted(depth(v) for v in range(4))[-2:]
+    assert deepest[0] == pytest.approx(deepest[1])
+    assert deepest[1] == pytest.approx(d.max() / 2)
+
+
+def test_matrices_with_missing_distances_are_rejected():
+    text = "snp-dists 0.8.2\tA\tB\tC\nA\t0\t1\t\nB\t1\t0\t2\nC\t\t2\t0\n"
+    with pytest.raises(ValueError, match="missing"):
+        read_matrix(text.encode(), 'snp_dists.tsv')
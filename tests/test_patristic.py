@@ -0,0 +1,46 @@
+import io
+import random
+
+import numpy as np
+import pytest
+from Bio import Phylo
+from Bio.Phylo.BaseTree import Clade, Tree
+
+from utils.patristic import LCAIndex, patristic_matrix
+from utils.tree_arrays import TreeArrays
+
+
+def random_tree(n, seed):
+    rng = random.Random(seed)
+    clades = [Clade(branch_length=rng.random(), name=f"T{i}") for i in range(n)]
+    while len(clades) > 1:
+        a = clades.pop(rng.randrange(len(clades)))
+        b = clades.pop(rng.randrange(len(clades)))
+        clades.append(Clade(branch_length=rng.random(), clades=[a, b]))
+    return Tree(root=clades[0])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_patristic_matrix_matches_biopython(seed):
+    tree = random_tree(40, seed)
+    arrays = TreeArrays.from_phylo(tree)
+    index = LCAIndex(arrays)
+    names = [arrays.names[t] for t in arrays.tips]
+
+    matrix = patristic_matrix(index)
+    for a in range(0, 40, 7):
+        for b in range(0, 40, 5):
+            assert matrix[a, b] == pytest.approx(tree.distance(names[a], names[b]) if a != b else 0.0)
+
+    subset = [3, 11, 29]
+    assert np.allclose(patristic_matrix(index, subset), matrix[np.ix_(subset, subset)])
+
+
+def test_lca_of_a_small_tree():
+    tree = TreeArrays.from_phylo(Phylo.read(io.StringIO("((A:1,B:2)AB:1,(C:1,D:1)CD:3)root;"), 'newick'))
+    index = LCAIndex(tree)
+    node = {name: i for i, name in enumerate(tree.names)}
+    u = np.array([node['A'], node['A'], node['C']])
+    v = np.array([node['B'], node['D'], node['D']])
+    assert [tree.names[i] for i in index.lca(u, v)] == ['AB', 'root', 'CD']
+    assert index.distance(u, v).tolist() == [3, 6, 2]
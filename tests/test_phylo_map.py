@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from utils.phylo_map import aggregate_samples, cache_sample_map, get_cached_sample_map
+
+COORDINATES = {'Paris': (48.8566, 2.3522), 'paris, france': (48.85661, 2.35219), 'Lyon': (45.764, 4.8357)}
+
+
+def _metadata():
+    return pd.DataFrame({
+        'taxa': ['s1', 's2', 's3', 's4', 's5', 's6'],
+        'location': ['Paris', 'paris, france', 'Lyon', 'Atlantis', 'Paris', None],
+        'MLST': ['ST1', 'ST2', 'ST1', 'ST3', 'ST1', 'ST1'],
+    })
+
+
+def test_aggregate_samples_counts_and_breakdowns():
+    features, unresolved, feature_of_row = aggregate_samples(_metadata(), COORDINATES)
+    by_count = {f['properties']['count']: f for f in features}
+    assert sorted(by_count) == [1, 3]  # Two spellings of Paris share one point
+
+    paris = by_count[3]['properties']
+    assert paris['locations'] == "Paris: 2<br>paris, france: 1"
+    assert paris['mlst'] == "ST1: 2<br>ST2: 1"
+    assert by_count[1]['geometry']['coordinates'] == [4.8357, 45.764]
+    assert by_count[1]['properties']['locations'] == "Lyon: 1"
+
+    assert unresolved == ['Atlantis', 'Unknown']
+    paris_fid, lyon_fid = paris['fid'], by_count[1]['properties']['fid']
+    assert feature_of_row.tolist() == [paris_fid, paris_fid, lyon_fid, -1, paris_fid, -1]
+
+
+def test_aggregate_samples_without_mlst():
+    features, unresolved, feature_of_row = aggregate_samples(_metadata().drop(columns='MLST'), COORDINATES)
+    assert all('mlst' not in f['properties'] for f in features)
+    assert np.sum(feature_of_row >= 0) == 4
+
+
+def test_cached_map_keeps_unresolved_locations():
+    assert cache_sample_map('test-unresolved', '<html></html>', ['Atlantis']) == ('<html></html>', ['Atlantis'])
+    assert get_cached_sample_map('test-unresolved') == ('<html></html>', ['Atlantis'])
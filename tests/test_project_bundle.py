@@ -0,0 +1,38 @@
+import os
+
+from utils import project_bundle
+from utils.project_bundle import ingest_run, list_bundles, open_bundle
+
+
+def _ingest(tmp_path, rows, force=False):
+    path = tmp_path / "metadata.tsv"
+    path.write_text("taxa\tlocation\n" + "".join(f"S{i}\tParis\n" for i in range(rows)))
+    return ingest_run(None, 'run1', project_dir=str(tmp_path / 'projects'), files={'metadata': str(path)}, force=force)
+
+
+def test_reingested_bundle_is_reopened(tmp_path):
+    project_dir = str(tmp_path / 'projects')
+    _ingest(tmp_path, 3)
+    old = open_bundle('run1', project_dir)
+    assert len(old.metadata()) == 3
+
+    _ingest(tmp_path, 5, force=True)
+    project_bundle._OPEN_BUNDLES[(project_dir, 'run1')] = old  # As a server worker still holds it
+    assert len(open_bundle('run1', project_dir).metadata()) == 5
+    assert os.listdir(project_dir) == ['run1']  # The replaced bundle is removed
+    assert list_bundles(project_dir) == ['run1']
+
+
+def test_reingested_matrix_gets_a_new_key(tmp_path, monkeypatch):
+    from utils import snp_matrix_store
+    from utils.snp_matrix_store import open_matrix
+
+    project_dir = str(tmp_path / 'projects')
+    monkeypatch.setattr(snp_matrix_store, 'PROJECT_DIR', project_dir)
+    path = tmp_path / "snp_dists.tsv"
+    for distance in (1, 2):
+        path.write_text(f"snp-dists 0.8.2\tA\tB\nA\t0\t{distance}\nB\t{distance}\t0\n")
+        ingest_run(None, 'run1', project_dir=project_dir, files={'matrix': str(path)}, force=True)
+        key = open_bundle('run1', project_dir).key
+        assert key.startswith('project:run1@')
+        assert open_matrix(key).loc['A', 'B'] == distance
@@ -0,0 +1,26 @@
+import io
+
+import pytest
+from Bio import Phylo
+
+from utils.rectangular_tree import rectangular_coordinates
+from utils.synthetic_data import newick_tree
+
+
+def test_rectangular_coordinates():
+    tree = Phylo.read(io.StringIO("((a:1,b:2):1,c:3);"), 'newick')
+    x, y, max_y = rectangular_coordinates(tree)
+    a, b, c = tree.get_terminals()
+    ab = tree.common_ancestor('a', 'b')
+    assert [x[n] for n in (tree.root, ab, a, b, c)] == pytest.approx([0, 1, 2, 3, 3])
+    assert [y[n] for n in (a, b, c, ab)] == pytest.approx([0, 1, 2, 0.5])
+    assert y[tree.root] == pytest.approx(1.5)  # Mean of the last rows under (a, b) and c
+    assert max_y == 2
+    assert list(x) == list(tree.find_clades())  # Preorder
+
+
+def test_rectangular_coordinates_of_a_deep_ladder():
+    tree = Phylo.read(io.StringIO(newick_tree(3000, 'ladder')), 'newick')
+    x, y, max_y = rectangular_coordinates(tree)
+    assert max_y == 2999
+    assert sorted(y[clade] for clade in x if clade.is_terminal()) == list(range(3000))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from utils import sample_selection
+from utils.lru_cache import LRUCache
+from utils.sample_selection import SampleIndex, decode_bits, encode_bits, make_selection, selected_positions
+
+DATASETS = {
+    'tree': ['s1', 's2', 's3', 's4'],
+    'matrix': [' s3', 's5', 's1'],  # Names are matched after stripping
+    'alignment': ['s5', 's6', None],
+}
+SOURCES = {source: f"key-{source}" for source in DATASETS}
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """Every dataset reopened by key, as the stores of any worker would."""
+    monkeypatch.setattr(sample_selection, '_INDEX_CACHE', LRUCache('sample_index', 4))
+    monkeypatch.setattr(sample_selection, 'source_names', lambda source, key: DATASETS[source])
+
+
+@pytest.mark.parametrize('n', [1, 7, 8, 9, 5000])
+def test_bits_round_trip(n):
+    mask = np.random.default_rng(n).random(n) < 0.3
+    text = encode_bits(mask)
+    assert np.array_equal(decode_bits(text, n), mask)
+    assert len(text) <= 4 * ((n + 7) // 8 + 2) // 3
+
+
+def test_index_spans_all_datasets():
+    index = SampleIndex(DATASETS)
+    assert index.names.tolist() == ['s1', 's2', 's3', 's4', 's5', 's6']
+    assert index.ids['tree'].tolist() == [0, 1, 2, 3]
+    assert index.ids['matrix'].tolist() == [2, 4, 0]
+    assert index.ids['alignment'].tolist() == [4, 5, -1]
+    assert index.lookup(['s6', 'missing']).tolist() == [5, -1]
+
+
+def test_selection_crosses_datasets(stored):
+    selection = make_selection(SOURCES, 'tree', positions=[0, 1, 2])  # s1, s2, s3
+    assert (selection['count'], selection['size']) == (3, 6)
+    assert selected_positions(selection, 'tree', SOURCES['tree']).tolist() == [0, 1, 2]
+    assert selected_positions(selection, 'matrix', SOURCES['matrix']).tolist() == [0, 2]
+    assert selected_positions(selection, 'alignment', SOURCES['alignment']).tolist() == []  # None in common
+
+    selection = make_selection(SOURCES, 'alignment', positions=[0, 1])  # s5, s6: not in the tree
+    assert selected_positions(selection, 'tree', SOURCES['tree']).tolist() == []
+    assert selected_positions(selection, 'matrix', SOURCES['matrix']).tolist() == [1]
+    assert selected_positions(selection, 'matrix', SOURCES['matrix'], names=['s5', 's9', 's1']).tolist() == [0]
+
+    assert make_selection(SOURCES, 'alignment', positions=[2]) is None  # An unnamed sample
+    assert selected_positions(None, 'tree', SOURCES['tree']) is None
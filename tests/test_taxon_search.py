@@ -0,0 +1,75 @@
+import io
+
+import numpy as np
+import pandas as pd
+from Bio import Phylo
+
+from utils import taxon_search
+from utils.lru_cache import LRUCache
+from utils.taxon_search import TaxonSearchIndex, cache_search_view, get_search_view, search_view_from_arrays
+from utils.tree_arrays import TreeArrays
+
+# Preorder nodes: root 0, ab 1, a 2, b 3, cde 4, c 5, de 6, d 7, e 8
+NEWICK = "((a:1,b:1)ab:1,(c:1,(d:1,e:1)de:1)cde:1);"
+METADATA = pd.DataFrame({'taxa': ['a', 'c', 'e'], 'location': ['Paris', 'Parma', 'Oslo']})
+
+
+def make_view(polar=False):
+    tree = TreeArrays.from_phylo(Phylo.read(io.StringIO(NEWICK), 'newick'))
+    y = np.array([2.0, 0.5, 0.0, 1.0, 3.5, 2.0, 3.5, 3.0, 4.0])
+    return search_view_from_arrays(tree, tree.depth, y, METADATA, polar=polar)
+
+
+def test_prefix_and_substring_matches():
+    index = TaxonSearchIndex(['Alpha', 'beta', 'alphabet'], {1: ['Paris'], 2: [7]})
+    assert index.prefix('ALP').tolist() == [0, 2]
+    assert index.prefix('par').tolist() == [1]
+    assert index.substring('bet').tolist() == [1, 2]
+    assert index.substring('7').tolist() == [2]
+    assert index.search('  ris ').tolist() == [1]
+    assert index.substring('\x00').tolist() == []
+
+
+def test_lca_clade_of_matches():
+    view = make_view()
+    assert view.clade_of(np.array([3, 4])) == 6  # d, e
+    assert view.clade_of(np.array([2, 4])) == 4  # c, e
+    assert view.clade_of(np.array([0, 4])) == 0  # a, e
+    assert view.clade_of(np.array([1])) == 3
+
+
+def test_highlight_outlines_the_enclosing_clade():
+    view = make_view()
+    match_trace, clade_trace, n_matches, clade_tips = view.highlight('par')  # Paris (a) and Parma (c)
+    assert (n_matches, clade_tips) == (2, 5)
+    assert match_trace['text'] == ['a', 'c'] and match_trace['y'] == [0.0, 2.0]
+    assert clade_trace['x'] == [0.0, 3.0, 3.0, 0.0, 0.0]
+    assert clade_trace['y'] == [-0.5, -0.5, 4.5, 4.5, -0.5]
+
+    match_trace, clade_trace, n_matches, clade_tips = view.highlight('osl')
+    assert (n_matches, clade_tips) == (1, 1) and match_trace['text'] == ['e']
+
+    match_trace, clade_trace, n_matches, _ = view.highlight('zzz')
+    assert n_matches == 0 and 'x' not in match_trace
+
+
+def test_polar_highlight_uses_degrees():
+    view = make_view(polar=True)
+    match_trace, clade_trace, _, _ = view.highlight('d')
+    assert match_trace['theta'] == [np.degrees(3.0)]
+    assert clade_trace['r'][0] == view.y[7]  # The clade of one tip starts at the tip itself
+
+
+def test_stored_view_is_reopened_by_another_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(taxon_search, '_VIEW_CACHE', LRUCache('search_view', taxon_search.VIEW_CACHE_SIZE))
+    view = make_view(polar=True)
+    cache_search_view('circ-test', view, store_dir=str(tmp_path))
+    taxon_search._VIEW_CACHE.clear()  # A worker that did not draw the tree
+
+    reopened = get_search_view('circ-test', store_dir=str(tmp_path))
+    assert reopened is not view and reopened.polar
+    assert reopened.tree.names == view.tree.names
+    assert reopened.index.texts == view.index.texts
+    for query in ('par', 'd', 'oslo'):
+        assert reopened.highlight(query) == view.highlight(query)
+    assert get_search_view('missing', store_dir=str(tmp_path)) is None
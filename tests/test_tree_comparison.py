@@ -0,0 +1,63 @@
+import io
+import random
+
+import numpy as np
+import pytest
+from Bio import Phylo
+from Bio.Phylo.BaseTree import Clade, Tree
+
+from utils.tree_arrays import TreeArrays
+from utils.tree_comparison import TreeComparison
+
+
+def arrays(newick):
+    return TreeArrays.from_phylo(Phylo.read(io.StringIO(newick), 'newick'))
+
+
+def random_tree(names, seed):
+    rng = random.Random(seed)
+    clades = [Clade(branch_length=1.0, name=name) for name in names]
+    while len(clades) > 1:
+        a = clades.pop(rng.randrange(len(clades)))
+        b = clades.pop(rng.randrange(len(clades)))
+        clades.append(Clade(branch_length=1.0, clades=[a, b]))
+    return Tree(root=clades[0])
+
+
+def naive_splits(tree, names):
+    """Non-trivial unrooted splits of a Bio.Phylo tree, as the side without names[0]."""
+    everything = frozenset(names)
+    splits = set()
+    for clade in tree.find_clades():
+        below = frozenset(t.name for t in clade.get_terminals())
+        side = everything - below if names[0] in below else below
+        if 1 < len(side) < len(names) - 1:
+            splits.add(side)
+    return splits
+
+
+def test_rf_of_small_trees():
+    trees = [arrays("((A,B),(C,D));"), arrays("((A,C),(B,D));"), arrays("(A,(B,(C,D)));")]
+    rf = TreeComparison(trees, ['ab', 'ac', 'rerooted']).robinson_foulds()
+    assert rf.tolist() == [[0, 2, 0], [2, 0, 2], [0, 2, 0]]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_rf_matches_set_splits_beyond_one_word(seed):
+    names = [f"T{i}" for i in range(70)]  # More taxa than bits in one uint64
+    left, right = random_tree(names, seed), random_tree(names, seed + 100)
+    comparison = TreeComparison([TreeArrays.from_phylo(left), TreeArrays.from_phylo(right)], ['left', 'right'])
+    expected = len(naive_splits(left, names) ^ naive_splits(right, names))
+    assert comparison.robinson_foulds()[0, 1] == expected
+
+
+def test_weighted_rf_sums_branch_length_differences():
+    trees = [arrays("((A:1,B:1):2,(C:1,D:1):0);"), arrays("((A:1,B:3):1,(C:1,D:1):1);")]
+    distances = TreeComparison(trees, ['a', 'b']).weighted_robinson_foulds()
+    assert distances[0, 1] == pytest.approx(2)  # B differs by 2; the AB|CD split totals 2 in both
+    assert np.allclose(distances, distances.T)
+
+
+def test_too_few_shared_taxa_are_rejected():
+    with pytest.raises(ValueError, match="share only"):
+        TreeComparison([arrays("((A,B),(C,D));"), arrays("((A,B),(E,F));")], ['a', 'b'])
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from utils import variable_sites
+from utils.variable_sites import build_site_index, get_site_index
+
+# Column 0: constant; 1: two states, both shared (informative); 2 and 3: one singleton state each;
+# 4: constant apart from an N; 5: constant apart from gaps
+SEQUENCES = ['ACGTA-', 'ACGTNC', 'ATGAA-', 'ATCTAC']
+
+
+def _matrix(sequences=SEQUENCES):
+    return np.frombuffer(''.join(sequences).encode(), dtype=np.uint8).reshape(len(sequences), -1)
+
+
+def test_site_index():
+    index = build_site_index(_matrix())
+    assert index.n_states.tolist() == [1, 2, 2, 2, 1, 1]
+    assert index.polymorphic.tolist() == [1, 2, 3]
+    assert index.parsimony_informative.tolist() == [1]
+    assert index.polymorphic_mask.tolist() == [False, True, True, True, False, False]
+    assert index.gap_fraction.tolist() == pytest.approx([0, 0, 0, 0, 0, 0.5])
+    assert index.n_fraction.tolist() == pytest.approx([0, 0, 0, 0, 0.25, 0])
+
+
+def test_missing_codes_are_not_states():
+    index = build_site_index(_matrix(['A-N?', 'C-NA', 'A.?A']))
+    assert index.n_states.tolist() == [2, 0, 0, 1]
+    assert index.polymorphic.tolist() == [0]
+    assert index.parsimony_informative.tolist() == []
+    assert index.gap_fraction.tolist() == pytest.approx([0, 1, 0, 0])
+    assert index.n_fraction.tolist() == pytest.approx([0, 0, 1, 1 / 3])
+
+
+def test_chunked_index_matches(monkeypatch):
+    whole = build_site_index(_matrix())
+    monkeypatch.setattr(variable_sites, 'CELLS_PER_CHUNK', 4)  # One column per chunk
+    chunked = build_site_index(_matrix())
+    assert chunked.n_states.tolist() == whole.n_states.tolist()
+    assert chunked.parsimony_informative.tolist() == whole.parsimony_informative.tolist()
+    assert chunked.gap_fraction.tolist() == whole.gap_fraction.tolist()
+
+
+def test_site_index_is_cached():
+    matrix = _matrix()
+    assert get_site_index('test-sites', matrix) is get_site_index('test-sites', matrix)
@@ -2,41 +2,181 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from Bio import Phylo
+from utils.taxon_search import search_highlight_traces
+from utils.sample_selection import selection_trace
+from utils.itol import COLOR_DATASETS
+from utils.tree_arrays import TreeArrays
 
-def plot_tree_circular(tree, metadata_dict):
+RING_WIDTH = 0.8
+RING_GAP = 0.2
+TIP_LABEL_TRACE = 3  # Reserved tip label trace, after the search highlight and selection traces
+TIP_LABEL_SIZE = 10
+LABEL_SPACING_PX = 12  # Closest two label baselines may be
+LABEL_CIRCLE_PX = 380  # Radius of the label circle in the 1000 x 1000 figure with its margins
+FULL_CIRCLE = (0, 360)
+
+def circular_layout(tree_arrays, root_length=0.0):
+    """
+    Angle (radians) and radius of every node (preorder) of the radial layout: tips evenly around the
+    circle, internal nodes at the mean angle of their children. Computed one level at a time, so
+    deep (ladder) trees need no recursion.
+    """
+    depth = tree_arrays.depth + root_length
+    radius = depth * (13 / (depth.max() or 1))  # shrink slightly to make room for outer ring
+    angle = np.zeros(tree_arrays.n_nodes)
+    angle[tree_arrays.tips] = np.linspace(0, 2 * np.pi, tree_arrays.n_tips, endpoint=False)
+    n_children = np.diff(tree_arrays.child_offsets)
+    child_sum = np.zeros(tree_arrays.n_nodes)
+    for nodes in tree_arrays.levels():
+        parents = tree_arrays.parent[nodes]
+        np.add.at(child_sum, parents, angle[nodes])
+        angle[parents] = child_sum[parents] / n_children[parents]  # All children of a node share a level
+    return angle, radius
+
+
+def circular_coordinates(tree):
+    """Returns the leaves, leaf angles, and angle (radians) and radius per clade of the radial layout."""
+    tree_arrays = TreeArrays.from_phylo(tree)
+    angle, radius = circular_layout(tree_arrays, tree.root.branch_length or 0)
+    clades = tree_arrays.clades
+    leaf_nodes = [clades[i] for i in tree_arrays.tips]
+    clade_angles = {clades[i]: angle[i] for i in tree_arrays.tips}
+    return leaf_nodes, clade_angles, dict(zip(clades, angle.tolist())), dict(zip(clades, radius.tolist()))
+
+def _ring(theta, names, r_start, colors, text, width=RING_WIDTH, **marker):
+    """One Barpolar trace drawing a whole ring (one bar per tip) in a single vectorized trace."""
+    return go.Barpolar(
+        theta=theta.tolist(), r=np.broadcast_to(width, theta.shape).tolist(), base=r_start,
+        width=360 / max(len(names), 1), marker=dict(color=colors, line=dict(width=0), **marker),
+        text=[f"{name}: {value}" for name, value in zip(names, text)], hoverinfo='text', showlegend=False
+    )
+
+
+def dataset_ring_traces(datasets, leaf_angles, names, r_start):
+    """
+    Extra rings for parsed iTOL datasets (colour strips, binary, heatmap and bar datasets), outward from r_start.
+    Returns (traces, radius where the outermost ring ends).
+    """
+    theta_all = np.degrees(np.asarray(leaf_angles))
+    names = np.asarray(names, dtype=object)
+    traces = []
+    r = r_start
+    for dataset in datasets:
+        if dataset.kind in COLOR_DATASETS:
+            shown = dataset.codes >= 0
+            palette = np.array(dataset.palette, dtype=object)
+            legend = np.array(dataset.legend, dtype=object)
+            traces.append(_ring(theta_all[shown], names[shown], r, palette[dataset.codes[shown]].tolist(),
+                                legend[dataset.codes[shown]]))
+            r += RING_WIDTH + RING_GAP
+        elif dataset.kind == 'DATASET_BINARY':
+            for field in range(dataset.values.shape[1]):
+                values = dataset.values[:, field]
+                shown = values >= 0
+                color = dataset.field_colors[field] if field < len(dataset.field_colors) else 'black'
+                colors = np.where(values[shown] > 0, color, '#f0f0f0').tolist()
+                traces.append(_ring(theta_all[shown], names[shown], r, colors, values[shown]))
+                r += RING_WIDTH + RING_GAP
+        elif dataset.kind == 'DATASET_HEATMAP':
+            header = dataset.header
+            low, high = header.get('COLOR_MIN', ['#0000ff'])[0], header.get('COLOR_MAX', ['#ff0000'])[0]
+            colorscale = [[0, low], [0.5, header['COLOR_MID'][0]], [1, high]] if 'COLOR_MID' in header else [[0, low], [1, high]]
+            finite = dataset.values[np.isfinite(dataset.values)]
+            data_min, data_max = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 1.0)
+            cmin = float(header['USER_MIN_VALUE'][0]) if 'USER_MIN_VALUE' in header else data_min
+            cmax = float(header['USER_MAX_VALUE'][0]) if 'USER_MAX_VALUE' in header else data_max
+            for field in range(dataset.values.shape[1]):
+                values = dataset.values[:, field]
+                shown = np.isfinite(values)
+                traces.append(_ring(theta_all[shown], names[shown], r, values[shown].tolist(), values[shown],
+                                    colorscale=colorscale, cmin=cmin, cmax=cmax, showscale=field == 0,
+                                    colorbar=dict(title=dataset.label, len=0.5)))
+                r += RING_WIDTH
+            r += RING_GAP
+        elif dataset.kind == 'DATASET_SIMPLEBAR':
+            values = dataset.values[:, 0]
+            shown = np.isfinite(values) & (values != 0)
+            magnitude = np.abs(values[shown])  # Negative bars are drawn by size; hover shows the signed value
+            scale = 3 * RING_WIDTH / max(float(magnitude.max()) if magnitude.size else 0.0, 1e-12)
+            color = dataset.header.get('COLOR', ['#4682b4'])[0]
+            traces.append(_ring(theta_all[shown], names[shown], r, color, values[shown], width=magnitude * scale))
+            r += 3 * RING_WIDTH + RING_GAP
+    return traces, r
+
+
+def sector_zoom(sector):
+    """How many times larger a polar sector (degrees) is drawn than the full circle in the same plot area."""
+    start, end = sector
+    if end - start >= 360:
+        return 1.0
+    angles = np.radians(np.concatenate([[start, end], np.arange(np.ceil(start / 90) * 90, end, 90)]))
+    xs, ys = np.append(np.cos(angles), 0), np.append(np.sin(angles), 0)
+    return 2 / max(np.ptp(xs), np.ptp(ys), 1e-9)
+
+
+def visible_tip_labels(tip_angles, sector=FULL_CIRCLE, circle_px=LABEL_CIRCLE_PX, spacing_px=LABEL_SPACING_PX):
+    """
+    Positions in tip_angles (radians, increasing as circular_coordinates lays them out) of the tip
+    labels that fit in the `sector` view without overlapping. At most one candidate per spacing_px
+    of arc is considered, so the cost depends on the view, not on the number of tips.
+    """
+    start, end = np.radians(sector)
+    lo, hi = np.searchsorted(tip_angles, [start, end])
+    if hi <= lo:
+        return np.array([], dtype=int)
+    radius = circle_px * sector_zoom(sector)
+    max_labels = max(1, int((end - start) * radius / spacing_px))
+    candidates = np.arange(lo, hi, -(-(hi - lo) // max_labels))
+
+    # Labels are horizontal text: two on the same side of the circle collide when their baselines are too close
+    angles = np.asarray(tip_angles)[candidates]
+    baselines = radius * np.sin(angles)
+    keep = []
+    for side in (np.cos(angles) >= 0, np.cos(angles) < 0):
+        last = None
+        for i in np.flatnonzero(side)[np.argsort(baselines[side], kind='stable')]:
+            if last is None or baselines[i] - last >= spacing_px:
+                keep.append(candidates[i])
+                last = baselines[i]
+    return np.sort(np.array(keep, dtype=int))
+
+
+def tip_label_trace(theta=(), names=(), r=0):
+    """The tip label trace: text at radius r, right of the tip on the right half of the circle, left of it on the left."""
+    theta = np.degrees(np.asarray(theta, dtype=float))
+    right = np.cos(np.radians(theta)) >= 0
+    return go.Scatterpolar(
+        r=np.full(len(theta), float(r)).tolist(), theta=theta.tolist(), text=list(names), mode='text',
+        textposition=np.where(right, 'middle right', 'middle left').tolist(),
+        textfont=dict(size=TIP_LABEL_SIZE, color='black'), hoverinfo='skip', showlegend=False, cliponaxis=False,
+        name='tip-labels'
+    )
+
+
+def tip_label_radius(fig):
+    """Radius the tip labels of a circular tree figure (go.Figure or plotly dict) are drawn at, or None."""
+    layout = fig.to_plotly_json()['layout'] if hasattr(fig, 'to_plotly_json') else fig.get('layout', {})
+    return (layout.get('meta') or {}).get('tip_label_radius')
+
+
+def has_tip_label_trace(fig):
+    """Whether a stored figure (plotly dict) has the reserved tip label trace, i.e. was drawn by this version."""
+    data = fig.get('data', [])
+    return len(data) > TIP_LABEL_TRACE and data[TIP_LABEL_TRACE].get('name') == 'tip-labels'
+
+
+def plot_tree_circular(tree, metadata_dict, datasets=(), show_labels=False, sector=FULL_CIRCLE):
     """
     Radial tree layout with real branch length for internal branches,
     and a uniform outer ring with colored arcs like iTOL.
+    Further iTOL datasets (utils.itol.parse_itol, indexed by tip position) are drawn as extra rings.
+    Tip labels (show_labels) are limited to those that fit in the `sector` view, see visible_tip_labels.
     """
-    raw_depths = tree.depths()
-    max_depth = max(raw_depths.values())
-    scaling_factor = 13 / max_depth  # shrink slightly to make room for outer ring
-    depths = {clade: d * scaling_factor for clade, d in raw_depths.items()}
-
-    leaf_nodes = tree.get_terminals()
-    num_leaves = len(leaf_nodes)
-    leaf_angles = np.linspace(0, 2 * np.pi, num_leaves, endpoint=False)
-    clade_angles = {clade: angle for clade, angle in zip(leaf_nodes, leaf_angles)}
-
-    x_coords = {}
-    y_coords = {}
-
-    def assign_coords(clade):
-        r = depths.get(clade, 0)
-        if clade in clade_angles:
-            theta = clade_angles[clade]
-        else:
-            child_thetas = []
-            for child in clade.clades:
-                assign_coords(child)
-                child_thetas.append(x_coords[child])
-            theta = np.mean(child_thetas)
-        x_coords[clade] = theta
-        y_coords[clade] = r
-
-    assign_coords(tree.root)
-
-    fig = go.Figure()
+    leaf_nodes, clade_angles, x_coords, y_coords = circular_coordinates(tree)
+
+    tip_selection = selection_trace([np.degrees(clade_angles[clade]) for clade in leaf_nodes],
+                                    [y_coords[clade] for clade in leaf_nodes], polar=True)
+    fig = go.Figure(data=search_highlight_traces(polar=True) + [tip_selection, tip_label_trace()])
 
     for clade in x_coords:
         for child in clade.clades:
@@ -69,16 +209,29 @@ def plot_tree_circular(tree, metadata_dict):
             text=f"{clade.name} ({color})"
         ))
 
+    leaf_names = [clade.name for clade in leaf_nodes]
+    leaf_angles = np.array([clade_angles[clade] for clade in leaf_nodes])
+    rings, rings_end = dataset_ring_traces(datasets, leaf_angles, leaf_names, arc_r_end + RING_GAP)
+    fig.add_traces(rings)
+
+    label_r = rings_end + RING_GAP
+    if show_labels:
+        shown = visible_tip_labels(leaf_angles, sector)
+        fig.data[TIP_LABEL_TRACE].update(tip_label_trace(leaf_angles[shown], [leaf_names[i] for i in shown], label_r).to_plotly_json())
+
     fig.update_layout(
         title="Radial Phylogenetic Tree with iTOL-style Metadata Ring",
         polar=dict(
             radialaxis=dict(visible=False),
             angularaxis=dict(showticklabels=False),
+            sector=list(sector),
             bgcolor="white"
         ),
+        meta=dict(tip_label_radius=label_r),
         showlegend=False,
         height=1000,
         width=1000,
+        margin=dict(l=120, r=120, t=100, b=100),
         paper_bgcolor="white",
         plot_bgcolor="white",
         font_color="black"
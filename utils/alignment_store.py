@@ -0,0 +1,184 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from config import ALIGNMENT_STORE_DIR, ALIGNMENT_STORE_MAX_AGE_DAYS, PROJECT_DIR, logger
+from utils.fasta_validation import FastaValidator, FastaValidationError, iter_fasta_records
+from utils.lru_cache import LRUCache
+
+# On-disk layout of one stored alignment (one directory per upload hash):
+#   matrix.u8   raw (n_sequences x n_columns) uint8 matrix, row-major, upper-case residues
+#   matrix.fai  samtools-faidx style table: name, length, offset, linebases, linebytes
+#   stats.tsv   per-sequence statistics from validation: name, length, gaps, n
+#   meta.json   shape of the matrix
+MATRIX_FILE = 'matrix.u8'
+INDEX_FILE = 'matrix.fai'
+STATS_FILE = 'stats.tsv'
+META_FILE = 'meta.json'
+PROJECT_KEY_PREFIX = 'project:'  # Keys of alignments stored inside a project bundle
+PROJECT_VERSION_SEPARATOR = '@'  # project:<name>@<manifest mtime>, so a re-ingest gets new keys
+OPEN_STORE_CACHE_SIZE = 16
+
+_OPEN_STORES = LRUCache('alignment', OPEN_STORE_CACHE_SIZE)
+
+
+class EncodedAlignment:
+    """Sequence names plus an (n_sequences x n_columns) uint8 matrix of upper-case residues."""
+
+    def __init__(self, names, matrix):
+        self.names = names
+        self.matrix = matrix
+        self.row_index = {name: i for i, name in enumerate(names)}
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def sequence(self, name):
+        """Returns one aligned sequence as a string, read straight from the matrix."""
+        return self.matrix[self.row_index[name]].tobytes().decode('ascii')
+
+
+def project_key(name, version=None):
+    """Store key of a project bundle's data; `version` keeps worker caches from serving an older ingest."""
+    return PROJECT_KEY_PREFIX + name + (f"{PROJECT_VERSION_SEPARATOR}{version}" if version else '')
+
+
+def project_name(key):
+    return key[len(PROJECT_KEY_PREFIX):].split(PROJECT_VERSION_SEPARATOR, 1)[0]
+
+
+def store_path(key):
+    if key.startswith(PROJECT_KEY_PREFIX):
+        return os.path.join(PROJECT_DIR, project_name(key), 'alignment')
+    return os.path.join(ALIGNMENT_STORE_DIR, key)
+
+
+def build_alignment_store(key, data, directory=None):
+    """
+    Encodes FASTA bytes into the on-disk store for `key` (or into `directory`), one sequence at a time.
+    The directory is written under a temporary name and renamed, so readers never see partial stores.
+    """
+    final_dir = directory or store_path(key)
+    if os.path.exists(os.path.join(final_dir, META_FILE)):
+        return final_dir
+
+    parent_dir = os.path.dirname(os.path.abspath(final_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=".alignment-", dir=parent_dir)
+
+    try:
+        validator = FastaValidator()
+        with open(os.path.join(work_dir, MATRIX_FILE), 'wb') as matrix_out, \
+                open(os.path.join(work_dir, INDEX_FILE), 'w') as index_out, \
+                open(os.path.join(work_dir, STATS_FILE), 'w') as stats_out:
+            stats_out.write("name\tlength\tgaps\tn\n")
+            for name, sequence in iter_fasta_records(io.BytesIO(data)):
+                # ✅ Keep validating after the first problem, but stop writing a store that will be discarded
+                validator.add(name, sequence)
+                if validator.n_problems == 0:
+                    n_cols = len(sequence)
+                    offset = (validator.n_sequences - 1) * n_cols
+                    matrix_out.write(sequence.upper())
+                    index_out.write(f"{name}\t{n_cols}\t{offset}\t{n_cols}\t{n_cols}\n")
+                    stats_out.write(f"{name}\t{n_cols}\t{validator.gap_counts[-1]}\t{validator.n_counts[-1]}\n")
+                if validator.full:
+                    break
+
+        report = validator.report()
+        if not report.ok:
+            raise FastaValidationError(report)
+        n_rows, n_cols = report.n_sequences, report.alignment_length
+
+        with open(os.path.join(work_dir, META_FILE), 'w') as meta_out:
+            json.dump({'n_sequences': n_rows, 'n_columns': n_cols}, meta_out)
+
+        try:
+            os.replace(work_dir, final_dir)
+        except OSError:
+            # Another worker finished the same upload first; its copy is identical
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        logger.info(f"Stored alignment {key[:24]}: {n_rows} sequences x {n_cols} columns")
+        if directory is None and not key.startswith(PROJECT_KEY_PREFIX):
+            prune_alignment_stores()
+        return final_dir
+
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+
+def open_alignment_store(key):
+    """Opens a stored alignment as a read-only memory map; returns None if it is not stored."""
+    directory = store_path(key)
+    meta_path = os.path.join(directory, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        names = [line.split('\t', 1)[0] for line in f]
+
+    matrix = np.memmap(os.path.join(directory, MATRIX_FILE), dtype=np.uint8, mode='r',
+                       shape=(meta['n_sequences'], meta['n_columns']))
+    return EncodedAlignment(names, matrix)
+
+
+def load_sequence_stats(key):
+    """Reads the per-sequence statistics recorded while the alignment was validated."""
+    return pd.read_csv(os.path.join(store_path(key), STATS_FILE), sep='\t', dtype={'name': str}, keep_default_na=False)
+
+
+def get_alignment(key):
+    """Returns the alignment for `key`, memory-mapping it from disk on first use in this worker."""
+    alignment = _OPEN_STORES.get(key)
+    if alignment is None:
+        alignment = open_alignment_store(key)
+        if alignment is None:
+            return None
+        _OPEN_STORES.put(key, alignment)
+    if not key.startswith(PROJECT_KEY_PREFIX):
+        try:
+            os.utime(os.path.join(store_path(key), META_FILE))  # Marks the upload as in use for pruning
+        except OSError:
+            pass
+    return alignment
+
+
+def prune_alignment_stores(max_age_days=ALIGNMENT_STORE_MAX_AGE_DAYS, store_dir=ALIGNMENT_STORE_DIR):
+    """
+    Removes uploaded alignment stores (and abandoned temporary directories) not used for
+    max_age_days; workers that still map a removed store keep reading it until they drop it.
+    """
+    if not max_age_days or not os.path.isdir(store_dir):
+        return 0
+    cutoff = time.time() - max_age_days * 24 * 60 * 60
+    removed = 0
+    for name in os.listdir(store_dir):
+        directory = os.path.join(store_dir, name)
+        meta_path = os.path.join(directory, META_FILE)
+        try:
+            last_used = os.path.getmtime(meta_path if os.path.exists(meta_path) else directory)
+        except OSError:
+            continue
+        if last_used < cutoff and os.path.isdir(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"Removed {removed} alignment store(s) unused for {max_age_days:g} days")
+    return removed
+
+
+def load_alignment_bytes(key, data):
+    """Builds the store for an upload if needed and returns the memory-mapped alignment."""
+    alignment = get_alignment(key)
+    if alignment is None:
+        build_alignment_store(key, data)
+        alignment = get_alignment(key)
+    return alignment
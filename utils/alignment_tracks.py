@@ -0,0 +1,122 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from config import logger
+from utils.alignment_store import open_alignment_store, store_path
+from utils.variable_sites import column_counts, MISSING_CODES, GAP_CODES, CELLS_PER_CHUNK, MAX_CHUNK_COLUMNS
+from utils.lru_cache import LRUCache
+
+TRACKS_FILE = 'tracks.npz'
+TRACK_NAMES = ['consensus', 'entropy', 'gap_fraction', 'coverage']
+PARALLEL_MIN_CELLS = 200_000_000  # Below this a single process is faster than starting a pool
+TRACK_CACHE_SIZE = 16
+
+_TRACK_CACHE = LRUCache('alignment_tracks', TRACK_CACHE_SIZE)
+
+
+def _track_chunk(matrix, start, stop):
+    """Computes consensus code, Shannon entropy, gap fraction and coverage for columns [start, stop)."""
+    n_rows = matrix.shape[0]
+    counts = column_counts(np.asarray(matrix[:, start:stop]))
+
+    state_codes = np.setdiff1d(np.arange(256), MISSING_CODES)
+    states = counts[:, state_codes]
+    called = states.sum(axis=1)
+
+    consensus = np.where(called > 0, state_codes[states.argmax(axis=1)], ord('-')).astype(np.uint8)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = states / called[:, np.newaxis]
+        entropy = np.maximum(-np.nansum(np.where(p > 0, p * np.log2(p), 0.0), axis=1), 0.0)
+
+    gap_fraction = counts[:, GAP_CODES].sum(axis=1) / max(n_rows, 1)
+    coverage = called / max(n_rows, 1)
+    return consensus, entropy.astype(np.float32), gap_fraction.astype(np.float32), coverage.astype(np.float32)
+
+
+def _track_chunk_from_store(args):
+    """Process-pool entry point: each worker memory-maps the store itself instead of receiving data."""
+    key, start, stop = args
+    return _track_chunk(open_alignment_store(key).matrix, start, stop)
+
+
+def compute_alignment_tracks(key, matrix, max_workers=None):
+    """Computes all per-column tracks in column chunks, across a process pool for very wide alignments."""
+    n_rows, n_cols = matrix.shape
+    chunk = max(1, min(MAX_CHUNK_COLUMNS, CELLS_PER_CHUNK // max(n_rows, 1)))
+    bounds = [(start, min(start + chunk, n_cols)) for start in range(0, n_cols, chunk)]
+
+    if n_rows * n_cols >= PARALLEL_MIN_CELLS and len(bounds) > 1:
+        workers = max_workers or os.cpu_count() or 1
+        logger.info(f"Computing alignment tracks for {key[:8]} over {len(bounds)} chunks with {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_track_chunk_from_store, [(key, start, stop) for start, stop in bounds]))
+    else:
+        parts = [_track_chunk(matrix, start, stop) for start, stop in bounds]
+
+    return {name: np.concatenate([part[i] for part in parts]) for i, name in enumerate(TRACK_NAMES)}
+
+
+def get_alignment_tracks(key, matrix):
+    """Returns the tracks for an alignment key: worker memory, then the store's tracks.npz, then computed."""
+    tracks = _TRACK_CACHE.get(key)
+    if tracks is not None:
+        return tracks
+
+    path = os.path.join(store_path(key), TRACKS_FILE)
+    if os.path.exists(path):
+        with np.load(path) as saved:
+            tracks = {name: saved[name] for name in TRACK_NAMES}
+    else:
+        tracks = compute_alignment_tracks(key, matrix)
+        save_tracks(path, tracks)
+
+    return _TRACK_CACHE.put(key, tracks)
+
+
+def save_tracks(path, tracks):
+    """Writes tracks.npz under a temporary name and renames it, so other workers never load a partial file."""
+    fd, work_path = tempfile.mkstemp(prefix='.tracks-', suffix='.npz', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **tracks)
+        os.replace(work_path, path)
+    except Exception:
+        os.remove(work_path)
+        raise
+
+
+def create_track_figure(tracks, positions, selected):
+    """Plots the selected tracks for the alignment positions currently in the window."""
+    selected = [name for name in TRACK_NAMES if name in selected]
+    fig = make_subplots(rows=len(selected), cols=1, shared_xaxes=True, vertical_spacing=0.04)
+    x = (positions + 1).tolist()
+
+    for row, name in enumerate(selected, start=1):
+        values = tracks[name][positions]
+        if name == 'consensus':
+            letters = values.view('S1').astype(str).tolist()
+            fig.add_trace(go.Scatter(
+                x=x, y=[0] * len(x), mode='text', text=letters, textfont=dict(size=11),
+                hovertemplate="Position %{x}: consensus %{text}<extra></extra>", name='Consensus'
+            ), row=row, col=1)
+            fig.update_yaxes(visible=False, row=row, col=1)
+        else:
+            fig.add_trace(go.Bar(
+                x=x, y=np.round(values, 3).tolist(), name=name.replace('_', ' ').title(),
+                hovertemplate="Position %{x}: %{y}<extra></extra>"
+            ), row=row, col=1)
+            fig.update_yaxes(title_text=name.replace('_', ' ').title(), fixedrange=True, row=row, col=1)
+
+    fig.update_xaxes(type='category', showticklabels=False)
+    fig.update_layout(
+        height=60 + 70 * len(selected),
+        margin=dict(l=160, r=20, t=20, b=10),
+        showlegend=False,
+        plot_bgcolor='white',
+        bargap=0.1
+    )
+    return fig
@@ -0,0 +1,205 @@
+"""
+Headless batch rendering of tree and SNP heatmap figures for many pipeline runs.
+
+    python -m utils.batch_render manifest.tsv --out reports --formats svg,html --workers 4
+
+The manifest is a TSV or CSV file with a 'name' column and any of 'tree', 'metadata', 'matrix'
+(any format the SNP heatmap tab reads), 'labels' (the matrix's sample names, one per line, for
+formats that do not store them) and 'itol' (several iTOL files separated by ';'). Relative paths are resolved against the
+manifest's directory. Each run is written to <out>/<name>/ together with a state file, so an
+interrupted batch picks up where it stopped and unchanged runs are skipped on the next night.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from Bio import Phylo
+from config import logger
+from utils.rectangular_tree import create_tree_plot
+from utils.advanced_phylo_tree import plot_tree_circular
+from utils.snp_heatmap import create_snp_heatmap, subsample_matrix
+from utils.snp_matrix_store import read_matrix, read_labels
+from utils.file_processing import load_metadata
+from utils.itol import load_tree_annotations
+
+FORMATS = ('svg', 'png', 'pdf', 'html')
+MANIFEST_COLUMNS = ('tree', 'metadata', 'matrix', 'labels', 'itol')
+STATE_FILE = 'render_state.json'
+
+
+def read_manifest(path):
+    """Returns one job dict per manifest row, with input paths made absolute."""
+    sep = ',' if path.lower().endswith('.csv') else '\t'
+    manifest = pd.read_csv(path, sep=sep, dtype=str, keep_default_na=False)
+    if 'name' not in manifest.columns:
+        raise ValueError("The manifest must have a 'name' column.")
+    if manifest['name'].duplicated().any():
+        raise ValueError(f"Duplicate run names in the manifest: {sorted(set(manifest['name'][manifest['name'].duplicated()]))}")
+
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for row in manifest.to_dict('records'):
+        job = {'name': row['name'].strip()}
+        for column in MANIFEST_COLUMNS:
+            paths = [p.strip() for p in row.get(column, '').split(';') if p.strip()]
+            job[column] = [os.path.join(base, p) for p in paths]
+        jobs.append(job)
+    return jobs
+
+
+def _fingerprint(job, formats, show_labels):
+    """Changes whenever an input file (path, size or mtime) or the requested output changes."""
+    digest = hashlib.sha1(json.dumps([sorted(formats), show_labels]).encode())
+    for column in MANIFEST_COLUMNS:
+        for path in job[column]:
+            stat = os.stat(path)
+            digest.update(f"{column}:{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def job_figures(job, show_labels=False, palette='Plotly', heatmap_palette='viridis'):
+    """Builds the figures of one run with the same functions the dashboard uses."""
+    figures = {}
+    if job['tree']:
+        tree = Phylo.read(job['tree'][0], 'newick')
+        tree.root_at_midpoint()
+
+    if job['tree'] and job['metadata']:
+        metadata = load_metadata(job['metadata'][0], columns=['location', 'MLST'])
+        figures['tree'] = create_tree_plot(tree, metadata, show_labels, palette, palette)
+
+    if job['tree'] and job['itol']:
+        tip_names = [clade.name.strip() if clade.name else None for clade in tree.get_terminals()]
+        files = []
+        for path in job['itol']:
+            with open(path, 'rb') as f:
+                files.append((f.read(), path))
+        colors, datasets, _ = load_tree_annotations(files, tip_names)
+        colors = {clade.name: colors[name] for clade, name in zip(tree.get_terminals(), tip_names) if name in colors}
+        figures['tree_circular'] = plot_tree_circular(tree, colors, datasets)
+
+    if job['matrix']:
+        labels = None
+        if job['labels']:
+            with open(job['labels'][0], 'rb') as f:
+                labels = read_labels(f.read())
+        with open(job['matrix'][0], 'rb') as f:
+            values, index, columns = read_matrix(f.read(), job['matrix'][0], labels)
+        shown, _ = subsample_matrix(pd.DataFrame(values, index=index, columns=columns))
+        figures['snp_heatmap'] = create_snp_heatmap(shown.reset_index(names='Sample'), heatmap_palette)
+    return figures
+
+
+def _write(fig, path, file_format):
+    """Writes one figure through a temporary file so a killed run never leaves a truncated output."""
+    tmp_path = f"{path}.tmp"
+    if file_format == 'html':
+        fig.write_html(tmp_path, include_plotlyjs='cdn')
+    else:
+        fig.write_image(tmp_path, format=file_format)
+    os.replace(tmp_path, path)
+
+
+def render_job(job, out_dir, formats, show_labels=False, force=False):
+    """Renders one run; returns (name, status, message) where status is 'done', 'skipped' or 'failed'."""
+    run_dir = os.path.join(out_dir, job['name'])
+    state_path = os.path.join(run_dir, STATE_FILE)
+    try:
+        fingerprint = _fingerprint(job, formats, show_labels)
+        if not force and os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+            if state.get('fingerprint') == fingerprint and all(
+                    os.path.exists(os.path.join(run_dir, output)) for output in state.get('outputs', [])):
+                return job['name'], 'skipped', "up to date"
+
+        start = time.time()
+        figures = job_figures(job, show_labels)
+        if not figures:
+            return job['name'], 'failed', "nothing to render (needs tree + metadata/itol, or matrix)"
+
+        os.makedirs(run_dir, exist_ok=True)
+        outputs = []
+        for figure_name, fig in figures.items():
+            for file_format in formats:
+                output = f"{figure_name}.{file_format}"
+                _write(fig, os.path.join(run_dir, output), file_format)
+                outputs.append(output)
+
+        with open(f"{state_path}.tmp", 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'outputs': outputs, 'rendered_at': time.time()}, f)
+        os.replace(f"{state_path}.tmp", state_path)
+        return job['name'], 'done', f"{len(outputs)} file(s) in {time.time() - start:.1f}s"
+
+    except Exception as e:
+        return job['name'], 'failed', str(e)
+
+
+def check_image_renderer():
+    """Fails fast when images are requested but Kaleido cannot find Chrome (its server would otherwise hang)."""
+    import kaleido
+    try:
+        kaleido.Kaleido()
+    except Exception as e:
+        raise RuntimeError(f"Image export is unavailable: {str(e)} Use --formats html, or install Chrome "
+                           f"with `kaleido_get_chrome`.") from None
+
+
+def _init_worker(formats):
+    """Starts one long-lived Kaleido/Chrome renderer per worker instead of one per image."""
+    if any(file_format != 'html' for file_format in formats):
+        try:
+            import kaleido
+            kaleido.start_sync_server(silence_warnings=True)
+        except Exception as e:
+            logger.warning(f"Could not start a persistent image renderer ({str(e)}); images will start one each")
+
+
+def render_manifest(jobs, out_dir, formats=('svg',), workers=None, show_labels=False, force=False):
+    """Renders all jobs in parallel worker processes and returns the (name, status, message) results."""
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unsupported format(s): {', '.join(sorted(unknown))}")
+    if any(file_format != 'html' for file_format in formats):
+        check_image_renderer()
+    os.makedirs(out_dir, exist_ok=True)
+
+    results = []
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(jobs), 1)),
+                             initializer=_init_worker, initargs=(tuple(formats),)) as pool:
+        futures = [pool.submit(render_job, job, out_dir, tuple(formats), show_labels, force) for job in jobs]
+        for k, future in enumerate(as_completed(futures), start=1):
+            name, status, message = future.result()
+            (logger.error if status == 'failed' else logger.info)(f"[{k}/{len(jobs)}] {name}: {status} ({message})")
+            results.append((name, status, message))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.batch_render", description=__doc__.split("\n\n")[0])
+    parser.add_argument("manifest", help="TSV/CSV with name, tree, metadata, matrix, labels and itol columns")
+    parser.add_argument("--out", default="reports", help="output directory (default: reports)")
+    parser.add_argument("--formats", default="svg", help=f"comma-separated, any of {', '.join(FORMATS)} (default: svg)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all CPUs)")
+    parser.add_argument("--show-tip-labels", action="store_true", help="label tips in rectangular trees")
+    parser.add_argument("--force", action="store_true", help="re-render runs that are already up to date")
+    args = parser.parse_args(argv)
+
+    jobs = read_manifest(args.manifest)
+    formats = [f.strip().lower() for f in args.formats.split(',') if f.strip()]
+    try:
+        results = render_manifest(jobs, args.out, formats, args.workers, args.show_tip_labels, args.force)
+    except (ValueError, RuntimeError) as e:
+        parser.exit(2, f"error: {str(e)}\n")
+    counts = {status: sum(1 for _, s, _ in results if s == status) for status in ('done', 'skipped', 'failed')}
+    print(f"Rendered {counts['done']}, skipped {counts['skipped']}, failed {counts['failed']} of {len(jobs)} run(s)")
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
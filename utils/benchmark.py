@@ -0,0 +1,304 @@
+"""
+Scaling benchmarks for the dashboard's main rendering entry points on synthetic data.
+
+    python -m utils.benchmark --scales 100,1000,10000 --baseline benchmark_baseline.json
+    python -m utils.benchmark --scales 100,1000,10000 --save-baseline
+
+Entry points: create_tree_plot and plot_tree_circular (balanced and ladder trees), and the
+update_snp_heatmap and display_msa callbacks (posted through the Dash test client, so the
+response size is what a browser would download). Each case runs in a fresh process with a
+time limit and reports wall time (best of --repeat), peak traced memory, trace count and
+serialized size. The `startup` case (once, not per scale) starts a fresh interpreter that
+imports the app and serves its first /_dash-layout, as a new worker would: wall time, the
+process's peak resident memory and the layout size. Against a baseline, slower, larger or failing cases are reported as
+regressions and the exit status is 1. Record the baseline on the machine you compare on.
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from utils import synthetic_data
+
+ENTRY_POINTS = ('startup', 'tree', 'circular', 'heatmap', 'msa')
+TREE_ENTRY_POINTS = ('tree', 'circular')
+MAX_SCALE = {'heatmap': 5000, 'msa': 20000}  # n x n matrices and n-row uploads beyond this exceed a request
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+TIME_NOISE_S = 0.05  # Timing differences below this are never regressions
+MEMORY_NOISE_MB = 5.0
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP_SCRIPT = '''
+import json, resource, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.server.test_client().get('/_dash-layout')
+print(json.dumps({'import_s': imported - start, 'wall_s': time.perf_counter() - start,
+                  'status': response.status_code, 'bytes': len(response.data),
+                  'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+
+def data_files(data_dir, n, shape, alignment_length):
+    """Writes (once) and returns the synthetic input files of one scale."""
+    os.makedirs(data_dir, exist_ok=True)
+    files = {
+        'tree': (f"tree_{shape}_{n}.nwk", lambda: synthetic_data.newick_tree(n, shape).encode()),
+        'metadata': (f"metadata_{n}.tsv", lambda: synthetic_data.metadata_table(n).encode()),
+        'matrix': (f"snp_dists_{n}.tsv", lambda: synthetic_data.snp_dists_table(n).encode()),
+        'alignment': (f"alignment_{n}x{alignment_length}.fasta",
+                      lambda: synthetic_data.fasta_alignment(n, alignment_length)),
+    }
+    paths = {}
+    for kind, (filename, build) in files.items():
+        if kind == 'matrix' and n > MAX_SCALE['heatmap'] or kind == 'alignment' and n > MAX_SCALE['msa']:
+            continue
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path):
+            with open(f"{path}.tmp", 'wb') as f:
+                f.write(build())
+            os.replace(f"{path}.tmp", path)
+        paths[kind] = path
+    return paths
+
+
+def _data_url(path, mime):
+    with open(path, 'rb') as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
+
+
+def _count_traces(node):
+    """Number of traces in every plotly figure found in a serialized callback response."""
+    if isinstance(node, dict):
+        if 'figure' in node and isinstance(node['figure'], dict):
+            return len(node['figure'].get('data', [])) + sum(_count_traces(v) for k, v in node.items() if k != 'figure')
+        return sum(_count_traces(v) for v in node.values())
+    if isinstance(node, list):
+        return sum(_count_traces(v) for v in node)
+    return 0
+
+
+def prepare_case(entry, paths):
+    """Loads inputs outside the timed region; returns a zero-argument function running the entry point."""
+    if entry in TREE_ENTRY_POINTS:
+        from Bio import Phylo
+        from utils.figure_payload import compact_figure, figure_json
+        from utils.metadata_loader import read_metadata_bytes
+
+        tree = Phylo.read(paths['tree'], 'newick')
+        tree.root_at_midpoint()
+        with open(paths['metadata'], 'rb') as f:
+            metadata = read_metadata_bytes(f.read(), paths['metadata'])
+
+        if entry == 'tree':
+            from utils.rectangular_tree import create_tree_plot
+            plot = lambda: create_tree_plot(tree, metadata[['taxa', 'location', 'MLST']], [], 'Plotly', 'Plotly')
+        else:
+            from utils.advanced_phylo_tree import plot_tree_circular
+            colors = dict(zip(metadata['taxa'], metadata['color'].astype(str)))
+            plot = lambda: plot_tree_circular(tree, colors)
+
+        def run():
+            fig = compact_figure(plot())  # as the tree callbacks send it
+            return fig, len(fig['data']), len(figure_json(fig))
+        return run
+
+    from utils.load_test import DashClient, InProcessTransport
+    client = DashClient(InProcessTransport())
+
+    if entry == 'heatmap':
+        values = {'upload-snp-matrix.contents': _data_url(paths['matrix'], 'text/tab-separated-values'),
+                  'upload-snp-matrix.filename': os.path.basename(paths['matrix']),
+                  'color-palette-dropdown-heatmap.value': 'viridis'}
+        output = 'snp-heatmap-container.children'
+    else:
+        contents = _data_url(paths['alignment'], 'application/octet-stream')
+        _, loaded, _ = client.call('msa-alignment-key.data', {'upload-fasta.contents': contents})
+        loaded = json.loads(loaded)
+        values = {'msa-alignment-key.data': loaded['response']['msa-alignment-key']['data'],
+                  'msa-column-start.value': 0, 'msa-row-start.value': 0, 'msa-window-width.value': 100,
+                  'msa-window-rows.value': 25, 'alignment-colorscale.value': 'nucleotide',
+                  'msa-variable-sites-only.value': [],
+                  'msa-tracks.value': ['consensus', 'entropy', 'gap_fraction', 'coverage']}
+        output = 'output-alignment-chart.children'
+
+    def run():
+        status, data, _ = client.call(output, values)
+        if status != 200:
+            raise RuntimeError(f"{output} returned HTTP {status}")
+        return data, _count_traces(json.loads(data)), len(data)
+    return run
+
+
+def _run_case(entry, paths, repeat, conn):
+    """Worker process body: times `repeat` runs, then one traced run for peak memory."""
+    try:
+        run = prepare_case(entry, paths)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _, traces, size = run()
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        conn.send({'status': 'ok', 'wall_s': round(min(times), 4), 'peak_mb': round(peak / 2 ** 20, 1),
+                   'traces': traces, 'bytes': size})
+    except BaseException as e:
+        conn.send({'status': 'error', 'message': f"{type(e).__name__}: {str(e)[:200]}"})
+    finally:
+        conn.close()
+
+
+def run_case(entry, paths, repeat=3, timeout=300):
+    """Runs one case in a fresh process (clean caches and memory) and returns its result dict."""
+    ctx = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_run_case, args=(entry, paths, repeat, child_conn), daemon=True)
+    process.start()
+    child_conn.close()
+    try:
+        if parent_conn.poll(timeout):
+            return parent_conn.recv()
+        return {'status': 'timeout', 'message': f"no result within {timeout}s"}
+    except EOFError:
+        return {'status': 'error', 'message': f"worker exited with code {process.exitcode}"}
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+
+def run_startup(repeat=3, timeout=300):
+    """Cold start of a worker: best of `repeat` fresh interpreters importing the app and serving its layout."""
+    runs = []
+    for _ in range(repeat):
+        try:
+            process = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=PROJECT_ROOT, capture_output=True,
+                                     text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {'status': 'timeout', 'message': f"no result within {timeout}s"}
+        lines = process.stdout.strip().splitlines()
+        if process.returncode or not lines:
+            return {'status': 'error', 'message': (process.stderr.strip().splitlines() or ['no output'])[-1][:200]}
+        runs.append(json.loads(lines[-1]))
+        if runs[-1]['status'] != 200:
+            return {'status': 'error', 'message': f"/_dash-layout returned HTTP {runs[-1]['status']}"}
+    best = min(runs, key=lambda run: run['wall_s'])
+    return {'status': 'ok', 'wall_s': round(best['wall_s'], 4), 'import_s': round(best['import_s'], 4),
+            'peak_mb': round(min(run['rss_mb'] for run in runs), 1), 'traces': 0, 'bytes': best['bytes']}
+
+
+def run_benchmarks(scales, shapes=synthetic_data.TREE_SHAPES, entries=ENTRY_POINTS, data_dir=None,
+                   repeat=3, timeout=300, alignment_length=1000):
+    """Runs every (entry, shape, scale) case and returns {case key: result}."""
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), 'snp_wf_benchmark_data')
+    results = {}
+    if 'startup' in entries:
+        results['startup'] = run_startup(repeat, timeout)
+        print(format_result('startup', results['startup']), flush=True)
+    for n in scales:
+        for shape in shapes:
+            paths = data_files(data_dir, n, shape, alignment_length)
+            for entry in entries:
+                if entry == 'startup':
+                    continue
+                # Matrix and alignment cases do not depend on the tree shape: run them once per scale
+                if entry not in TREE_ENTRY_POINTS and shape != shapes[0]:
+                    continue
+                key = f"{entry}/{shape if entry in TREE_ENTRY_POINTS else '-'}/{n}"
+                if n > MAX_SCALE.get(entry, n):
+                    results[key] = {'status': 'skipped', 'message': f"above the {MAX_SCALE[entry]} limit"}
+                else:
+                    results[key] = run_case(entry, paths, repeat, timeout)
+                print(format_result(key, results[key]), flush=True)
+    return results
+
+
+def format_result(key, result):
+    if result['status'] != 'ok':
+        return f"{key:<24} {result['status']:>8}  {result.get('message', '')}"
+    return (f"{key:<24} {result['wall_s']:>9.3f}s {result['peak_mb']:>9.1f} MB "
+            f"{result['traces']:>8} traces {result['bytes'] / 2 ** 20:>9.2f} MB JSON")
+
+
+def compare_to_baseline(results, baseline, time_tolerance=1.5, memory_tolerance=1.5, size_tolerance=1.05):
+    """Returns one message per regression: slower, more memory, more traces, larger payload or newly failing."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None or base['status'] == 'skipped' or result['status'] == 'skipped':
+            continue
+        if base['status'] == 'ok' and result['status'] != 'ok':
+            regressions.append(f"{key}: {result['status']} ({result.get('message', '')}), baseline was ok")
+            continue
+        if result['status'] != 'ok' or base['status'] != 'ok':
+            continue
+        if result['wall_s'] > base['wall_s'] * time_tolerance and result['wall_s'] - base['wall_s'] > TIME_NOISE_S:
+            regressions.append(f"{key}: wall time {base['wall_s']:.3f}s -> {result['wall_s']:.3f}s")
+        if result['peak_mb'] > base['peak_mb'] * memory_tolerance and result['peak_mb'] - base['peak_mb'] > MEMORY_NOISE_MB:
+            regressions.append(f"{key}: peak memory {base['peak_mb']:.1f} MB -> {result['peak_mb']:.1f} MB")
+        if result['traces'] > base['traces']:
+            regressions.append(f"{key}: traces {base['traces']} -> {result['traces']}")
+        if result['bytes'] > base['bytes'] * size_tolerance:
+            regressions.append(f"{key}: figure size {base['bytes']} -> {result['bytes']} bytes")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.benchmark", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", default="100,1000,10000", help="comma-separated tip/sample counts (default: 100,1000,10000)")
+    parser.add_argument("--shapes", default=",".join(synthetic_data.TREE_SHAPES), help="tree shapes: balanced, ladder")
+    parser.add_argument("--entries", default=",".join(ENTRY_POINTS), help=f"any of {', '.join(ENTRY_POINTS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case, best is kept (default: 3)")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds per case before it is stopped (default: 300)")
+    parser.add_argument("--alignment-length", type=int, default=1000, help="alignment columns (default: 1000)")
+    parser.add_argument("--data-dir", help="where synthetic inputs are cached (default: a temp directory)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help=f"baseline JSON (default: {DEFAULT_BASELINE})")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--time-tolerance", type=float, default=1.5, help="allowed slowdown factor (default: 1.5)")
+    parser.add_argument("--memory-tolerance", type=float, default=1.5, help="allowed peak memory factor (default: 1.5)")
+    args = parser.parse_args(argv)
+
+    def listed(text):
+        return [item.strip() for item in text.split(',') if item.strip()]
+
+    unknown = set(listed(args.entries)) - set(ENTRY_POINTS) | set(listed(args.shapes)) - set(synthetic_data.TREE_SHAPES)
+    if unknown:
+        parser.exit(2, f"error: unknown entry point or shape: {', '.join(sorted(unknown))}\n")
+
+    results = run_benchmarks([int(n) for n in listed(args.scales)], tuple(listed(args.shapes)), listed(args.entries),
+                             args.data_dir, args.repeat, args.timeout, args.alignment_length)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"Saved {len(results)} case(s) to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare_to_baseline(results, json.load(f), args.time_tolerance, args.memory_tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    print(f"{len(regressions)} regression(s) in {len(results)} case(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Per-callback instrumentation: duration, request/response bytes, outcome, cache hits and
+(sampled) peak traced memory, exposed in Prometheus text format at /metrics.
+
+Callbacks catch their exceptions and return error_message(...) in place of an output; that marks
+the call as an error in the metrics and sets the ERROR_HEADER response header for clients.
+
+Metrics are kept per worker process; with several gunicorn workers each scrape sees the worker
+that answered it (the `pid` label tells them apart). Sending the PROFILE_HEADER header with a
+callback request (PROFILE_ENABLED on) writes a cProfile dump of that call to PROFILE_DIR and
+returns its path in the X-Profile-File response header.
+"""
+import bisect
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from functools import wraps
+from dash.exceptions import PreventUpdate
+from config import METRICS_MEMORY_SAMPLE_RATE, PROFILE_DIR, PROFILE_ENABLED, PROFILE_HEADER, logger
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = 'snp_wf'
+ERROR_CLASS = 'text-danger'
+ERROR_HEADER = 'X-Callback-Error'
+
+_lock = threading.Lock()
+_memory_lock = threading.Lock()  # tracemalloc is process-wide: trace one sampled call at a time
+_current = threading.local()
+
+
+class CallbackStats:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(DURATION_BUCKETS) + 1)
+        self.duration_sum = 0.0
+        self.outcomes = defaultdict(int)
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.memory_samples = 0
+        self.peak_memory = 0
+
+
+_callbacks = defaultdict(CallbackStats)
+_caches = defaultdict(int)  # (cache, callback, 'hit' | 'miss') -> count
+
+
+def record_cache(cache, hit):
+    """Counts one lookup in a named server-side cache, attributed to the callback being served."""
+    key = (cache, getattr(_current, 'label', ''), 'hit' if hit else 'miss')
+    with _lock:
+        _caches[key] += 1
+
+
+def _request_info():
+    """(request body bytes, profiling requested) of the Flask request being served, if any."""
+    try:
+        from flask import has_request_context, request
+    except ImportError:
+        return 0, False
+    if not has_request_context():
+        return 0, False
+    return request.content_length or 0, PROFILE_ENABLED and PROFILE_HEADER in request.headers
+
+
+def _write_profile(profiler, label):
+    """Dumps a cProfile run to PROFILE_DIR, logs its top functions and returns the file path."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{label}-{int(time.time() * 1000)}-{os.getpid()}.prof")
+    profiler.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(15)
+    logger.info(f"Profiled {label} -> {path}\n{summary.getvalue()}")
+    try:
+        from flask import after_this_request
+
+        @after_this_request
+        def add_header(response):
+            response.headers['X-Profile-File'] = path
+            return response
+    except (ImportError, RuntimeError):
+        pass
+    return path
+
+
+def error_message(children):
+    """
+    The error component a callback returns in place of its output. Marks the call being served as
+    failed, for the metrics and (through ERROR_HEADER) for the client.
+    """
+    from dash import html
+
+    _current.failed = True
+    try:
+        from flask import after_this_request
+
+        @after_this_request
+        def add_header(response):
+            response.headers[ERROR_HEADER] = '1'
+            return response
+    except (ImportError, RuntimeError):
+        pass
+    return html.Div(children, className=ERROR_CLASS)
+
+
+def instrument(func, label):
+    """Wraps a Dash callback (as stored in app.callback_map) with timing and size accounting."""
+    @wraps(func)
+    def instrumented(*args, **kwargs):
+        request_bytes, profile = _request_info()
+        trace_memory = (METRICS_MEMORY_SAMPLE_RATE > 0 and random.random() < METRICS_MEMORY_SAMPLE_RATE
+                        and _memory_lock.acquire(blocking=False))
+        profiler = cProfile.Profile() if profile else None
+        outcome, response, peak = 'error', None, None
+        _current.label = label
+        _current.failed = False
+        start = time.perf_counter()
+        try:
+            if trace_memory:
+                started_tracing = not tracemalloc.is_tracing()
+                if started_tracing:
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+            if profiler:
+                profiler.enable()
+            response = func(*args, **kwargs)
+            outcome = 'error' if _current.failed else 'ok'
+            return response
+        except PreventUpdate:
+            outcome = 'prevented'
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                _write_profile(profiler, label)
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+                _memory_lock.release()
+            _current.label = ''
+
+            with _lock:
+                stats = _callbacks[label]
+                stats.bucket_counts[bisect.bisect_left(DURATION_BUCKETS, duration)] += 1
+                stats.duration_sum += duration
+                stats.outcomes[outcome] += 1
+                stats.request_bytes += request_bytes
+                stats.response_bytes += len(response) if isinstance(response, (str, bytes)) else 0
+                if peak is not None:
+                    stats.memory_samples += 1
+                    stats.peak_memory = max(stats.peak_memory, peak)
+
+    return instrumented
+
+
+def instrument_callbacks(app):
+    """Wraps every callback registered on the app; call after all register_*_callbacks functions."""
+    for entry in app.callback_map.values():
+        callback = entry.get('callback')  # Clientside callbacks run in the browser
+        if callback is not None and not getattr(callback, '_instrumented', False):
+            entry['callback'] = instrument(callback, getattr(callback, '__name__', 'callback'))
+            entry['callback']._instrumented = True
+
+
+def _resident_memory():
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS:'))
+    except (OSError, StopIteration):
+        return None
+
+
+def _labels(**labels):
+    text = ",".join(f'{k}="{str(v)}"' for k, v in labels.items())
+    return "{" + text + "}"
+
+
+def render_metrics():
+    """All metrics of this worker in the Prometheus text exposition format."""
+    pid = os.getpid()
+    name = f"{METRIC_PREFIX}_callback"
+    lines = [
+        f"# HELP {name}_duration_seconds Callback duration, including response serialization.",
+        f"# TYPE {name}_duration_seconds histogram",
+    ]
+    with _lock:
+        callbacks = {label: stats for label, stats in sorted(_callbacks.items())}
+        for label, stats in callbacks.items():
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + ('+Inf',), stats.bucket_counts):
+                cumulative += count
+                lines.append(f"{name}_duration_seconds_bucket{_labels(callback=label, pid=pid, le=bound)} {cumulative}")
+            lines.append(f"{name}_duration_seconds_sum{_labels(callback=label, pid=pid)} {stats.duration_sum:.6f}")
+            lines.append(f"{name}_duration_seconds_count{_labels(callback=label, pid=pid)} {cumulative}")
+
+        lines += [f"# HELP {name}_calls_total Callback calls by outcome (ok, prevented, error).",
+                  f"# TYPE {name}_calls_total counter"]
+        lines += [f"{name}_calls_total{_labels(callback=label, pid=pid, outcome=outcome)} {count}"
+                  for label, stats in callbacks.items() for outcome, count in sorted(stats.outcomes.items())]
+
+        for metric, attr, text in (('request_bytes', 'request_bytes', 'Callback request body bytes (inputs).'),
+                                   ('response_bytes', 'response_bytes', 'Callback response bytes (outputs).')):
+            lines += [f"# HELP {name}_{metric}_total {text}", f"# TYPE {name}_{metric}_total counter"]
+            lines += [f"{name}_{metric}_total{_labels(callback=label, pid=pid)} {getattr(stats, attr)}"
+                      for label, stats in callbacks.items()]
+
+        lines += [f"# HELP {name}_peak_memory_bytes Largest traced peak memory of a sampled call.",
+                  f"# TYPE {name}_peak_memory_bytes gauge"]
+        lines += [f"{name}_peak_memory_bytes{_labels(callback=label, pid=pid)} {stats.peak_memory}"
+                  for label, stats in callbacks.items() if stats.memory_samples]
+
+        lines += [f"# HELP {METRIC_PREFIX}_cache_requests_total Server-side cache lookups by result.",
+                  f"# TYPE {METRIC_PREFIX}_cache_requests_total counter"]
+        lines += [f"{METRIC_PREFIX}_cache_requests_total{_labels(cache=cache, callback=label, pid=pid, result=result)} {count}"
+                  for (cache, label, result), count in sorted(_caches.items())]
+
+    rss = _resident_memory()
+    if rss is not None:
+        lines += [f"# HELP {METRIC_PREFIX}_process_resident_memory_bytes Resident memory of this worker.",
+                  f"# TYPE {METRIC_PREFIX}_process_resident_memory_bytes gauge",
+                  f"{METRIC_PREFIX}_process_resident_memory_bytes{_labels(pid=pid)} {rss}"]
+    return "\n".join(lines) + "\n"
+
+
+def register_metrics_route(server, path='/metrics'):
+    """Adds the Prometheus scrape endpoint to the Flask server."""
+    from flask import Response
+
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    server.add_url_rule(path, 'metrics', metrics)
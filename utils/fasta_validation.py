@@ -0,0 +1,163 @@
+import numpy as np
+
+READ_BLOCK_SIZE = 8 * 1024 * 1024
+MAX_PROBLEMS = 20
+
+# ✅ Accepted residue codes: IUPAC nucleotide/amino-acid letters plus gap, stop and unknown symbols
+_VALID_CODES = np.zeros(256, dtype=bool)
+_VALID_CODES[np.frombuffer(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-.*?', dtype=np.uint8)] = True
+_GAP_CODES = np.frombuffer(b'-.', dtype=np.uint8)
+_N_CODES = np.frombuffer(b'NnXx?', dtype=np.uint8)
+_WHITESPACE = b'\r\n \t'
+
+
+class FastaValidationError(ValueError):
+    """Raised when an uploaded FASTA fails validation; carries the full report."""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__("; ".join(report.problems) or "Uploaded file is not a valid FASTA file.")
+
+
+class FastaValidator:
+    """
+    Single-pass validator fed one record at a time: checks headers, duplicate names,
+    alphabet and equal lengths, and keeps small per-sequence statistics.
+    """
+
+    def __init__(self, max_problems=MAX_PROBLEMS):
+        self.max_problems = max_problems
+        self.problems = []
+        self.n_problems = 0
+        self.n_sequences = 0
+        self.alignment_length = None
+        self.names = set()
+        self.lengths = []
+        self.gap_counts = []
+        self.n_counts = []
+
+    @property
+    def ok(self):
+        return self.n_problems == 0 and self.n_sequences > 0
+
+    @property
+    def full(self):
+        """True once max_problems problems were seen; callers can stop reading early."""
+        return self.n_problems >= self.max_problems
+
+    def _problem(self, message):
+        self.n_problems += 1
+        if len(self.problems) < self.max_problems:
+            self.problems.append(message)
+
+    def add(self, name, sequence):
+        """Checks one record; returns True if it is valid so far."""
+        n_before = self.n_problems
+        label = f"Sequence {self.n_sequences + 1}"
+        self.n_sequences += 1
+
+        if not name:
+            self._problem(f"{label}: empty header.")
+        elif name in self.names:
+            self._problem(f"{label}: duplicate name '{name}'.")
+        else:
+            self.names.add(name)
+
+        codes = np.frombuffer(sequence, dtype=np.uint8)
+        counts = np.bincount(codes, minlength=256)
+
+        invalid = np.flatnonzero(counts[~_VALID_CODES])
+        if len(invalid):
+            bad = bytes(np.flatnonzero(~_VALID_CODES)[invalid].astype(np.uint8)).decode('latin-1')
+            self._problem(f"{label} '{name}': invalid characters {bad!r}.")
+
+        if len(codes) == 0:
+            self._problem(f"{label} '{name}': empty sequence.")
+        elif self.alignment_length is None:
+            self.alignment_length = len(codes)
+        elif len(codes) != self.alignment_length:
+            self._problem(f"{label} '{name}': length {len(codes)} differs from "
+                          f"alignment length {self.alignment_length}.")
+
+        self.lengths.append(len(codes))
+        self.gap_counts.append(int(counts[_GAP_CODES].sum()))
+        self.n_counts.append(int(counts[_N_CODES].sum()))
+        return self.n_problems == n_before
+
+    def report(self):
+        """Returns a FastaReport with per-sequence statistics as numpy arrays."""
+        if self.n_sequences == 0 and not self.problems:
+            self._problem("No FASTA records found (the file must start with a '>' header).")
+        return FastaReport(self)
+
+
+class FastaReport:
+    """Result of a validation pass."""
+
+    def __init__(self, validator):
+        self.ok = validator.ok
+        self.problems = list(validator.problems)
+        self.n_problems = validator.n_problems
+        self.n_sequences = validator.n_sequences
+        self.alignment_length = validator.alignment_length or 0
+        self.lengths = np.asarray(validator.lengths, dtype=np.int64)
+        self.gap_counts = np.asarray(validator.gap_counts, dtype=np.int64)
+        self.n_counts = np.asarray(validator.n_counts, dtype=np.int64)
+
+    @property
+    def completeness(self):
+        """Per-sequence fraction of columns that are neither gap nor N."""
+        called = self.lengths - self.gap_counts - self.n_counts
+        return called / np.maximum(self.lengths, 1)
+
+
+def iter_fasta_records(stream, block_size=READ_BLOCK_SIZE):
+    """
+    Yields (name, sequence bytes) from a binary FASTA stream.
+    Reads fixed-size blocks and splits whole records with bytes operations, so only one
+    block plus one record is held in memory and line splitting happens in C.
+    """
+    parts = []
+    tail = b''
+    at_start = True
+    while True:
+        block = stream.read(block_size)
+        if at_start and block:
+            block = block.lstrip()
+            if not block:
+                continue
+            if not block.startswith(b'>'):
+                raise FastaValidationError(_single_problem("Data found before the first '>' header."))
+            at_start = False
+
+        if not block:
+            if parts:
+                for record in b''.join(parts).split(b'\n>'):
+                    yield _parse_record(record)
+            return
+
+        # Every complete record ends right before the last "\n>" (which may straddle two blocks)
+        last = (tail + block).rfind(b'\n>')
+        if last < 0:
+            parts.append(block)
+        else:
+            cut = last - len(tail) + 1
+            parts.append(block[:cut])
+            for record in b''.join(parts).split(b'\n>'):
+                yield _parse_record(record)
+            parts = [block[cut:]]
+        tail = block[-1:]
+
+
+def _parse_record(record):
+    header, _, body = record.partition(b'\n')
+    fields = header.lstrip(b'>').split(None, 1)
+    name = fields[0].decode('utf-8', 'replace') if fields else ''
+    return name, body.translate(None, _WHITESPACE)
+
+
+def _single_problem(message):
+    validator = FastaValidator()
+    validator._problem(message)
+    return validator.report()
+
@@ -0,0 +1,292 @@
+"""
+Compaction of plotly figures before they leave the server.
+
+    python -m utils.figure_payload --tips 1000,10000   # before/after bytes on synthetic data
+
+compact_figure() rewrites a figure into an equivalent, much smaller one:
+- traces that differ only in their points (one per branch or tip in the tree plots) are merged
+  into one trace per style, line segments separated by gaps;
+- numeric arrays are sent as base64 typed arrays (plotly.js `bdata`): the smallest integer
+  type for integer data, otherwise float32 rounded to DISPLAY_MANTISSA_BITS (a relative error
+  below 1e-4, under a pixel on any figure this app draws) so the zeroed low bytes gzip well;
+- attributes shared by every trace of a type move into the figure's template.
+Named traces, legend entries and filled shapes are never merged and keep their position, so
+the search highlight traces stay at data[0] and data[1] for the Patch updates.
+"""
+import argparse
+import base64
+import copy
+import gzip
+import io
+import json
+import numpy as np
+
+MERGEABLE_TYPES = {'scatter': ('x', 'y'), 'scattergl': ('x', 'y'), 'scatterpolar': ('r', 'theta')}
+POINT_KEYS = ('text', 'hovertext', 'customdata')
+TEMPLATE_EXCLUDED = {'type', 'uid', 'name', 'legendgroup', 'xaxis', 'yaxis', 'subplot', 'showlegend'}
+MIN_TYPED_LENGTH = 8  # Shorter lists (ranges, domains) stay plain JSON
+DISPLAY_MANTISSA_BITS = 13  # Of float32's 23
+INT_DTYPES = (('u1', np.uint8), ('i1', np.int8), ('u2', np.uint16), ('i2', np.int16), ('u4', np.uint32),
+              ('i4', np.int32))
+
+
+def typed_array(values):
+    """A plotly.js typed-array spec for a numeric list or array, or None if it is not numeric."""
+    try:
+        array = np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        return None
+    if array.ndim not in (1, 2) or array.size == 0:
+        return None
+    finite = np.isfinite(array)
+    if finite.all() and np.array_equal(array, np.round(array)):
+        low, high = array.min(), array.max()
+        for name, dtype in INT_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                array = array.astype(dtype)
+                break
+        else:
+            array, name = _round_float32(array), 'f4'
+    else:
+        array, name = _round_float32(array), 'f4'
+    spec = {'dtype': name, 'bdata': base64.b64encode(np.ascontiguousarray(array).tobytes()).decode('ascii')}
+    if array.ndim == 2:
+        spec['shape'] = f"{array.shape[0]}, {array.shape[1]}"
+    return spec
+
+
+def _round_float32(array, bits=DISPLAY_MANTISSA_BITS):
+    """float32 copy of `array` with the mantissa rounded to `bits` bits (NaN and inf pass through)."""
+    values = np.ascontiguousarray(array, dtype=np.float32)
+    raw = values.view(np.uint32)
+    drop = 23 - bits
+    rounded = ((raw + np.uint32(1 << (drop - 1))) & np.uint32(~((1 << drop) - 1) & 0xFFFFFFFF)).view(np.float32)
+    return np.where(np.isfinite(values), rounded, values)
+
+
+def _is_typed_array(value):
+    return isinstance(value, dict) and 'bdata' in value and 'dtype' in value
+
+
+def _decode_typed_array(spec):
+    dtype = np.dtype({'f8': 'f8', 'f4': 'f4', 'i4': 'i4', 'u4': 'u4', 'i2': 'i2', 'u2': 'u2', 'i1': 'i1',
+                      'u1': 'u1', 'u1c': 'u1'}.get(spec['dtype'], 'f8'))
+    array = np.frombuffer(base64.b64decode(spec['bdata']), dtype=dtype)
+    if 'shape' in spec:
+        array = array.reshape([int(n) for n in str(spec['shape']).split(',')])
+    return array
+
+
+def _is_numeric_array(value):
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in 'biuf' and value.size >= MIN_TYPED_LENGTH
+    if not isinstance(value, (list, tuple)) or len(value) < MIN_TYPED_LENGTH:
+        return False
+    items = value[0] if value and isinstance(value[0], (list, tuple)) else value
+    return all(item is None or (isinstance(item, (int, float, np.number)) and not isinstance(item, bool))
+               for item in items)
+
+
+def _encode_arrays(node):
+    """Replaces every numeric data array in a trace (recursively) by its typed-array spec."""
+    for key, value in node.items():
+        if _is_typed_array(value):
+            node[key] = typed_array(_decode_typed_array(value)) or value  # e.g. plotly's own f8 arrays
+        elif isinstance(value, dict):
+            _encode_arrays(value)
+        elif _is_numeric_array(value):
+            spec = typed_array([np.nan if item is None else item for item in value]
+                               if isinstance(value, (list, tuple)) and not isinstance(value[0], (list, tuple))
+                               else value)
+            if spec is not None:
+                node[key] = spec
+
+
+def _has_arrays(node):
+    return any(_has_arrays(value) if isinstance(value, dict) and not _is_typed_array(value)
+               else isinstance(value, (list, tuple, np.ndarray)) or _is_typed_array(value) for value in node.values())
+
+
+def _merge_key(trace, legend_shown):
+    """Style signature of a trace that can be merged with others, or None."""
+    coords = MERGEABLE_TYPES.get(trace.get('type', 'scatter'))
+    if coords is None or trace.get('name') or trace.get('fill') not in (None, 'none'):
+        return None
+    if legend_shown and trace.get('showlegend', True):
+        return None
+    if any(not isinstance(trace.get(key), (list, tuple, np.ndarray)) and not _is_typed_array(trace.get(key))
+           for key in coords):
+        return None
+    style = {key: value for key, value in trace.items() if key not in coords and key not in POINT_KEYS}
+    if _has_arrays(style):
+        return None
+    return json.dumps(style, sort_keys=True, default=str)
+
+
+def _merge(traces):
+    """One trace drawing all of `traces` (same type and style)."""
+    first = traces[0]
+    coords = MERGEABLE_TYPES[first.get('type', 'scatter')]
+    # to_plotly_json() sends numpy arrays as typed-array specs; merge their values
+    traces = [{key: _decode_typed_array(value) if key in coords + POINT_KEYS and _is_typed_array(value) else value
+               for key, value in trace.items()} for trace in traces]
+    lines = 'lines' in first.get('mode', 'lines')
+    merged = copy.deepcopy({key: value for key, value in first.items() if key not in coords and key not in POINT_KEYS})
+
+    lengths = [len(trace[coords[0]]) for trace in traces]
+    for key in coords:
+        parts = []
+        for trace in traces:
+            parts.append(np.array([np.nan if v is None else v for v in trace[key]], dtype=float))
+            if lines:
+                parts.append(np.array([np.nan]))
+        merged[key] = np.concatenate(parts[:-1] if lines else parts).tolist()
+
+    for key in POINT_KEYS:
+        values = [trace.get(key) for trace in traces]
+        if all(value is None for value in values):
+            continue
+        if all(not isinstance(value, (list, tuple, np.ndarray)) for value in values) and len(set(map(str, values))) == 1:
+            merged[key] = values[0]
+            continue
+        points = []
+        for value, n in zip(values, lengths):
+            points.extend(list(value) if isinstance(value, (list, tuple, np.ndarray)) else [value] * n)
+            if lines:
+                points.append(None)
+        merged[key] = points[:-1] if lines else points
+    return merged
+
+
+def merge_traces(data, legend_shown=True):
+    """Merges same-style traces; each merged trace takes the position of its first member."""
+    out, groups = [], {}
+    for trace in data:
+        key = _merge_key(trace, legend_shown)
+        if key is None:
+            out.append([trace])
+        elif key in groups:
+            groups[key].append(trace)
+        else:
+            groups[key] = [trace]
+            out.append(groups[key])
+    return [copy.deepcopy(group[0]) if len(group) == 1 else _merge(group) for group in out]
+
+
+def _flatten(node, prefix=()):
+    for key, value in node.items():
+        if isinstance(value, dict) and value:
+            yield from _flatten(value, prefix + (key,))
+        else:
+            yield prefix + (key,), value
+
+
+def share_trace_styles(figure):
+    """Moves attributes that every trace of a type has in common into layout.template.data."""
+    template = figure.setdefault('layout', {}).setdefault('template', {})
+    if not isinstance(template, dict):
+        return
+    by_type = {}
+    for trace in figure['data']:
+        by_type.setdefault(trace.get('type', 'scatter'), []).append(trace)
+
+    for trace_type, traces in by_type.items():
+        if len(traces) < 2:
+            continue
+        common = dict(_flatten(traces[0]))
+        for trace in traces[1:]:
+            values = dict(_flatten(trace))
+            common = {path: value for path, value in common.items()
+                      if path in values and json.dumps(values[path], default=str) == json.dumps(value, default=str)}
+        common = {path: value for path, value in common.items()  # templates ignore data arrays
+                  if path[0] not in TEMPLATE_EXCLUDED and not isinstance(value, (dict, list, tuple, np.ndarray))}
+        if not common:
+            continue
+
+        entries = template.setdefault('data', {}).setdefault(trace_type, [])
+        if not entries:
+            entries.append({'type': trace_type})
+        for entry in entries:
+            for path, value in common.items():
+                node = entry
+                for key in path[:-1]:
+                    node = node.setdefault(key, {})
+                node[path[-1]] = value
+        for trace in traces:
+            for path in common:
+                _remove(trace, path)
+
+
+def _remove(node, path):
+    if len(path) == 1:
+        node.pop(path[0], None)
+        return
+    child = node.get(path[0])
+    if isinstance(child, dict):
+        _remove(child, path[1:])
+        if not child:
+            node.pop(path[0])
+
+
+def compact_figure(fig):
+    """The figure (go.Figure or plotly dict) as a compact plotly dict, ready for dcc.Graph."""
+    if hasattr(fig, 'to_plotly_json'):
+        fig = fig.to_plotly_json()
+    data, layout = fig.get('data', []), fig.get('layout', {})
+    figure = {'data': merge_traces(data, layout.get('showlegend', True) is not False), 'layout': copy.deepcopy(layout)}
+    share_trace_styles(figure)
+    for trace in figure['data']:
+        _encode_arrays(trace)
+    return figure
+
+
+def figure_json(fig):
+    """The JSON text Dash would send for a figure."""
+    from plotly.io.json import to_json_plotly
+    return to_json_plotly(fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else fig)
+
+
+def payload_sizes(fig):
+    """Bytes of the figure as sent before and after compaction, plain and gzipped."""
+    before = figure_json(fig).encode()
+    after = figure_json(compact_figure(fig)).encode()
+    return {'before': len(before), 'after': len(after),
+            'before_gzip': len(gzip.compress(before, 5)), 'after_gzip': len(gzip.compress(after, 5))}
+
+
+def synthetic_figures(n, seed=0):
+    """The rectangular tree, circular tree and SNP heatmap of synthetic n-sample data."""
+    import pandas as pd
+    from Bio import Phylo
+    from utils import synthetic_data
+    from utils.rectangular_tree import create_tree_plot
+    from utils.advanced_phylo_tree import plot_tree_circular
+    from utils.snp_heatmap import create_snp_heatmap
+
+    newick = synthetic_data.newick_tree(n, seed=seed)
+    metadata = pd.read_csv(io.StringIO(synthetic_data.metadata_table(n, seed)), sep='\t')
+    tree = Phylo.read(io.StringIO(newick), 'newick')
+    tree.root_at_midpoint()
+    yield 'tree', create_tree_plot(tree, metadata, False, 'Plotly', 'Plotly')
+    yield 'tree_circular', plot_tree_circular(Phylo.read(io.StringIO(newick), 'newick'),
+                                              dict(zip(metadata['taxa'], metadata['color'])))
+    yield 'snp_heatmap', create_snp_heatmap(pd.read_csv(io.StringIO(synthetic_data.snp_dists_table(n, seed)), sep='\t'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.figure_payload", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tips", default="1000", help="comma-separated sample counts (default: 1000)")
+    args = parser.parse_args(argv)
+
+    print(f"{'figure':<22}{'before':>12}{'after':>12}{'ratio':>8}{'gzip before':>14}{'gzip after':>12}")
+    for n in (int(item) for item in args.tips.split(',') if item.strip()):
+        for name, fig in synthetic_figures(n):
+            sizes = payload_sizes(fig)
+            print(f"{f'{name}/{n}':<22}{sizes['before']:>12,}{sizes['after']:>12,}"
+                  f"{sizes['before'] / sizes['after']:>7.1f}x{sizes['before_gzip']:>14,}{sizes['after_gzip']:>12,}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,4 +1,5 @@
 import base64
+import hashlib
 import io
 import pandas as pd
 from Bio import Phylo
@@ -22,12 +23,18 @@ def decode_uploaded_file(contents):
     except UnicodeDecodeError:
         return decoded  # Return raw bytes if not a text file
 
-def save_uploaded_tree(contents, filename="uploaded_tree.tree"):
-    """Decodes and saves a Newick tree file."""
-    decoded_tree = decode_uploaded_file(contents)
-    with open(filename, "w") as f:
-        f.write(decoded_tree)
-    return filename
+def decode_uploaded_bytes(contents):
+    """Decodes an uploaded file from Dash Upload component into raw bytes."""
+    content_type, content_string = contents.split(',')
+    return base64.b64decode(content_string)
+
+def hash_uploaded_contents(contents):
+    """Returns a stable SHA-1 key for the contents of a Dash Upload component."""
+    return hashlib.sha1(contents.encode('utf-8')).hexdigest()
+
+def read_uploaded_tree(contents):
+    """Parses an uploaded Newick tree in memory (a shared file on disk would be overwritten by concurrent users)."""
+    return Phylo.read(io.StringIO(decode_uploaded_file(contents)), 'newick')
 
 def save_uploaded_metadata(contents, filename="uploaded_metadata.tsv"):
     """Decodes and saves a metadata file."""
@@ -40,6 +47,15 @@ def load_tree(file_path):
     """Loads a phylogenetic tree from a Newick file."""
     return Phylo.read(file_path, 'newick')
 
-def load_metadata(file_path):
-    """Loads a metadata file into a Pandas DataFrame."""
-    return pd.read_csv(file_path, sep='\t')
+def load_snp_matrix(decoded, sep='\t'):
+    """Parses a snp-dists style tab-separated matrix into a square DataFrame indexed by sample name."""
+    df = pd.read_csv(io.StringIO(decoded), sep=sep, index_col=0)
+    df.index = df.index.astype(str).str.strip()
+    df.columns = df.columns.astype(str).str.strip()
+    return df.loc[:, df.index] if set(df.index) == set(df.columns) else df
+
+def load_metadata(file_path, columns=None):
+    """Loads a metadata file (TSV, CSV, Excel or iTOL) into a Pandas DataFrame."""
+    from utils.metadata_loader import read_metadata_bytes  # metadata_loader imports this module
+    with open(file_path, 'rb') as f:
+        return read_metadata_bytes(f.read(), file_path, columns)
@@ -0,0 +1,198 @@
+"""
+Offline gazetteer for geocoding without network access.
+
+The index is built once from a GeoNames dump (e.g. cities15000.txt or allCountries.txt
+from https://download.geonames.org/export/dump/) and saved as a compact .npz file:
+
+    python -m utils.gazetteer cities15000.txt gazetteer.npz
+
+Point GAZETTEER_PATH at the result to use it.
+
+Fuzzy lookups use a symmetric delete index: every key is stored under the hash of itself and of
+each string one character shorter, so a misspelled name finds the keys one edit away (a typo,
+missing, extra or swapped letter) by looking up its own deletions, not by scanning the index.
+"""
+import bisect
+import difflib
+import hashlib
+import re
+import sys
+import unicodedata
+import numpy as np
+
+# GeoNames main table columns used here
+_NAME, _ASCIINAME, _ALTERNATE, _LAT, _LON, _COUNTRY, _ADMIN1, _POPULATION = 1, 2, 3, 4, 5, 8, 10, 14
+_NON_WORD = re.compile(r"[^\w]+")
+FUZZY_MIN_LENGTH = 3  # Shorter names are too ambiguous to correct
+
+
+def normalize_place(name):
+    """Index key for a place name: accents stripped, punctuation removed, lower-case, single-spaced."""
+    text = unicodedata.normalize('NFKD', str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def _place_keys(fields, include_alternate):
+    """All keys for one GeoNames row: bare names plus 'name admin1' and 'name country' variants."""
+    names = {fields[_NAME], fields[_ASCIINAME]}
+    if include_alternate and fields[_ALTERNATE]:
+        names.update(fields[_ALTERNATE].split(','))
+
+    keys = set()
+    for name in names:
+        base = normalize_place(name)
+        if not base:
+            continue
+        keys.add(base)
+        for qualifier in (fields[_ADMIN1], fields[_COUNTRY]):
+            if qualifier:
+                keys.add(f"{base} {normalize_place(qualifier)}")
+        if fields[_ADMIN1] and fields[_COUNTRY]:
+            keys.add(f"{base} {normalize_place(fields[_ADMIN1])} {normalize_place(fields[_COUNTRY])}")
+    return keys
+
+
+def _deletions(key):
+    """The key and every string one character shorter."""
+    return {key} | {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+def _hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def fuzzy_index(keys):
+    """(sorted hashes of the deletions of every key, key position of each hash) for Gazetteer.fuzzy."""
+    hashes, positions = [], []
+    for i, key in enumerate(keys):
+        if len(key) >= FUZZY_MIN_LENGTH:
+            variants = _deletions(key)
+            hashes.extend(_hash(variant) for variant in variants)
+            positions.extend([i] * len(variants))
+    hashes = np.array(hashes, dtype=np.int64)
+    order = np.argsort(hashes, kind='stable')
+    return hashes[order], np.array(positions, dtype=np.int64)[order]
+
+
+def build_gazetteer(geonames_path, output_path, include_alternate=False):
+    """Builds the .npz index from a GeoNames dump; for duplicate keys the most populous place wins."""
+    best = {}
+    with open(geonames_path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) <= _POPULATION:
+                continue
+            population = int(fields[_POPULATION] or 0)
+            lat, lon = float(fields[_LAT]), float(fields[_LON])
+            for key in _place_keys(fields, include_alternate):
+                if key not in best or population > best[key][0]:
+                    best[key] = (population, lat, lon)
+
+    keys = sorted(best)
+    fuzzy_hashes, fuzzy_positions = fuzzy_index(keys)
+    np.savez_compressed(
+        output_path,
+        keys=np.array(keys),
+        lat=np.array([best[k][1] for k in keys], dtype=np.float32),
+        lon=np.array([best[k][2] for k in keys], dtype=np.float32),
+        fuzzy_hashes=fuzzy_hashes,
+        fuzzy_positions=fuzzy_positions,
+    )
+    return len(keys)
+
+
+class Gazetteer:
+    """
+    Sorted place-name keys with coordinates: exact lookups by dict, prefix search by bisection and
+    fuzzy lookups through the delete index.
+    """
+
+    def __init__(self, keys, lat, lon, fuzzy_hashes=None, fuzzy_positions=None):
+        self.keys = list(keys)
+        self.lat = lat
+        self.lon = lon
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.fuzzy_hashes = fuzzy_hashes
+        self.fuzzy_positions = fuzzy_positions
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            fuzzy = (data['fuzzy_hashes'], data['fuzzy_positions']) if 'fuzzy_hashes' in data.files else ()
+            return cls(data['keys'].tolist(), data['lat'], data['lon'], *fuzzy)
+
+    def _coordinates(self, i):
+        return round(float(self.lat[i]), 5), round(float(self.lon[i]), 5)
+
+    def exact(self, name):
+        """Returns (lat, lon) for an exact normalized match, or None."""
+        i = self.positions.get(normalize_place(name))
+        return None if i is None else self._coordinates(i)
+
+    def prefix(self, text, limit=10):
+        """Returns up to `limit` (key, lat, lon) whose key starts with the normalized text."""
+        prefix = normalize_place(text)
+        start = bisect.bisect_left(self.keys, prefix)
+        stop = bisect.bisect_left(self.keys, prefix + '\uffff', lo=start)
+        return [(self.keys[i], *self._coordinates(i)) for i in range(start, min(stop, start + limit))]
+
+    def fuzzy(self, name, cutoff=0.85):
+        """Most similar key one edit away from the name (similarity at least `cutoff`), or None."""
+        key = normalize_place(name)
+        if len(key) < FUZZY_MIN_LENGTH:
+            return None
+        if self.fuzzy_hashes is None:  # Index files built before the delete index
+            self.fuzzy_hashes, self.fuzzy_positions = fuzzy_index(self.keys)
+
+        query = np.array([_hash(variant) for variant in _deletions(key)], dtype=np.int64)
+        starts = np.searchsorted(self.fuzzy_hashes, query, side='left')
+        stops = np.searchsorted(self.fuzzy_hashes, query, side='right')
+        candidates = {int(i) for start, stop in zip(starts, stops) for i in self.fuzzy_positions[start:stop]}
+        scored = [(difflib.SequenceMatcher(None, key, self.keys[i]).ratio(), -i) for i in candidates]
+        score, i = max(scored, default=(0.0, 0))
+        return self._coordinates(-i) if score >= cutoff else None
+
+    def lookup(self, name):
+        """Exact match, then the part before the first comma (e.g. 'Atlanta, GA' -> 'atlanta'), then fuzzy."""
+        coordinates = self.exact(name)
+        if coordinates is None and ',' in str(name):
+            coordinates = self.exact(str(name).split(',', 1)[0])
+        if coordinates is None:
+            coordinates = self.fuzzy(name)
+        return coordinates
+
+
+class GazetteerBackend:
+    """Geocoding backend over a local Gazetteer (same interface as OpenCageBackend)."""
+
+    def __init__(self, gazetteer):
+        self.gazetteer = gazetteer
+        self.available = True
+
+    def lookup(self, query):
+        return self.gazetteer.lookup(query) or (None, None)
+
+
+class FallbackBackend:
+    """Tries the primary backend first and only asks the fallback for the primary's misses."""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    @property
+    def available(self):
+        return self.primary.available or self.fallback.available
+
+    def lookup(self, query):
+        lat, lon = self.primary.lookup(query)
+        if lat is None and self.fallback.available:
+            return self.fallback.lookup(query)
+        return lat, lon
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m utils.gazetteer <geonames.txt> <output.npz>")
+    print(f"Indexed {build_gazetteer(sys.argv[1], sys.argv[2])} place keys into {sys.argv[2]}")
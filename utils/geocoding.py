@@ -0,0 +1,206 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    logger, OPENCAGE_API_KEY, GEOCODE_CACHE_PATH, GEOCODE_CACHE_TTL_DAYS,
+    GEOCODE_NEGATIVE_TTL_DAYS, GEOCODE_RATE_LIMIT, GEOCODE_MAX_WORKERS, GAZETTEER_PATH
+)
+from utils.gazetteer import Gazetteer, GazetteerBackend, FallbackBackend
+
+OPENCAGE_URL = "https://api.opencagedata.com/geocode/v1/json"
+DAY_SECONDS = 24 * 60 * 60
+
+
+def normalize_location(location):
+    """Canonical cache key for a location string: trimmed, lower-case, single-spaced."""
+    return " ".join(str(location).split()).lower()
+
+
+class GeocodeCache:
+    """
+    Persistent SQLite cache of geocoding results.
+    Misses ("not found") are cached too, with a shorter TTL, so bad names are not retried on every load.
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, ttl_days=GEOCODE_CACHE_TTL_DAYS,
+                 negative_ttl_days=GEOCODE_NEGATIVE_TTL_DAYS):
+        self.path = path
+        self.ttl = ttl_days * DAY_SECONDS
+        self.negative_ttl = negative_ttl_days * DAY_SECONDS
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn, conn:  # Commit the transaction, then close
+            conn.execute("CREATE TABLE IF NOT EXISTS geocode ("
+                         "query TEXT PRIMARY KEY, lat REAL, lon REAL, fetched_at REAL NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get_many(self, queries):
+        """Returns {query: (lat, lon)} for fresh hits; a cached miss is returned as (None, None)."""
+        now = time.time()
+        hits = {}
+        queries = list(queries)
+        with closing(self._connect()) as conn, conn:
+            for start in range(0, len(queries), 500):
+                batch = queries[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT query, lat, lon, fetched_at FROM geocode WHERE query IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for query, lat, lon, fetched_at in rows:
+                    ttl = self.ttl if lat is not None else self.negative_ttl
+                    if now - fetched_at < ttl:
+                        hits[query] = (lat, lon)
+        return hits
+
+    def put_many(self, results):
+        """Stores {query: (lat, lon)}; (None, None) records a negative result."""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO geocode (query, lat, lon, fetched_at) VALUES (?, ?, ?, ?)",
+                [(query, lat, lon, now) for query, (lat, lon) in results.items()]
+            )
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class OpenCageBackend:
+    """Looks locations up with the OpenCage API over one pooled HTTP session."""
+
+    def __init__(self, api_key=OPENCAGE_API_KEY, pool_size=GEOCODE_MAX_WORKERS, timeout=10,
+                 rate_limit=GEOCODE_RATE_LIMIT):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount("https://", adapter)
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def lookup(self, query):
+        """Returns (lat, lon), or (None, None) if the place is unknown. Network errors are raised."""
+        params = {"q": query, "key": self.api_key, "limit": 1, "no_annotations": 1}
+        self.rate_limiter.wait()
+        response = self.session.get(OPENCAGE_URL, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        results = response.json()["results"]
+        if not results:
+            return None, None
+        geometry = results[0]["geometry"]
+        return float(geometry["lat"]), float(geometry["lng"])
+
+
+class StubBackend:
+    """In-memory backend for tests and offline demos; counts lookups so callers can assert on them."""
+
+    def __init__(self, coordinates=None):
+        self.coordinates = {normalize_location(k): v for k, v in (coordinates or {}).items()}
+        self.calls = 0
+        self.available = True
+
+    def lookup(self, query):
+        self.calls += 1
+        return self.coordinates.get(query, (None, None))
+
+
+class GeocodingService:
+    """Resolves many location strings at once: dedupe, cache lookup, then concurrent lookups of the misses."""
+
+    def __init__(self, backend, cache=None, max_workers=GEOCODE_MAX_WORKERS):
+        self.backend = backend
+        self.cache = cache
+        self.max_workers = max_workers
+
+    def _lookup(self, query):
+        try:
+            return query, self.backend.lookup(query), None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error fetching coordinates for '{query}': {str(e)}")
+            return query, (None, None), f"⚠️ Error: {str(e)}"
+
+    def resolve_many(self, locations):
+        """Returns {location: (lat, lon, error)} for every input string, using the network only for misses."""
+        queries = {}
+        for location in locations:
+            if location is None or str(location).strip() == "":
+                continue
+            queries.setdefault(normalize_location(location), []).append(location)
+
+        found = self.cache.get_many(queries) if self.cache else {}
+        misses = [query for query in queries if query not in found]
+        errors = {}
+
+        if misses:
+            if not self.backend.available:
+                logger.warning("Missing OpenCage API Key!")
+                errors = {query: "⚠️ Missing API Key." for query in misses}
+            else:
+                logger.info(f"Geocoding {len(misses)} new location(s) ({len(found)} cached)")
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    fetched = {}
+                    for query, coordinates, error in pool.map(self._lookup, misses):
+                        if error:
+                            errors[query] = error  # Transient failures are not cached
+                        else:
+                            fetched[query] = coordinates
+                if self.cache and fetched:
+                    self.cache.put_many(fetched)
+                found.update(fetched)
+
+        results = {}
+        for query, originals in queries.items():
+            lat, lon = found.get(query, (None, None))
+            error = errors.get(query) or (None if lat is not None else "⚠️ City not found.")
+            for location in originals:
+                results[location] = (lat, lon, error)
+        return results
+
+    def resolve(self, location):
+        """Returns (lat, lon, error) for a single location string."""
+        return self.resolve_many([location]).get(location, (None, None, "⚠️ City not found."))
+
+
+_DEFAULT_SERVICE = None
+
+
+def default_backend():
+    """Offline gazetteer (if GAZETTEER_PATH exists) with OpenCage as fallback for its misses, else OpenCage."""
+    if GAZETTEER_PATH and os.path.exists(GAZETTEER_PATH):
+        logger.info(f"Using offline gazetteer {GAZETTEER_PATH}")
+        return FallbackBackend(GazetteerBackend(Gazetteer.load(GAZETTEER_PATH)), OpenCageBackend())
+    return OpenCageBackend()
+
+
+def get_geocoding_service():
+    """Process-wide service using the default backend and the on-disk cache (created on first use)."""
+    global _DEFAULT_SERVICE
+    if _DEFAULT_SERVICE is None:
+        _DEFAULT_SERVICE = GeocodingService(default_backend(), GeocodeCache())
+    return _DEFAULT_SERVICE
@@ -0,0 +1,189 @@
+import io
+import re
+import numpy as np
+import pandas as pd
+from utils.metadata_loader import detect_metadata_format, read_metadata_bytes
+
+SEPARATORS = {'TAB': '\t', 'COMMA': ',', 'SPACE': ' '}
+COLOR_DATASETS = ('DATASET_COLORSTRIP', 'TREE_COLORS')
+SUPPORTED_DATASETS = COLOR_DATASETS + ('DATASET_BINARY', 'DATASET_HEATMAP', 'DATASET_SIMPLEBAR', 'LABELS')
+DATASET_TYPE_LINE = re.compile(r'(DATASET_[A-Z]+|TREE_COLORS|LABELS|COLLAPSE|POPUP_INFO)')
+
+
+class ItolDataset:
+    """
+    One iTOL annotation dataset as compact per-tip arrays, indexed by the tree's tip position:
+    colour datasets keep an int32 code per tip into `palette`/`legend` (-1 = no value),
+    binary/heatmap/bar datasets a float32 (n_tips x n_fields) matrix (NaN = no value),
+    and LABELS an object array of display names.
+    """
+
+    def __init__(self, kind, n_tips, header):
+        self.kind = kind
+        self.header = header
+        self.label = header.get('DATASET_LABEL', [kind])[0]
+        self.field_labels = header.get('FIELD_LABELS', [])
+        self.field_colors = header.get('FIELD_COLORS', [])
+        self.n_matched = 0
+        self.n_unmatched = 0
+        self.palette, self.legend, self._codes = [], [], {}
+        if kind in COLOR_DATASETS:
+            self.codes = np.full(n_tips, -1, dtype=np.int32)
+        elif kind == 'LABELS':
+            self.labels = np.full(n_tips, None, dtype=object)
+        else:
+            n_fields = max(len(self.field_labels), len(header.get('FIELD_SHAPES', [])), 1)
+            self.values = np.full((n_tips, n_fields), np.nan, dtype=np.float32)
+
+    def _code(self, color, legend):
+        key = (color, legend)
+        if key not in self._codes:
+            self._codes[key] = len(self.palette)
+            self.palette.append(color)
+            self.legend.append(legend)
+        return self._codes[key]
+
+    def add_row(self, tip, fields):
+        """Stores one DATA row (ID already resolved to a tip position)."""
+        if self.kind == 'DATASET_COLORSTRIP':
+            self.codes[tip] = self._code(fields[0], fields[1] if len(fields) > 1 else fields[0])
+        elif self.kind == 'TREE_COLORS':
+            if len(fields) >= 2:  # type (range, label, clade, ...), colour, optional label
+                self.codes[tip] = self._code(fields[1], fields[2] if len(fields) > 2 else fields[1])
+        elif self.kind == 'LABELS':
+            self.labels[tip] = fields[0]
+        else:
+            n = min(len(fields), self.values.shape[1])
+            self.values[tip, :n] = [_to_float(value) for value in fields[:n]]
+        self.n_matched += 1
+
+    def tip_text(self):
+        """One display string per tip (None where the dataset has no value), used for search and hover."""
+        if self.kind in COLOR_DATASETS:
+            legend = np.array(self.legend + [None], dtype=object)
+            return legend[self.codes]
+        if self.kind == 'LABELS':
+            return self.labels
+        return np.full(len(self.values), None, dtype=object)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def _split(line, separator):
+    return [field.strip() for field in line.rstrip('\r\n').split(separator)]
+
+
+def iter_itol(stream):
+    """
+    Reads an iTOL annotation file (text or binary file object) line by line. Yields
+    (kind, header, None) when a dataset's DATA section starts, then (kind, header, fields) for each
+    of its rows. Several datasets may be stacked in one stream; each starts at its type line.
+    """
+    if isinstance(stream, (io.BufferedIOBase, io.RawIOBase)) or 'b' in getattr(stream, 'mode', ''):
+        stream = io.TextIOWrapper(stream, encoding='utf-8', errors='replace')
+
+    kind, header, separator, in_data = None, {}, None, False
+    for line in stream:
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+
+        if DATASET_TYPE_LINE.fullmatch(stripped.upper()):
+            kind, header, separator, in_data = stripped.upper(), {}, None, False
+            continue
+        if kind is None:
+            raise ValueError("Not an iTOL annotation file: the first line must name the dataset type.")
+
+        if not in_data:
+            first = stripped.split(None, 1)[0].upper()
+            if first == 'SEPARATOR':
+                parts = stripped.split(None, 1)
+                separator = SEPARATORS.get(parts[1].strip().upper() if len(parts) > 1 else 'TAB', '\t')
+            elif first == 'DATA':
+                in_data = True
+                yield kind, header, None
+            else:
+                fields = _split(line, separator or '\t')
+                header[fields[0].upper()] = fields[1:]
+            continue
+
+        yield kind, header, _split(line, separator or '\t')
+
+
+def parse_itol(stream, tip_names):
+    """
+    Streams an iTOL annotation file into ItolDataset objects (unsupported dataset types are skipped).
+    Rows whose ID is not a tip of the tree (e.g. internal "A|B" node IDs) are counted, not stored.
+    """
+    tip_position = {name: k for k, name in enumerate(tip_names) if name}
+    datasets, dataset = [], None
+    for kind, header, fields in iter_itol(stream):
+        if fields is None:
+            dataset = ItolDataset(kind, len(tip_names), header) if kind in SUPPORTED_DATASETS else None
+            if dataset is not None:
+                datasets.append(dataset)
+        elif dataset is not None:
+            tip = tip_position.get(fields[0].strip("'"))
+            if tip is None:
+                dataset.n_unmatched += 1
+            else:
+                dataset.add_row(tip, fields[1:])
+    return datasets
+
+
+def datasets_to_table(datasets, tip_names, values=False):
+    """
+    Flattens the text of every dataset into a taxa table (for the taxon search index); with
+    `values`, every numeric field becomes a column too.
+    """
+    table = {'taxa': list(tip_names)}
+    for k, dataset in enumerate(datasets):
+        text = dataset.tip_text()
+        if any(value is not None for value in text):
+            table[f"{dataset.label} ({k + 1})"] = text
+        if values and hasattr(dataset, 'values'):
+            for j in range(dataset.values.shape[1]):
+                field = dataset.field_labels[j] if j < len(dataset.field_labels) else str(j + 1)
+                table[f"{dataset.label} {field} ({k + 1})"] = dataset.values[:, j]
+    return pd.DataFrame(table)
+
+
+def read_itol_table(data):
+    """Taxa table of an iTOL file read without a tree (the metadata loader's iTOL path): its row IDs are the tips."""
+    ids = list(dict.fromkeys(fields[0].strip("'") for _, _, fields in iter_itol(io.BytesIO(data)) if fields))
+    return datasets_to_table(parse_itol(io.BytesIO(data), ids), ids, values=True)
+
+
+def load_tree_annotations(files, tip_names):
+    """
+    Reads annotation files for a tree, given as (bytes, filename) pairs: iTOL files are streamed
+    into datasets, plain tables contribute their 'color' column. Returns (tip -> colour dict for
+    the main ring, remaining datasets for extra rings, taxa table for the search index).
+    """
+    colors, datasets, tables = {}, [], []
+    for data, filename in files:
+        if detect_metadata_format(data, filename) == 'itol':
+            datasets.extend(parse_itol(io.BytesIO(data), tip_names))
+        else:
+            table = read_metadata_bytes(data, filename)
+            if 'color' in table.columns:
+                colors.update(zip(table['taxa'], table['color'].astype(str)))
+            tables.append(table)
+
+    search_table = datasets_to_table(datasets, tip_names) if datasets else None
+    for table in tables:
+        search_table = table if search_table is None else search_table.merge(table, on='taxa', how='left')
+
+    # Without a colour table the first iTOL colour dataset becomes the main ring
+    if not colors:
+        first = next((d for d in datasets if d.kind in COLOR_DATASETS), None)
+        if first is not None:
+            datasets.remove(first)
+            palette = first.palette
+            colors = {tip_names[i]: palette[code] for i, code in enumerate(first.codes) if code >= 0}
+    return colors, datasets, search_table
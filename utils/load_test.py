@@ -0,0 +1,359 @@
+"""
+Concurrent-user load test for the dashboard's callback endpoint.
+
+    python -m utils.load_test --users 8 --iterations 3                  # in-process Flask test client
+    python -m utils.load_test --users 8 --url http://127.0.0.1:8000 --server-pid <gunicorn master pid>
+
+Each simulated user replays analyst sessions through /_dash-update-component, the way the
+browser does: uploads a tree with metadata, changes palettes, searches, exports, uploads a
+SNP matrix and an alignment and scrolls it, then loads the circular tree. Every user works on
+its own synthetic files (so caches are cold per user, as with different analysts) unless
+--shared-data is given. Reports throughput, latency percentiles per callback, errors and the
+memory growth of the process (test client) or gunicorn workers (--server-pid).
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import numpy as np
+from utils import synthetic_data
+from utils.callback_metrics import ERROR_HEADER
+
+UPDATE_PATH = '/_dash-update-component'
+DEPENDENCIES_PATH = '/_dash-dependencies'
+PALETTES = ['Plotly', 'D3', 'Set1', 'Pastel', 'Dark24']
+HEATMAP_PALETTES = ['viridis', 'plasma', 'magma', 'turbo']
+
+
+class InProcessTransport:
+    """Requests served in this process by app.server (one Flask test client per thread)."""
+
+    def __init__(self):
+        from app import server
+        self.server = server
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.server.test_client()
+        return self._local.client
+
+    def get(self, path):
+        response = self._client().get(path)
+        return response.status_code, response.data, response.headers
+
+    def post(self, path, payload):
+        response = self._client().post(path, json=payload)
+        return response.status_code, response.data, response.headers
+
+
+class HttpTransport:
+    """Requests sent to a running server (e.g. a local gunicorn) over HTTP."""
+
+    def __init__(self, base_url, timeout=600):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _send(self, request):
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.headers
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, payload):
+        return self._send(urllib.request.Request(self.base_url + path, data=json.dumps(payload).encode(),
+                                                 headers={'Content-Type': 'application/json'}))
+
+
+def _spec(text):
+    component_id, prop = text.split('@')[0].rsplit('.', 1)
+    return {'id': component_id, 'property': prop}
+
+
+class DashClient:
+    """Builds callback requests from the app's own dependency list, so payloads match the browser's."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        status, data, _ = transport.get(DEPENDENCIES_PATH)
+        if status != 200:
+            raise RuntimeError(f"{DEPENDENCIES_PATH} returned HTTP {status}")
+        self.callbacks = {}
+        for callback in json.loads(data):
+            key = callback['output']
+            outputs = key.strip('.').split('...') if key.startswith('..') else [key]
+            for output in outputs:
+                self.callbacks.setdefault(output.split('@')[0], callback)
+
+    def call(self, output, values, changed=None):
+        """
+        Posts the callback that writes `output` ('id.property') with `values` ('id.property' -> value,
+        missing ones are None). Returns (status, response bytes, response headers).
+        """
+        callback = self.callbacks[output]
+        key = callback['output']
+        outputs = [_spec(o) for o in key.strip('.').split('...')] if key.startswith('..') else _spec(key)
+
+        def with_values(items):
+            return [dict(item, value=values.get(f"{item['id']}.{item['property']}")) for item in items]
+
+        first = callback['inputs'][0]
+        payload = {'output': key, 'outputs': outputs, 'inputs': with_values(callback['inputs']),
+                   'state': with_values(callback.get('state', [])),
+                   'changedPropIds': changed or [f"{first['id']}.{first['property']}"]}
+        return self.transport.post(UPDATE_PATH, payload)
+
+
+def collect_props(node, values):
+    """Records the props of every component with an id in a callback response, as the browser would hold them."""
+    if isinstance(node, dict):
+        props = node.get('props')
+        if isinstance(props, dict) and 'id' in props and isinstance(props['id'], str):
+            for prop, value in props.items():
+                values[f"{props['id']}.{prop}"] = value
+        for value in node.values():
+            collect_props(value, values)
+    elif isinstance(node, list):
+        for value in node:
+            collect_props(value, values)
+
+
+def _data_url(data, mime='text/plain'):
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def session_files(n, seed, alignment_length=1000):
+    """The uploads of one simulated analyst, as data URLs."""
+    return {
+        'tree': _data_url(synthetic_data.newick_tree(n, 'balanced', seed).encode()),
+        'metadata': _data_url(synthetic_data.metadata_table(n, seed).encode(), 'text/tab-separated-values'),
+        'matrix': _data_url(synthetic_data.snp_dists_table(n, seed).encode(), 'text/tab-separated-values'),
+        'alignment': _data_url(synthetic_data.fasta_alignment(n, alignment_length, seed)),
+    }
+
+
+def _open_tab(value):
+    """The step that fetches a lazy tab's contents when the analyst first selects it."""
+    return (f"load_{value.replace('-', '_')}_tab", f'tab-body-{value}.children', {'main-tabs.value': value}, None)
+
+
+def session_steps(files, rng, exports=True):
+    """
+    One analyst session as (label, output, value updates, changed props) steps, in the order the
+    browser would fire the callbacks.
+    """
+    names = synthetic_data.taxon_names(4)
+    steps = [
+        ('update_tree', 'tree-graph-container.children',
+         {'upload-tree.contents': files['tree'], 'upload-tree.filename': 'tree.nwk',
+          'upload-metadata.contents': files['metadata'], 'upload-metadata.filename': 'metadata.tsv',
+          'show-tip-labels.value': [], 'color-palette-dropdown.value': 'Plotly',
+          'color-palette-dropdown-location.value': 'Plotly'}, None),
+        _open_tab('sample-map'),
+        ('update_sample_map', 'sample-map-container.children', {}, None),
+    ]
+    for _ in range(2):
+        steps.append(('update_tree', 'tree-graph-container.children',
+                      {'color-palette-dropdown.value': rng.choice(PALETTES)}, ['color-palette-dropdown.value']))
+    for query in (names[rng.randrange(len(names))][:2], 'ST1'):
+        steps.append(('search_tree', 'tree-search-status.children', {'tree-search-input.value': query},
+                      ['tree-search-input.value']))
+    if exports:
+        steps.append(('export_svg', 'download-svg.data', {'download-svg-btn.n_clicks': 1}, None))
+
+    steps += [
+        _open_tab('snp-heatmap'),
+        ('update_snp_heatmap', 'snp-heatmap-container.children',
+         {'upload-snp-matrix.contents': files['matrix'], 'upload-snp-matrix.filename': 'snp_dists.tsv',
+          'color-palette-dropdown-heatmap.value': 'viridis'}, None),
+        ('page_snp_table', 'snp-table.data', {'snp-table.page_current': rng.randrange(5)}, ['snp-table.page_current']),
+        ('update_tree_snp_consistency', 'snp-consistency-container.children', {}, None),
+        ('build_nj_tree', 'nj-tree-key.data', {'build-nj-tree-btn.n_clicks': 1}, None),
+        ('update_mst_network', 'snp-mst-container.children', {'snp-mst-color-by.value': 'location'},
+         ['snp-mst-color-by.value']),
+        ('update_snp_heatmap', 'snp-heatmap-container.children',
+         {'color-palette-dropdown-heatmap.value': rng.choice(HEATMAP_PALETTES)}, ['color-palette-dropdown-heatmap.value']),
+        ('load_alignment', 'msa-alignment-key.data',
+         {'upload-fasta.contents': files['alignment'], 'upload-fasta.filename': 'core.aln'}, None),
+    ]
+    for column in (0, 100, 300):
+        steps.append(('display_msa', 'output-alignment-chart.children',
+                      {'msa-column-start.value': column, 'msa-window-width.value': 100, 'msa-window-rows.value': 25,
+                       'alignment-colorscale.value': 'nucleotide', 'msa-variable-sites-only.value': [],
+                       'msa-tracks.value': ['consensus', 'entropy']}, ['msa-column-start.value']))
+
+    steps += [
+        _open_tab('advanced-tree'),
+        ('update_large_tree', 'large-tree-graph-container.children',
+         {'upload-large-tree.contents': files['tree'], 'upload-large-tree.filename': 'tree.nwk',
+          'upload-large-metadata.contents': [files['metadata']], 'upload-large-metadata.filename': ['metadata.tsv'],
+          'toggle-large-tip-labels.value': []}, None),
+        ('update_tip_labels', 'large-tree-label-status.children',
+         {'toggle-large-tip-labels.value': ['SHOW'], 'large-tree-sector.value': [0, rng.choice([90, 180, 360])]},
+         ['toggle-large-tip-labels.value']),
+        ('search_large_tree', 'large-tree-search-status.children', {'large-tree-search-input.value': 'Paris'},
+         ['large-tree-search-input.value']),
+    ]
+    if exports:
+        steps.append(('export_large_tree_svg', 'download-large-svg.data', {'download-large-svg-btn.n_clicks': 1}, None))
+    return steps
+
+
+class LoadRecorder:
+    """Thread-safe collection of (callback label, seconds, response bytes, ok) samples."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []
+
+    def add(self, label, seconds, size, ok):
+        with self.lock:
+            self.samples.append((label, seconds, size, ok))
+
+    def summary(self):
+        """Per-callback count, errors, latency percentiles (ms) and mean response size."""
+        rows = {}
+        for label in sorted({s[0] for s in self.samples}):
+            seconds = np.array([s[1] for s in self.samples if s[0] == label]) * 1000
+            sizes = [s[2] for s in self.samples if s[0] == label]
+            p50, p90, p95, p99 = np.percentile(seconds, [50, 90, 95, 99])
+            rows[label] = {'count': len(seconds), 'errors': sum(1 for s in self.samples if s[0] == label and not s[3]),
+                           'p50_ms': round(p50, 1), 'p90_ms': round(p90, 1), 'p95_ms': round(p95, 1),
+                           'p99_ms': round(p99, 1), 'max_ms': round(seconds.max(), 1),
+                           'mean_kb': round(sum(sizes) / len(sizes) / 1024, 1)}
+        return rows
+
+
+def run_user(client, user, n, iterations, recorder, think_time, exports, shared_data, alignment_length):
+    """One simulated analyst: `iterations` sessions, each with its own values as a browser tab would hold them."""
+    rng = random.Random(user)
+    for iteration in range(iterations):
+        seed = 0 if shared_data else user * 1000 + iteration
+        files = session_files(n, seed, alignment_length)
+        values = {}
+        for label, output, updates, changed in session_steps(files, rng, exports):
+            values.update(updates)
+            start = time.perf_counter()
+            try:
+                status, data, headers = client.call(output, values, changed)
+            except Exception:
+                status, data, headers = 599, b'', {}
+            # Callbacks report failures as a 200 response with an error message and ERROR_HEADER
+            recorder.add(label, time.perf_counter() - start, len(data),
+                         status in (200, 204) and ERROR_HEADER not in headers)
+            if status == 200 and data:
+                response = json.loads(data).get('response', {})
+                for component_id, props in response.items():
+                    for prop, value in props.items():
+                        values[f"{component_id}.{prop}"] = value
+                collect_props(response, values)
+            if think_time:
+                time.sleep(rng.uniform(0, 2 * think_time))
+
+
+def rss_mb(pids):
+    """Resident memory (MB) summed over pids, read from /proc; None where unavailable."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        except (OSError, StopIteration):
+            return None
+    return total / 1024
+
+
+def server_pids(master_pid):
+    """The gunicorn workers of a master process (Linux /proc), or the master itself if none are found."""
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+            children = [int(pid) for pid in f.read().split()]
+    except OSError:
+        children = []
+    return children or [master_pid]
+
+
+def run_load_test(client, users=4, iterations=2, n=500, think_time=0.0, exports=True, shared_data=False,
+                  alignment_length=1000, memory_pids=None):
+    """
+    Runs all users concurrently and returns a result dict (throughput, per-callback latency and the
+    memory growth of memory_pids, when given).
+    """
+    recorder = LoadRecorder()
+    rss_start = rss_mb(memory_pids) if memory_pids else None
+    threads = [threading.Thread(target=run_user, args=(client, user, n, iterations, recorder, think_time, exports,
+                                                       shared_data, alignment_length), daemon=True)
+               for user in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    rss_end = rss_mb(memory_pids) if memory_pids else None
+
+    return {'users': users, 'iterations': iterations, 'tips': n, 'seconds': round(elapsed, 2),
+            'requests': len(recorder.samples), 'throughput_rps': round(len(recorder.samples) / elapsed, 2),
+            'errors': sum(1 for s in recorder.samples if not s[3]),
+            'memory_mb': {'start': rss_start and round(rss_start, 1), 'end': rss_end and round(rss_end, 1),
+                          'growth': None if rss_start is None or rss_end is None else round(rss_end - rss_start, 1)},
+            'callbacks': recorder.summary()}
+
+
+def print_report(result):
+    print(f"{result['users']} user(s) x {result['iterations']} session(s), {result['tips']} tips: "
+          f"{result['requests']} requests in {result['seconds']}s ({result['throughput_rps']} req/s), "
+          f"{result['errors']} error(s)")
+    print(f"{'callback':<28}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'max ms':>10}{'mean KB':>10}")
+    for label, row in result['callbacks'].items():
+        print(f"{label:<28}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10}{row['p90_ms']:>10}"
+              f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}{row['mean_kb']:>10}")
+    memory = result['memory_mb']
+    if memory['growth'] is not None:
+        print(f"Memory: {memory['start']} MB -> {memory['end']} MB ({memory['growth']:+} MB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.load_test", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=4, help="concurrent simulated users (default: 4)")
+    parser.add_argument("--iterations", type=int, default=2, help="sessions per user (default: 2)")
+    parser.add_argument("--tips", type=int, default=500, help="taxa per synthetic upload (default: 500)")
+    parser.add_argument("--alignment-length", type=int, default=1000, help="alignment columns (default: 1000)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between steps in seconds (default: 0)")
+    parser.add_argument("--url", help="base URL of a running server, e.g. http://127.0.0.1:8000 (default: in-process)")
+    parser.add_argument("--server-pid", type=int, help="gunicorn master pid, to report worker memory with --url")
+    parser.add_argument("--no-exports", action="store_true", help="skip SVG exports (they need Chrome for Kaleido)")
+    parser.add_argument("--shared-data", action="store_true", help="all users upload the same files (warm caches)")
+    parser.add_argument("--json", help="also write the result to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        transport = HttpTransport(args.url)
+        memory_pids = server_pids(args.server_pid) if args.server_pid else None
+    else:
+        transport = InProcessTransport()
+        memory_pids = [os.getpid()]
+
+    client = DashClient(transport)
+    result = run_load_test(client, args.users, args.iterations, args.tips, args.think_time, not args.no_exports,
+                           args.shared_data, args.alignment_length, memory_pids)
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
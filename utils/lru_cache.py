@@ -0,0 +1,49 @@
+import threading
+from collections import OrderedDict
+from utils.callback_metrics import record_cache
+
+
+class LRUCache:
+    """
+    Small per-worker LRU cache that the threads of a worker can share: every lookup, insert and
+    eviction holds one lock, so an eviction never lands between a hit and its move to the end.
+    Lookups are counted under `name` in the /metrics cache counters.
+    """
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        """The cached value, now the most recently used, or None."""
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+        record_cache(self.name, value is not None)
+        return value
+
+    def put(self, key, value):
+        """Caches value as the most recently used, evicting the least recently used beyond `size`."""
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return value
+
+    def pop(self, key):
+        with self._lock:
+            return self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
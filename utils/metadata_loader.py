@@ -0,0 +1,86 @@
+import csv
+import io
+import pandas as pd
+from utils.file_processing import decode_uploaded_bytes, hash_uploaded_contents
+from utils.lru_cache import LRUCache
+
+METADATA_CACHE_SIZE = 32
+CATEGORICAL_MAX_RATIO = 0.5  # Text columns with at most this share of distinct values become Categorical
+TAXA_COLUMN = 'taxa'
+EXCEL_SIGNATURES = (b'PK\x03\x04', b'\xd0\xcf\x11\xe0')  # xlsx (zip) and legacy xls (OLE2)
+
+_METADATA_CACHE = LRUCache('metadata', METADATA_CACHE_SIZE)
+
+
+def detect_metadata_format(data, filename=None):
+    """Returns 'excel', 'itol', 'csv' or 'tsv' for the raw bytes of a metadata file."""
+    name = (filename or "").lower()
+    if data[:4] in EXCEL_SIGNATURES or name.endswith(('.xlsx', '.xls')):
+        return 'excel'
+
+    head = data[:65536].decode('utf-8', errors='replace')
+    lines = [line for line in head.splitlines() if line.strip() and not line.startswith('#')]
+    if not lines:
+        raise ValueError("Metadata file is empty.")
+    if lines[0].strip().upper().startswith(('DATASET_', 'TREE_COLORS', 'LABELS', 'COLLAPSE', 'POPUP_INFO')):
+        return 'itol'
+    try:
+        return 'tsv' if csv.Sniffer().sniff("\n".join(lines[:20]), delimiters='\t,').delimiter == '\t' else 'csv'
+    except csv.Error:
+        return 'tsv' if lines[0].count('\t') >= lines[0].count(',') else 'csv'
+
+
+def _read_table(data, file_format, columns):
+    """Reads only the requested columns (all when columns is None) of a tabular metadata file."""
+    if file_format == 'excel':
+        header = pd.read_excel(io.BytesIO(data), nrows=0).columns
+        usecols = None if columns is None else [c for c in header if c in columns]
+        return pd.read_excel(io.BytesIO(data), usecols=usecols, dtype={TAXA_COLUMN: str})
+
+    if file_format == 'itol':
+        from utils.itol import read_itol_table  # utils.itol imports this module
+        df = read_itol_table(data)
+        return df if columns is None else df[[c for c in df.columns if c in columns]]
+
+    sep = '\t' if file_format == 'tsv' else ','
+    usecols = None if columns is None else (lambda name: name in columns)
+    return pd.read_csv(io.BytesIO(data), sep=sep, usecols=usecols, dtype={TAXA_COLUMN: str})
+
+
+def compact_columns(df):
+    """Strips taxon names and stores repetitive text columns as Categorical codes."""
+    df = df.copy()
+    for column in df.columns:
+        if column == TAXA_COLUMN:
+            df[column] = df[column].astype(str).str.replace("'", "").str.strip()
+        elif (pd.api.types.is_string_dtype(df[column]) or df[column].dtype == object) and len(df) \
+                and df[column].nunique() <= CATEGORICAL_MAX_RATIO * len(df):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def fill_missing(series, value='Unknown'):
+    """fillna that also works on Categorical columns (adding the fill value as a category if needed)."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
+
+
+def read_metadata_bytes(data, filename=None, columns=None):
+    """Parses raw metadata file bytes of any supported format into a compact DataFrame (uncached)."""
+    wanted = None if columns is None else frozenset(columns) | {TAXA_COLUMN}
+    return compact_columns(_read_table(data, detect_metadata_format(data, filename), wanted))
+
+
+def load_metadata_table(contents, filename=None, columns=None):
+    """
+    Loads an uploaded metadata file (TSV, CSV, Excel or iTOL) into a compact DataFrame.
+    Only `columns` are read when given (the taxa column is always kept); results are cached
+    per file hash and column set, so re-renders do not parse the file again. The cached frame is
+    shared: callers that modify it must copy it first.
+    """
+    key = (hash_uploaded_contents(contents), None if columns is None else frozenset(columns))
+    df = _METADATA_CACHE.get(key)
+    if df is None:
+        df = _METADATA_CACHE.put(key, read_metadata_bytes(decode_uploaded_bytes(contents), filename, columns))
+    return df
@@ -0,0 +1,155 @@
+import numpy as np
+import plotly.graph_objects as go
+
+# ✅ Residue colors per color scale (anything not listed falls back to OTHER_COLOR)
+GAP_COLOR = '#ffffff'
+OTHER_COLOR = '#d9d9d9'
+RESIDUE_PALETTES = {
+    'nucleotide': {
+        'A': '#64f73f', 'C': '#ffb340', 'G': '#eb413c', 'T': '#3c88ee', 'U': '#3c88ee',
+        'N': '#9e9e9e', '-': GAP_COLOR,
+    },
+    'aminoacid': {
+        'A': '#80a0f0', 'I': '#80a0f0', 'L': '#80a0f0', 'M': '#80a0f0', 'F': '#80a0f0',
+        'W': '#80a0f0', 'V': '#80a0f0', 'C': '#f08080', 'K': '#f01505', 'R': '#f01505',
+        'E': '#c048c0', 'D': '#c048c0', 'N': '#15c015', 'Q': '#15c015', 'S': '#15c015',
+        'T': '#15c015', 'G': '#f09048', 'P': '#c0c000', 'H': '#15a4a4', 'Y': '#15a4a4',
+        'X': '#9e9e9e', '-': GAP_COLOR,
+    },
+    'custom': {
+        'A': '#009e73', 'C': '#0072b2', 'G': '#e69f00', 'T': '#d55e00', 'U': '#d55e00',
+        'N': '#9e9e9e', '-': GAP_COLOR,
+    },
+}
+
+MAX_OVERVIEW_BINS = 1000
+MAX_TEXT_CELLS = 5000  # Only draw residue letters when the window is small enough to read
+
+
+def create_overview_figure(alignment, variable, max_bins=MAX_OVERVIEW_BINS):
+    """Plots the fraction of variable columns along the whole alignment, binned to at most max_bins."""
+    n_cols = alignment.shape[1]
+
+    n_bins = min(max_bins, n_cols)
+    edges = np.linspace(0, n_cols, n_bins + 1).astype(int)
+    counts = np.add.reduceat(variable.astype(np.int64), edges[:-1])
+    widths = np.diff(edges)
+    fraction = counts / np.maximum(widths, 1)
+
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + 1).tolist(),
+        y=np.round(fraction, 4).tolist(),
+        width=widths.tolist(),
+        offset=0,
+        marker=dict(color='#3c88ee'),
+        hovertemplate="Columns %{x}+: %{y:.1%} variable<extra></extra>"
+    ))
+    fig.update_layout(
+        title=f"Alignment Overview ({alignment.shape[0]} sequences x {n_cols} columns)",
+        xaxis=dict(title='Alignment Position', range=[1, n_cols + 1]),
+        yaxis=dict(title='Variable', tickformat='.0%', fixedrange=True),
+        height=220,
+        margin=dict(l=60, r=20, t=40, b=40),
+        clickmode='event',
+        shapes=[window_shape(0, 0)]
+    )
+    return fig
+
+
+def window_shape(col_start, window_width):
+    """Translucent rectangle that marks the current window on the overview track."""
+    return dict(
+        type='rect', xref='x', yref='paper',
+        x0=col_start + 1, x1=col_start + window_width + 1, y0=0, y1=1,
+        fillcolor='rgba(235, 65, 60, 0.25)', line=dict(color='#eb413c', width=1)
+    )
+
+
+def selected_row_shapes(rows):
+    """Bands over the window rows (positions within the window) of the shared sample selection."""
+    return [dict(type='rect', xref='paper', yref='y', x0=0, x1=1, y0=row - 0.5, y1=row + 0.5,
+                 fillcolor='rgba(0, 200, 255, 0.25)', line=dict(width=0), layer='above') for row in rows]
+
+
+def clamp_window(alignment, row_start, col_start, window_rows, window_width, columns=None):
+    """Clamps a requested window so it stays inside the alignment (or inside `columns`, if given)."""
+    n_rows = alignment.shape[0]
+    n_cols = alignment.shape[1] if columns is None else len(columns)
+    window_rows = max(1, min(int(window_rows), n_rows))
+    window_width = max(1, min(int(window_width), n_cols))
+    row_start = max(0, min(int(row_start or 0), n_rows - window_rows))
+    col_start = max(0, min(int(col_start or 0), n_cols - window_width))
+    return row_start, col_start, window_rows, window_width
+
+
+def window_positions(col_start, window_width, columns=None):
+    """Original alignment column indices shown in a (clamped) window."""
+    if columns is None:
+        return np.arange(col_start, col_start + window_width)
+    return np.asarray(columns[col_start:col_start + window_width])
+
+
+def _palette_lookup(colorscale):
+    """Returns a 256-entry code -> color-index table and the matching list of colors."""
+    palette = RESIDUE_PALETTES.get(colorscale, RESIDUE_PALETTES['nucleotide'])
+    colors = [OTHER_COLOR] + list(dict.fromkeys(palette.values()))
+    lookup = np.zeros(256, dtype=np.uint8)
+    for residue, color in palette.items():
+        lookup[ord(residue)] = colors.index(color)
+    return lookup, colors
+
+
+def _discrete_colorscale(colors):
+    """Builds a stepped plotly colorscale so integer z values map exactly to one color each."""
+    n = len(colors)
+    scale = []
+    for i, color in enumerate(colors):
+        scale.append([i / n, color])
+        scale.append([(i + 1) / n, color])
+    return scale
+
+
+def create_window_figure(alignment, row_start, col_start, window_rows, window_width, colorscale='nucleotide',
+                         columns=None):
+    """
+    Renders only the requested rows x columns of the alignment as a heatmap.
+    If `columns` (original column indices) is given, the window is taken from that subset
+    and the x axis keeps the original alignment coordinates.
+    """
+    row_start, col_start, window_rows, window_width = clamp_window(
+        alignment, row_start, col_start, window_rows, window_width, columns)
+
+    rows = alignment.matrix[row_start:row_start + window_rows]
+    positions = window_positions(col_start, window_width, columns)
+    if columns is None:
+        window = np.asarray(rows[:, col_start:col_start + window_width])
+    else:
+        window = np.asarray(rows[:, positions])
+    lookup, colors = _palette_lookup(colorscale)
+    z = lookup[window]
+
+    residues = window.view('S1').astype(str)
+    show_text = window.size <= MAX_TEXT_CELLS
+
+    fig = go.Figure(go.Heatmap(
+        z=z.tolist(),
+        x=(positions + 1).tolist(),
+        y=alignment.names[row_start:row_start + window_rows],
+        text=residues.tolist(),
+        texttemplate="%{text}" if show_text else None,
+        hovertemplate="%{y}<br>Position %{x}: %{text}<extra></extra>",
+        colorscale=_discrete_colorscale(colors),
+        zmin=-0.5, zmax=len(colors) - 0.5,
+        showscale=False,
+        xgap=1 if show_text else 0,
+        ygap=1 if show_text else 0
+    ))
+    fig.update_layout(
+        xaxis=dict(title='Alignment Position', side='top',
+                   type='linear' if columns is None else 'category'),
+        yaxis=dict(autorange='reversed', type='category'),
+        height=max(300, 18 * window_rows + 100),
+        margin=dict(l=160, r=20, t=60, b=20),
+        plot_bgcolor='white'
+    )
+    return fig
@@ -0,0 +1,257 @@
+"""
+Minimum spanning networks from a stored SNP distance matrix, the outbreak view of isolates
+with nodes sized by isolate count and edges labelled with SNP distance.
+
+    python -m utils.mst_network snp_dists.tsv   # timings of each step
+
+Isolates 0 SNPs from a group's first isolate are collapsed into one node. The tree is built
+with dense Prim over the remaining nodes: one matrix row is read per added node and the
+nearest-tree distances of all others are updated in one numpy step, so 10,000 isolates never
+need a copy of the matrix. Nodes are placed with the equal-angle radial layout: every node gets
+a wedge proportional to the size of its subtree, so subtrees never overlap. The layout is
+computed one depth level at a time with array operations.
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from utils.lru_cache import LRUCache
+
+EDGE_LABEL_LIMIT = 500  # Networks with more edges show SNP distances on hover only
+MAX_COLOR_CATEGORIES = 30  # Rarer metadata values are drawn as "Other"
+MEMBERS_IN_HOVER = 5
+UNKNOWN_COLOR = '#bbbbbb'
+OTHER_COLOR = '#7f7f7f'
+MST_CACHE_SIZE = 8
+
+_MST_CACHE = LRUCache('mst_network', MST_CACHE_SIZE)
+
+
+def collapse_identical(d):
+    """
+    Groups isolates 0 SNPs from each group's first isolate (rows in input order).
+    Returns (group of every isolate, first isolate of every group).
+    """
+    n = len(d)
+    group = np.full(n, -1, dtype=np.int64)
+    representatives = []
+    for i in range(n):
+        if group[i] >= 0:
+            continue
+        members = np.flatnonzero((np.asarray(d[i]) == 0) & (group < 0))
+        group[members] = len(representatives)
+        group[i] = len(representatives)
+        representatives.append(i)
+    return group, np.array(representatives, dtype=np.int64)
+
+
+def prim_mst(d, nodes, root=0):
+    """
+    Minimum spanning tree over the isolates `nodes` of matrix `d`, grown from `nodes[root]`.
+    Returns (parent, weight, order): parent and edge weight of every node (-1 and 0 at the root)
+    and the order nodes joined the tree, in which every parent comes before its children.
+    """
+    k = len(nodes)
+    subset = None if k == len(d) else nodes
+    best = np.full(k, np.inf)
+    parent = np.full(k, -1, dtype=np.int64)
+    weight = np.zeros(k)
+    in_tree = np.zeros(k, dtype=bool)
+    order = np.empty(k, dtype=np.int64)
+    best[root] = 0
+    for step in range(k):
+        v = int(np.argmin(best))
+        order[step] = v
+        weight[v] = best[v]
+        in_tree[v] = True
+        best[v] = np.inf
+        row = np.asarray(d[nodes[v]])
+        row = (row if subset is None else row[subset]).astype(float)
+        closer = (row < best) & ~in_tree
+        best[closer] = row[closer]
+        parent[closer] = v
+    weight[root] = 0
+    return parent, weight, order
+
+
+def radial_layout(parent, weight, order):
+    """Equal-angle (x, y) of every node; edges are log-scaled so long branches do not dwarf clusters."""
+    k = len(parent)
+    depth = np.zeros(k, dtype=np.int64)
+    parents, depths = parent.tolist(), depth.tolist()
+    for v in order[1:].tolist():
+        depths[v] = depths[parents[v]] + 1
+    depth = np.array(depths, dtype=np.int64)
+    by_depth = order[np.argsort(depth[order], kind='stable')]
+    bounds = np.searchsorted(depth[by_depth], np.arange(depth.max() + 2))
+    levels = [by_depth[bounds[i]:bounds[i + 1]] for i in range(1, len(bounds) - 1)]
+
+    size = np.ones(k)
+    for nodes in reversed(levels):
+        np.add.at(size, parent[nodes], size[nodes])
+
+    start, width = np.zeros(k), np.zeros(k)
+    x, y = np.zeros(k), np.zeros(k)
+    width[order[0]] = 2 * np.pi
+    length = np.maximum(np.log1p(weight), 0.25)
+    for nodes in levels:
+        nodes = nodes[np.argsort(parent[nodes], kind='stable')]
+        p, s = parent[nodes], size[nodes]
+        before = np.cumsum(s) - s
+        first = np.r_[True, p[1:] != p[:-1]]
+        before -= before[first][np.cumsum(first) - 1]  # Siblings' subtrees ahead of each node
+        unit = width[p] / (size[p] - 1)
+        start[nodes] = start[p] + before * unit
+        width[nodes] = s * unit
+        angle = start[nodes] + width[nodes] / 2
+        x[nodes] = x[p] + length[nodes] * np.cos(angle)
+        y[nodes] = y[p] + length[nodes] * np.sin(angle)
+    return x, y
+
+
+def build_network(d):
+    """Collapsed groups, spanning tree and layout of a square distance matrix (array or memory map)."""
+    group, representatives = collapse_identical(d)
+    counts = np.bincount(group, minlength=len(representatives))
+    parent, weight, order = prim_mst(d, representatives, root=int(np.argmax(counts)))
+    x, y = radial_layout(parent, weight, order)
+    return {'group': group, 'representatives': representatives, 'counts': counts,
+            'parent': parent, 'weight': weight, 'x': x, 'y': y}
+
+
+def matrix_network(key):
+    """The network of the stored SNP matrix `key` (cached per worker), or None if it is not stored."""
+    network = _MST_CACHE.get(key)
+    if network is None:
+        from utils.snp_matrix_store import open_matrix
+        matrix = open_matrix(key)
+        if matrix is None:
+            return None
+        network = build_network(matrix.to_numpy())
+        network['names'] = [str(name) for name in matrix.index]
+        _MST_CACHE.put(key, network)
+    return network
+
+
+def node_categories(network, metadata, column):
+    """(majority category of every node, isolates in that category, category -> color) for a metadata column."""
+    from utils.color_utils import generate_location_colors
+
+    k = len(network['representatives'])
+    values = metadata.assign(taxa=metadata['taxa'].astype(str)).drop_duplicates('taxa').set_index('taxa')[column]
+    values = values.reindex(network['names']).astype(object)  # Categorical columns cannot take 'Other'
+    top = values.value_counts().index[:MAX_COLOR_CATEGORIES - 1]
+    values = values.where(values.isin(top) | values.isna(), 'Other')
+    codes, categories = pd.factorize(values, sort=False)
+
+    known = codes >= 0
+    tally = np.zeros((k, max(len(categories), 1)), dtype=np.int64)
+    np.add.at(tally, (network['group'][known], codes[known]), 1)
+    majority = tally.argmax(axis=1)
+    in_majority = tally[np.arange(k), majority]
+    labels = np.array(list(categories) + ['Unknown'], dtype=object)[np.where(in_majority > 0, majority, len(categories))]
+
+    named = [c for c in categories if c != 'Other']
+    colors = generate_location_colors(pd.Series(named, dtype=object)) if named else {}
+    colors['Other'], colors['Unknown'] = OTHER_COLOR, UNKNOWN_COLOR
+    return labels, in_majority, colors
+
+
+def create_mst_figure(network, metadata=None, column=None):
+    """Edges and nodes of the network as one WebGL trace each, nodes colored by the majority `column` value."""
+    names, counts = network['names'], network['counts']
+    representatives, parent, weight = network['representatives'], network['parent'], network['weight']
+    x, y = network['x'], network['y']
+    k = len(representatives)
+
+    child = np.flatnonzero(parent >= 0)
+    edge_x = np.full(3 * len(child), np.nan)
+    edge_y = np.full(3 * len(child), np.nan)
+    edge_x[0::3], edge_x[1::3] = x[parent[child]], x[child]
+    edge_y[0::3], edge_y[1::3] = y[parent[child]], y[child]
+
+    members = [[] for _ in range(k)]
+    for i, g in enumerate(network['group'].tolist()):
+        if len(members[g]) < MEMBERS_IN_HOVER:
+            members[g].append(names[i])
+    hover = []
+    for v in range(k):
+        text = f"<b>{names[representatives[v]]}</b>"
+        if counts[v] > 1:
+            text += f" + {counts[v] - 1} identical<br>" + ", ".join(members[v][1:])
+            if counts[v] > MEMBERS_IN_HOVER:
+                text += ", ..."
+        if parent[v] >= 0:
+            text += f"<br>{weight[v]:g} SNPs from {names[representatives[parent[v]]]}"
+        hover.append(text)
+
+    colors, legend = '#1f77b4', {}
+    if metadata is not None and column in getattr(metadata, 'columns', []):
+        labels, in_majority, legend = node_categories(network, metadata, column)
+        colors = [legend[label] for label in labels]
+        hover = [f"{text}<br>{column}: {label} ({n} of {c})" for text, label, n, c in
+                 zip(hover, labels, in_majority.tolist(), counts.tolist())]
+        shown = sorted(set(labels), key=lambda label: (label in ('Other', 'Unknown'), str(label)))
+        legend = {label: legend[label] for label in shown}
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=edge_x.tolist(), y=edge_y.tolist(), mode='lines',
+                               line=dict(color='#888888', width=1), hoverinfo='skip', showlegend=False))
+    if len(child) <= EDGE_LABEL_LIMIT:
+        fig.add_trace(go.Scattergl(
+            x=((x[parent[child]] + x[child]) / 2).tolist(), y=((y[parent[child]] + y[child]) / 2).tolist(),
+            mode='text', text=[f"{w:g}" for w in weight[child]], textfont=dict(size=10, color='#444444'),
+            hoverinfo='skip', showlegend=False))
+    fig.add_trace(go.Scattergl(
+        x=x.tolist(), y=y.tolist(), mode='markers', hovertext=hover, hoverinfo='text', showlegend=False,
+        marker=dict(size=(6 + 4 * np.sqrt(counts)).clip(max=40).tolist(), color=colors,
+                    line=dict(color='#333333', width=0.5))))
+    for label, color in legend.items():
+        # ✅ Legend-only entries; the nodes themselves stay in one trace
+        fig.add_trace(go.Scattergl(x=[None], y=[None], mode='markers', name=str(label),
+                                   marker=dict(size=10, color=color)))
+
+    fig.update_xaxes(visible=False)
+    fig.update_yaxes(visible=False, scaleanchor='x', scaleratio=1)
+    fig.update_layout(
+        title=f"Minimum Spanning Network: {len(names)} isolates in {k} nodes",
+        plot_bgcolor='white',
+        height=700,
+        legend=dict(title=column) if legend else None,
+        margin=dict(l=20, r=20, t=60, b=20)
+    )
+    return fig
+
+
+def main(argv=None):
+    from utils.snp_matrix_store import read_matrix, read_labels
+
+    parser = argparse.ArgumentParser(prog="python -m utils.mst_network",
+                                     description="Time the minimum spanning network of an SNP distance matrix.")
+    parser.add_argument("matrix", help="matrix file (any format the SNP heatmap tab reads)")
+    parser.add_argument("--labels", help="label file with one sample name per line (needed for a bare .npy)")
+    args = parser.parse_args(argv)
+
+    labels = None
+    if args.labels:
+        with open(args.labels, 'rb') as f:
+            labels = read_labels(f.read())
+    with open(args.matrix, 'rb') as f:
+        values, index, _ = read_matrix(f.read(), args.matrix, labels)
+
+    start = time.perf_counter()
+    group, representatives = collapse_identical(values)
+    collapsed = time.perf_counter()
+    counts = np.bincount(group, minlength=len(representatives))
+    parent, weight, order = prim_mst(values, representatives, root=int(np.argmax(counts)))
+    spanned = time.perf_counter()
+    radial_layout(parent, weight, order)
+    laid_out = time.perf_counter()
+    print(f"{len(index)} isolates in {len(representatives)} nodes: collapse {collapsed - start:.2f}s, "
+          f"Prim {spanned - collapsed:.2f}s, layout {laid_out - spanned:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
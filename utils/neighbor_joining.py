@@ -0,0 +1,287 @@
+"""
+Neighbor-joining trees straight from a stored SNP distance matrix, for runs that have a
+snp-dists matrix but no Newick tree.
+
+    python -m utils.neighbor_joining snp_dists.tsv -o nj_tree.nwk
+
+The join search follows RapidNJ: a lower bound on Q(i, j) for each row lets every step evaluate
+only the few rows that can still hold the minimum instead of the whole m x m Q matrix. Columns
+are bucketed by r, and each row keeps its nearest distance per bucket, so
+(m - 2) * nearest distance - r_i - (largest r in the bucket) stays tight even when many samples
+are identical. Active rows are kept in the leading block of one float32 matrix: a joined pair's
+row is reused, and the last row moves into the freed one. Every step is then a handful of numpy
+operations over O(m) values. The result is the exact neighbor-joining tree; a 5,000-sample
+outbreak matrix takes about 15 seconds. On distances with little tree structure the bound prunes
+fewer rows, and the cost approaches the O(n^3) of plain neighbor joining.
+"""
+import argparse
+import time
+import numpy as np
+from Bio.Phylo.BaseTree import Clade, Tree
+from utils.lru_cache import LRUCache
+
+FIRST_CHUNK_ROWS = 8  # Rows whose Q is evaluated first; later chunks double while rows remain in bound
+R_GROUPS = 32  # Columns are bucketed by r; each row keeps its nearest distance per bucket
+REGROUP_FRACTION = 0.9  # Buckets are redrawn when the active rows shrink below this fraction
+NJ_CACHE_SIZE = 8
+
+_NJ_CACHE = LRUCache('nj_tree', NJ_CACHE_SIZE)
+
+
+def _group_minima(d, rows, group, m):
+    """Nearest distance of each of `rows` within every r bucket (inf for empty buckets)."""
+    gmin = np.full((len(rows), R_GROUPS), np.inf, dtype=d.dtype)
+    if len(rows):
+        sizes = np.bincount(group[:m], minlength=R_GROUPS)
+        present = np.flatnonzero(sizes)
+        starts = (np.cumsum(sizes) - sizes)[present]
+        block = d[np.ix_(rows, np.argsort(group[:m], kind='stable'))]
+        gmin[:, present] = np.minimum.reduceat(block, starts, axis=1)
+    return gmin
+
+
+def _closest_pair(d, r, bound, m):
+    """Active slots (i, j), i < j, with the smallest Q(i, j) = (m - 2) d(i, j) - r_i - r_j."""
+    r_active = r[:m]
+    order = np.argsort(bound)
+    best, pair = np.inf, None
+    start, size = 0, FIRST_CHUNK_ROWS
+    while start < m and bound[order[start]] < best:
+        rows = order[start:start + size]
+        rows = rows[bound[rows] < best]
+        q = (m - 2) * d[rows, :m].astype(np.float64)
+        q -= r_active[rows, None]
+        q -= r_active[None, :]
+        flat = int(q.argmin())
+        if q.flat[flat] < best:
+            best, pair = q.flat[flat], (int(rows[flat // m]), flat % m)
+        start, size = start + size, size * 2
+    return min(pair), max(pair)
+
+
+def neighbor_joining(distances):
+    """
+    Neighbor-joining tree of a square distance matrix as (parent, branch_length) arrays: tips are
+    nodes 0..n-1 in matrix order, internal nodes follow in the order they were joined and the last
+    one is the (unrooted) trifurcating root, with parent -1. Negative branch lengths are set to 0.
+    """
+    d = np.asarray(distances, dtype=np.float32)
+    n = len(d)
+    if n < 3:
+        parent = np.array([n] * n + [-1], dtype=np.int64) if n else np.zeros(0, dtype=np.int64)
+        half = float(d[0, 1]) / 2 if n == 2 else 0.0
+        return parent, np.array([half] * n + [0.0])[:len(parent)]
+
+    d = (d + d.T) * np.float32(0.5)
+    np.fill_diagonal(d, 0)
+    r = d.sum(axis=1, dtype=np.float64)
+    np.fill_diagonal(d, np.inf)
+    node = np.arange(n)  # Tree node held by each active slot
+    parent = np.full(2 * n - 2, -1, dtype=np.int64)
+    branch_length = np.zeros(2 * n - 2)
+    group = np.zeros(n, dtype=np.int64)
+    edges, regrouped_at = None, 0
+
+    m, next_node = n, n
+    while m > 3:
+        if m < REGROUP_FRACTION * regrouped_at or edges is None:
+            # Buckets of equal size by the current r; every row's minima are recomputed
+            edges = np.quantile(r[:m], np.linspace(0, 1, R_GROUPS + 1)[1:-1])
+            group[:m] = np.searchsorted(edges, r[:m])
+            gmin = _group_minima(d, np.arange(m), group, m)
+            regrouped_at = m
+
+        # Q(i, j) >= (m - 2) * (nearest distance of row i in j's bucket) - r_i - (largest r in that bucket)
+        rmax = np.full(R_GROUPS, -np.inf)
+        np.maximum.at(rmax, group[:m], r[:m])
+        bound = ((m - 2) * gmin[:m].astype(np.float64) - rmax).min(axis=1) - r[:m]
+        i, j = _closest_pair(d, r, bound, m)
+        dij = float(d[i, j])
+        li = dij / 2 + (r[i] - r[j]) / (2 * (m - 2))
+        parent[[node[i], node[j]]] = next_node
+        branch_length[node[i]], branch_length[node[j]] = max(li, 0.0), max(dij - li, 0.0)
+
+        # The joined node takes slot i
+        new = (d[i, :m] + d[j, :m] - dij) * np.float32(0.5)
+        with np.errstate(invalid='ignore'):  # inf - inf in slots i and j, overwritten below
+            r[:m] += new - d[i, :m] - d[j, :m]
+        new[[i, j]] = 0
+        r[i] = new.sum(dtype=np.float64)
+        new[[i, j]] = np.inf
+        d[i, :m] = new
+        d[:m, i] = new
+        node[i] = next_node
+        group[i] = np.searchsorted(edges, r[i])
+        next_node += 1
+
+        # Minima over buckets that lost i and j stay valid lower bounds until the next regrouping;
+        # only the joined node's bucket can get closer, and its own row is new
+        gmin[:m, group[i]] = np.minimum(gmin[:m, group[i]], new)
+
+        # The last slot moves into slot j
+        last = m - 1
+        if j != last:
+            d[j, :m] = d[last, :m]
+            d[:m, j] = d[:m, last]
+            d[j, j] = np.inf
+            r[j], node[j], group[j] = r[last], node[last], group[last]
+            gmin[j] = gmin[last]
+        m -= 1
+        gmin[i] = _group_minima(d, [i], group, m)[0]
+
+    # The last three nodes meet at the root
+    a, b, c = 0, 1, 2
+    dab, dac, dbc = float(d[a, b]), float(d[a, c]), float(d[b, c])
+    for slot, length in ((a, (dab + dac - dbc) / 2), (b, (dab + dbc - dac) / 2), (c, (dac + dbc - dab) / 2)):
+        parent[node[slot]] = next_node
+        branch_length[node[slot]] = max(length, 0.0)
+    return parent, branch_length
+
+
+def _farthest(neighbours, start):
+    """Distance and predecessor of every node from `start`, and the farthest node (iterative, trees can be deep)."""
+    distance = np.full(len(neighbours), -1.0)
+    previous = np.full(len(neighbours), -1, dtype=np.int64)
+    distance[start] = 0.0
+    stack = [start]
+    while stack:
+        k = stack.pop()
+        for other, length in neighbours[k]:
+            if distance[other] < 0:
+                distance[other], previous[other] = distance[k] + length, k
+                stack.append(other)
+    return distance, previous, int(distance.argmax())
+
+
+def midpoint_root(parent, branch_length):
+    """
+    neighbor_joining arrays re-rooted at the midpoint of the longest tip-to-tip path, in O(n)
+    (Bio.Phylo's root_at_midpoint re-roots at every tip). A new root node splits the middle branch.
+    """
+    n_nodes = len(parent)
+    if n_nodes < 3:
+        return parent, branch_length
+    neighbours = [[] for _ in range(n_nodes + 1)]
+    for k, p in enumerate(parent):
+        if p >= 0:
+            neighbours[k].append((int(p), float(branch_length[k])))
+            neighbours[p].append((k, float(branch_length[k])))
+
+    _, _, a = _farthest(neighbours, 0)
+    distance, previous, b = _farthest(neighbours, a)
+    half = distance[b] / 2
+    below = b  # Walk back from b to the branch (below, above) that holds the midpoint
+    while distance[previous[below]] > half:
+        below = previous[below]
+    above = previous[below]
+
+    root = n_nodes
+    for k, other in ((below, above), (above, below)):
+        neighbours[k] = [(j, length) for j, length in neighbours[k] if j != other]
+        neighbours[k].append((root, abs(distance[k] - half)))
+        neighbours[root].append((k, abs(distance[k] - half)))
+
+    new_parent = np.full(n_nodes + 1, -1, dtype=np.int64)
+    new_length = np.zeros(n_nodes + 1)
+    seen = np.zeros(n_nodes + 1, dtype=bool)
+    seen[root] = True
+    stack = [root]
+    while stack:
+        k = stack.pop()
+        for other, length in neighbours[k]:
+            if not seen[other]:
+                seen[other] = True
+                new_parent[other], new_length[other] = k, length
+                stack.append(other)
+    return new_parent, new_length
+
+
+def to_phylo(parent, branch_length, names, rooted=False):
+    """A Bio.Phylo tree of neighbor_joining arrays, tips named by `names` (no Newick round-trip)."""
+    clades = [Clade(branch_length=float(length), name=str(names[k]) if k < len(names) else None)
+              for k, length in enumerate(branch_length)]
+    root = None
+    for k, p in enumerate(parent):
+        if p < 0:
+            root = clades[k]
+            root.branch_length = None
+        else:
+            clades[p].clades.append(clades[k])
+    return Tree(root=root, rooted=rooted)
+
+
+def _newick_label(name):
+    return f"'{name}'" if any(c in name for c in " ():;,[]'") else name
+
+
+def to_newick(parent, branch_length, names):
+    """Newick text of neighbor_joining arrays, written without recursion (NJ trees can be very deep)."""
+    children = [[] for _ in parent]
+    root = 0
+    for k, p in enumerate(parent):
+        if p < 0:
+            root = k
+        else:
+            children[p].append(k)
+
+    parts, stack = [], [root]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+            continue
+        length = "" if item == root else f":{branch_length[item]:.6g}"
+        if not children[item]:
+            parts.append(_newick_label(str(names[item])) + length)
+            continue
+        parts.append("(")
+        stack.append(")" + length)
+        for k, child in enumerate(reversed(children[item])):
+            stack.extend([child] if k == 0 else [",", child])
+    return "".join(parts) + ";"
+
+
+def matrix_tree(key):
+    """
+    A fresh Bio.Phylo NJ tree of the stored SNP matrix `key`, rooted at its midpoint like uploaded
+    trees are before plotting (arrays cached per worker), or None if the matrix is not stored.
+    """
+    arrays = _NJ_CACHE.get(key)
+    if arrays is None:
+        from utils.snp_matrix_store import open_matrix
+        matrix = open_matrix(key)
+        if matrix is None:
+            return None
+        parent, branch_length = midpoint_root(*neighbor_joining(matrix.to_numpy()))
+        arrays = (parent, branch_length, [str(name) for name in matrix.index])
+        _NJ_CACHE.put(key, arrays)
+    return to_phylo(*arrays, rooted=True)
+
+
+def main(argv=None):
+    from utils.snp_matrix_store import read_matrix, read_labels
+
+    parser = argparse.ArgumentParser(prog="python -m utils.neighbor_joining",
+                                     description="Build a neighbor-joining tree from an SNP distance matrix.")
+    parser.add_argument("matrix", help="matrix file (any format the SNP heatmap tab reads)")
+    parser.add_argument("--labels", help="label file with one sample name per line (needed for a bare .npy)")
+    parser.add_argument("-o", "--output", default="nj_tree.nwk", help="output Newick file (default: nj_tree.nwk)")
+    args = parser.parse_args(argv)
+
+    labels = None
+    if args.labels:
+        with open(args.labels, 'rb') as f:
+            labels = read_labels(f.read())
+    with open(args.matrix, 'rb') as f:
+        values, index, _ = read_matrix(f.read(), args.matrix, labels)
+    start = time.perf_counter()
+    newick = to_newick(*neighbor_joining(values), index)
+    elapsed = time.perf_counter() - start
+    with open(args.output, 'w') as f:
+        f.write(newick + "\n")
+    print(f"Joined {len(index)} samples in {elapsed:.1f}s; wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,154 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+ROW_BLOCK = 512  # Rows of the all-pairs matrix computed per vectorized step
+DENSITY_BINS = 100
+TOP_OUTLIERS = 20
+
+
+class LCAIndex:
+    """
+    Lowest-common-ancestor index over a TreeArrays: an Euler tour of the tree plus a
+    sparse table of range-minimum levels, answering any batch of LCA queries in O(1) each.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        n = tree.n_nodes
+
+        # Iterative Euler tour: a node is written on entry and again after each child returns
+        euler = np.empty(2 * n - 1, dtype=np.int64)
+        first = np.empty(n, dtype=np.int64)
+        pos = 0
+        stack = [(0, 0)]
+        while stack:
+            node, k = stack.pop()
+            if k == 0:
+                first[node] = pos
+            euler[pos] = node
+            pos += 1
+            children = tree.children(node)
+            if k < len(children):
+                stack.append((node, k + 1))
+                stack.append((int(children[k]), 0))
+
+        self.euler = euler
+        self.first = first
+        levels = tree.level[euler]
+
+        # Sparse table of Euler positions holding the minimum level over [i, i + 2^j)
+        table = [np.arange(len(euler))]
+        span = 1
+        while 2 * span <= len(euler):
+            prev = table[-1]
+            left, right = prev[:-span], prev[span:]
+            table.append(np.where(levels[left] <= levels[right], left, right))
+            span *= 2
+        self.table = table
+        self.levels = levels
+
+    def lca(self, u, v):
+        """Vectorized LCA of node-index arrays u and v."""
+        a, b = self.first[u], self.first[v]
+        lo, hi = np.minimum(a, b), np.maximum(a, b) + 1
+        k = np.floor(np.log2(hi - lo)).astype(np.int64)
+        result = np.empty(np.broadcast(lo, hi).shape, dtype=np.int64)
+        for j in np.unique(k):
+            mask = k == j
+            left = self.table[j][lo[mask]]
+            right = self.table[j][hi[mask] - (1 << j)]
+            result[mask] = np.where(self.levels[left] <= self.levels[right], left, right)
+        return self.euler[result]
+
+    def distance(self, u, v):
+        """Vectorized patristic (path length) distance between node-index arrays u and v."""
+        depth = self.tree.depth
+        return depth[u] + depth[v] - 2 * depth[self.lca(u, v)]
+
+
+def patristic_matrix(index, tip_positions=None):
+    """All-pairs patristic distances between tips (optionally a subset, by tip position), row block by row block."""
+    tips = index.tree.tips if tip_positions is None else index.tree.tips[np.asarray(tip_positions)]
+    n = len(tips)
+    matrix = np.zeros((n, n))
+    for start in range(0, n, ROW_BLOCK):
+        rows = tips[start:start + ROW_BLOCK]
+        u = np.repeat(rows, n)
+        v = np.tile(tips, len(rows))
+        matrix[start:start + len(rows)] = index.distance(u, v).reshape(len(rows), n)
+    return matrix
+
+
+def compare_tree_to_snp(index, snp_matrix):
+    """
+    Compares patristic distances with a square SNP distance DataFrame over the taxa present in both.
+    Fits SNPs = rate * patristic through the origin and scores each taxon by its mean absolute residual.
+    """
+    tree = index.tree
+    shared = [name for name in snp_matrix.index if name in tree.tip_position]
+    if len(shared) < 3:
+        raise ValueError(f"Only {len(shared)} taxa are shared between the tree and the SNP matrix.")
+
+    positions = np.array([tree.tip_position[name] for name in shared])
+    patristic = patristic_matrix(index, positions)
+    snp = snp_matrix.loc[shared, shared].to_numpy(dtype=float)
+
+    iu = np.triu_indices(len(shared), k=1)
+    x, y = patristic[iu], snp[iu]
+    rate = float(np.dot(x, y) / np.dot(x, x)) if np.dot(x, x) > 0 else 0.0
+    residual = snp - rate * patristic
+    np.fill_diagonal(residual, 0.0)
+
+    outlier_score = np.abs(residual).sum(axis=1) / (len(shared) - 1)
+    correlation = float(np.corrcoef(x, y)[0, 1]) if len(x) > 1 and x.std() > 0 and y.std() > 0 else float('nan')
+
+    return {
+        'taxa': shared,
+        'patristic': x,
+        'snp': y,
+        'rate': rate,
+        'correlation': correlation,
+        'outlier_score': outlier_score,
+        'n_tree_only': tree.n_tips - len(shared),
+        'n_matrix_only': len(snp_matrix.index) - len(shared),
+    }
+
+
+def create_consistency_figure(result):
+    """Binned patristic-vs-SNP density (constant size for any number of pairs) and the most discordant taxa."""
+    x, y = result['patristic'], result['snp']
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=DENSITY_BINS)
+    order = np.argsort(result['outlier_score'])[::-1][:TOP_OUTLIERS]
+
+    fig = make_subplots(rows=1, cols=2, column_widths=[0.6, 0.4], horizontal_spacing=0.12,
+                        subplot_titles=("Pairwise Distances", "Most Discordant Taxa"))
+    fig.add_trace(go.Heatmap(
+        x=((x_edges[:-1] + x_edges[1:]) / 2).tolist(),
+        y=((y_edges[:-1] + y_edges[1:]) / 2).tolist(),
+        z=np.where(counts.T > 0, np.log10(counts.T + 1), np.nan).tolist(),
+        colorscale='Viridis', colorbar=dict(title='log10(pairs)', x=0.52),
+        hovertemplate="Patristic %{x:.4g}<br>SNPs %{y:.4g}<extra></extra>"
+    ), row=1, col=1)
+    fig.add_trace(go.Scatter(
+        x=[0, float(x.max())], y=[0, result['rate'] * float(x.max())],
+        mode='lines', line=dict(color='red', dash='dash'), hoverinfo='skip'
+    ), row=1, col=1)
+    fig.add_trace(go.Bar(
+        x=result['outlier_score'][order][::-1].round(2).tolist(),
+        y=[result['taxa'][i] for i in order][::-1],
+        orientation='h', marker=dict(color='#eb413c'),
+        hovertemplate="%{y}: mean |residual| %{x} SNPs<extra></extra>"
+    ), row=1, col=2)
+
+    fig.update_xaxes(title_text='Patristic Distance', row=1, col=1)
+    fig.update_yaxes(title_text='SNP Distance', row=1, col=1)
+    fig.update_xaxes(title_text='Mean |Residual| (SNPs)', row=1, col=2)
+    fig.update_layout(
+        title=f"Tree vs SNP Distance: r = {result['correlation']:.3f}, "
+              f"{result['rate']:.4g} SNPs per unit branch length",
+        showlegend=False,
+        height=600,
+        margin=dict(l=60, r=40, t=80, b=60)
+    )
+    return fig
@@ -1,4 +1,70 @@
+import html
+import numpy as np
 import folium
+from branca.element import MacroElement, Template
+from folium.plugins import MarkerCluster
+from utils.metadata_loader import fill_missing
+from utils.lru_cache import LRUCache
+from utils.view_store import load_view, pack_strings, save_view, touch_view, unpack_strings, view_path
+
+MAP_CACHE_SIZE = 32
+BREAKDOWN_LIMIT = 8
+
+# ✅ Cluster bubbles show the number of samples (summed from the features), not the number of markers,
+# and "selected/total" while a shared sample selection is applied
+CLUSTER_ICON_JS = """
+function(cluster) {
+    var total = 0, selected = null;
+    cluster.getAllChildMarkers().forEach(function(m) {
+        var p = (m.feature && m.feature.properties) || {};
+        total += p.count || 1;
+        if (p.selected !== undefined && p.selected !== null) {
+            selected = (selected || 0) + p.selected;
+        }
+    });
+    var size = total < 10 ? 'small' : (total < 100 ? 'medium' : 'large');
+    return L.divIcon({
+        html: '<div><span>' + (selected === null ? total : selected + '/' + total) + '</span></div>',
+        className: 'marker-cluster marker-cluster-' + size,
+        iconSize: new L.Point(40, 40)
+    });
+}
+"""
+
+# ✅ Applies the shared sample selection inside the map's iframe: the Dash page posts the selected
+# count per feature (callbacks/selection_callbacks.py) and keeps the last one for maps loaded later
+SELECTION_TEMPLATE = """
+{% macro script(this, kwargs) %}
+(function() {
+    var layer = {{ this.layer }}, cluster = {{ this.cluster }};
+    function applySelection(counts) {
+        layer.eachLayer(function(marker) {
+            var p = marker.feature.properties;
+            p.selected = counts ? (counts[p.fid] || 0) : null;
+            if (marker.setOpacity) {
+                marker.setOpacity(counts && !p.selected ? 0.3 : 1);
+            }
+        });
+        cluster.refreshClusters();
+    }
+    window.addEventListener('message', function(event) {
+        // Only the dashboard page that embeds this map may change its selection
+        if (event.source === window.parent && event.data && event.data.type === 'sample-selection') {
+            applySelection(event.data.counts);
+        }
+    });
+    try {
+        if (window.parent.sampleMapSelection) {
+            applySelection(window.parent.sampleMapSelection);
+        }
+    } catch (e) {}
+})();
+{% endmacro %}
+"""
+
+_MAP_CACHE = LRUCache('sample_map', MAP_CACHE_SIZE)
+_MAP_SAMPLES = LRUCache('map_samples', MAP_CACHE_SIZE)
+
 
 def generate_folium_map(latitude=40.650002, longitude=-73.949997, zoom=6, markers=[]):
     """Generates a Folium map with optional markers."""
@@ -14,3 +80,114 @@ def generate_folium_map(latitude=40.650002, longitude=-73.949997, zoom=6, marker
         ).add_to(m)
 
     return m._repr_html_()
+
+
+def _breakdown(values):
+    """HTML list of the most common values with counts."""
+    counts = values.value_counts()
+    items = [f"{html.escape(str(value))}: {count}" for value, count in counts.head(BREAKDOWN_LIMIT).items()]
+    if len(counts) > BREAKDOWN_LIMIT:
+        items.append(f"... {len(counts) - BREAKDOWN_LIMIT} more")
+    return "<br>".join(items)
+
+
+def aggregate_samples(metadata, coordinates):
+    """
+    Groups samples by resolved coordinates (different spellings of one place share a point).
+    Returns GeoJSON features with the sample count and location/MLST breakdowns, the unresolved
+    locations, and the feature index of each metadata row (-1 when not placed).
+    """
+    df = metadata.reset_index(drop=True)
+    df['location'] = fill_missing(df['location']).astype(str)
+    df['lat'] = df['location'].map(lambda loc: coordinates.get(loc, (None, None))[0])
+    df['lon'] = df['location'].map(lambda loc: coordinates.get(loc, (None, None))[1])
+    located = df.dropna(subset=['lat', 'lon'])
+
+    features = []
+    feature_of_row = np.full(len(df), -1, dtype=np.int64)
+    for (lat, lon), group in located.groupby([located['lat'].round(4), located['lon'].round(4)]):
+        feature_of_row[group.index.to_numpy()] = len(features)
+        properties = {
+            'fid': len(features),
+            'count': int(len(group)),
+            'locations': _breakdown(group['location']),
+        }
+        if 'MLST' in group.columns:
+            properties['mlst'] = _breakdown(fill_missing(group['MLST']).astype(str))
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [float(lon), float(lat)]},
+            'properties': properties,
+        })
+
+    unresolved = sorted(df.loc[df['lat'].isna(), 'location'].unique().tolist())
+    return features, unresolved, feature_of_row
+
+
+class SelectionScript(MacroElement):
+    """Map script that shows the shared sample selection on a GeoJSON layer inside a marker cluster."""
+    _template = Template(SELECTION_TEMPLATE)
+
+    def __init__(self, layer, cluster):
+        super().__init__()
+        self._name = 'SelectionScript'
+        self.layer = layer.get_name()
+        self.cluster = cluster.get_name()
+
+
+def generate_sample_map(features):
+    """Renders aggregated sample points as one clustered GeoJSON layer and returns the map HTML."""
+    m = folium.Map(location=[20, 0], zoom_start=2, tiles="OpenStreetMap")
+    if not features:
+        return m.get_root().render()
+
+    fields = ['count', 'locations'] + (['mlst'] if 'mlst' in features[0]['properties'] else [])
+    aliases = {'count': 'Samples', 'locations': 'Locations', 'mlst': 'MLST'}
+
+    cluster = MarkerCluster(icon_create_function=CLUSTER_ICON_JS).add_to(m)
+    layer = folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        name='Samples',
+        tooltip=folium.GeoJsonTooltip(fields=['count'], aliases=['Samples']),
+        popup=folium.GeoJsonPopup(fields=fields, aliases=[aliases[f] for f in fields]),
+    ).add_to(cluster)
+    SelectionScript(layer, cluster).add_to(m)
+
+    lats = [f['geometry']['coordinates'][1] for f in features]
+    lons = [f['geometry']['coordinates'][0] for f in features]
+    m.fit_bounds([[min(lats), min(lons)], [max(lats), max(lons)]], max_zoom=8)
+    return m.get_root().render()
+
+
+def get_cached_sample_map(key):
+    """Returns the cached (map HTML, unresolved locations) for a metadata hash, or None."""
+    return _MAP_CACHE.get(key)
+
+
+def cache_sample_map(key, html_doc, unresolved=(), samples=None):
+    """
+    Keeps the rendered map HTML and the locations it could not place for the most recent
+    MAP_CACHE_SIZE metadata files, with the (taxa, feature index per row) the shared sample
+    selection is counted from. Returns (map HTML, unresolved locations).
+    """
+    cached = _MAP_CACHE.put(key, (html_doc, list(unresolved)))
+    if samples is not None:
+        _MAP_SAMPLES.put(key, samples)
+        # ✅ Stored for the other workers, which may count the shared selection on this map
+        taxa, feature_of_row = samples
+        save_view(view_path('map', key), taxa=pack_strings(taxa), feature_of_row=feature_of_row)
+    return cached
+
+
+def get_map_samples(key):
+    """(taxa, feature index per taxon) of a map drawn by any worker, or None."""
+    path = view_path('map', key)
+    samples = _MAP_SAMPLES.get(key)
+    if samples is None:
+        saved = load_view(path)
+        if saved is None:
+            return None
+        samples = _MAP_SAMPLES.put(key, (unpack_strings(saved['taxa'], len(saved['feature_of_row'])),
+                                         saved['feature_of_row']))
+    touch_view(path)
+    return samples
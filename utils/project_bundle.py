@@ -0,0 +1,357 @@
+"""
+Project bundles: one pipeline run's outputs pre-processed for instant loading in the dashboard.
+
+    python -m utils.project_bundle <run_output_dir> [--name NAME] [--force]
+
+Bundle layout under PROJECT_DIR/<name>/:
+    manifest.json          what the bundle holds, source files and sizes
+    tree.nwk               midpoint-rooted tree (as displayed)
+    tree_arrays.npz        preorder parent / branch length / names arrays
+    layout_rectangular.npz per-node x, y of the rectangular layout
+    layout_circular.npz    per-node angle, radius of the circular layout
+    snp_matrix.npy         square SNP distance matrix, with snp_names.json (see utils.snp_matrix_store)
+    alignment/             encoded alignment store (see utils.alignment_store), with tracks
+    metadata.pkl           compact (Categorical) metadata table
+    annotations/           iTOL dataset files as found in the run
+    figures/*.json         default figures, served as-is until the user changes a display option
+"""
+import argparse
+import fnmatch
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from Bio import Phylo
+from config import PROJECT_DIR, logger
+from utils.alignment_store import build_alignment_store, get_alignment, project_key
+from utils.alignment_tracks import get_alignment_tracks
+from utils.metadata_loader import detect_metadata_format, read_metadata_bytes
+from utils.tree_arrays import TreeArrays
+from utils.rectangular_tree import create_tree_plot, rectangular_layout
+from utils.advanced_phylo_tree import plot_tree_circular, circular_layout
+from utils.snp_heatmap import create_snp_heatmap, subsample_matrix
+from utils.snp_matrix_store import open_matrix_dir, read_labels, read_matrix, write_matrix_files
+from utils.figure_payload import compact_figure, figure_json
+from utils.itol import load_tree_annotations
+
+MANIFEST_FILE = 'manifest.json'
+BUNDLE_VERSION = 1
+BUNDLE_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+# Run output files are recognised by name (first match wins, so more specific patterns come first)
+FILE_PATTERNS = {
+    'tree': ('*.nwk', '*.newick', '*.treefile', '*.tree', '*.tre'),
+    'matrix': ('*snp*dist*', '*snp*matrix*', '*dists*.tsv'),
+    'matrix_labels': ('*snp*names*', '*snp*labels*'),  # Sample names of a bare .npy matrix
+    'alignment': ('*core*.aln', '*core*.fasta', '*core*.fa', '*.aln', '*.fasta', '*.fa', '*.fas'),
+    'metadata': ('*metadata*.tsv', '*metadata*.csv', '*metadata*.txt', '*metadata*.xlsx'),
+}
+DEFAULT_TREE_COLUMNS = ['location', 'MLST']
+DEFAULT_FIGURE_OPTIONS = {'show_labels': [], 'mlst_palette': 'Plotly', 'location_palette': 'Plotly',
+                          'heatmap_palette': 'viridis'}
+
+_OPEN_BUNDLES = {}
+
+
+def discover_run_files(run_dir):
+    """Finds the tree, SNP matrix, alignment, metadata and iTOL files of a pipeline run directory."""
+    names = sorted(os.listdir(run_dir))
+    found = {}
+    for kind, patterns in FILE_PATTERNS.items():
+        for pattern in patterns:
+            matches = [n for n in names if fnmatch.fnmatch(n.lower(), pattern) and os.path.isfile(os.path.join(run_dir, n))]
+            if matches:
+                found[kind] = os.path.join(run_dir, matches[0])
+                break
+
+    used = set(found.values())
+    itol = []
+    for name in names:
+        path = os.path.join(run_dir, name)
+        if path in used or not os.path.isfile(path) or not name.lower().endswith('.txt'):
+            continue
+        with open(path, 'rb') as f:
+            head = f.read(4096)
+        if head.strip() and detect_metadata_format(head, name) == 'itol':
+            itol.append(path)
+    if itol:
+        found['itol'] = itol
+    return found
+
+
+def _check_name(name):
+    if not name or not BUNDLE_NAME.match(name):
+        raise ValueError(f"Invalid project name {name!r}: use letters, digits, '.', '_' and '-'.")
+    return name
+
+
+def _save_figure(fig, directory, name):
+    os.makedirs(os.path.join(directory, 'figures'), exist_ok=True)
+    with open(os.path.join(directory, 'figures', f"{name}.json"), 'w') as f:
+        f.write(figure_json(compact_figure(fig)))
+
+
+def ingest_run(run_dir, name=None, project_dir=PROJECT_DIR, files=None, force=False):
+    """
+    Turns a run's output directory into a bundle in project_dir and returns its manifest.
+    `files` overrides auto-discovery ({'tree': path, 'matrix': path, 'alignment': path,
+    'metadata': path, 'itol': [paths]}). The bundle is built in a temporary directory and renamed.
+    """
+    name = _check_name(name or os.path.basename(os.path.normpath(run_dir)))
+    found = discover_run_files(run_dir) if run_dir else {}
+    found.update({kind: path for kind, path in (files or {}).items() if path})
+    if not found:
+        raise ValueError(f"No tree, SNP matrix, alignment or metadata files found in {run_dir}.")
+
+    final_dir = os.path.join(project_dir, name)
+    if os.path.exists(final_dir) and not force:
+        raise FileExistsError(f"Project {name!r} already exists (use force to replace it).")
+    os.makedirs(project_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=f".{name}-", dir=project_dir)
+
+    start = time.time()
+    manifest = {'version': BUNDLE_VERSION, 'name': name, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'source': {kind: os.path.abspath(p) if isinstance(p, str) else [os.path.abspath(x) for x in p]
+                           for kind, p in found.items()},
+                'contents': {}}
+    try:
+        metadata = None
+        if 'metadata' in found:
+            with open(found['metadata'], 'rb') as f:
+                metadata = read_metadata_bytes(f.read(), found['metadata'])
+            metadata.to_pickle(os.path.join(work_dir, 'metadata.pkl'))
+            manifest['contents']['metadata'] = {'rows': len(metadata), 'columns': list(metadata.columns)}
+
+        if 'itol' in found:
+            os.makedirs(os.path.join(work_dir, 'annotations'))
+            for path in found['itol']:
+                shutil.copy(path, os.path.join(work_dir, 'annotations', os.path.basename(path)))
+            manifest['contents']['annotations'] = [os.path.basename(p) for p in found['itol']]
+
+        if 'tree' in found:
+            tree = Phylo.read(found['tree'], 'newick')
+            tree.root_at_midpoint()
+            Phylo.write(tree, os.path.join(work_dir, 'tree.nwk'), 'newick')
+            # ✅ Lay out the tree exactly as the dashboard will read it back (Newick rounds branch lengths)
+            tree = Phylo.read(os.path.join(work_dir, 'tree.nwk'), 'newick')
+            tree_arrays = TreeArrays.from_phylo(tree)
+            np.savez(os.path.join(work_dir, 'tree_arrays.npz'), parent=tree_arrays.parent,
+                     branch_length=tree_arrays.branch_length,
+                     names=np.array([n or '' for n in tree_arrays.names], dtype=str))
+
+            root_length = tree.root.branch_length or 0
+            x, y = rectangular_layout(tree_arrays, root_length)
+            np.savez(os.path.join(work_dir, 'layout_rectangular.npz'), x=x, y=y)
+            theta, radius = circular_layout(tree_arrays, root_length)
+            np.savez(os.path.join(work_dir, 'layout_circular.npz'), x=theta, y=radius)
+            manifest['contents']['tree'] = {'tips': int(tree_arrays.n_tips), 'nodes': int(tree_arrays.n_nodes)}
+
+            if metadata is not None and {'taxa', 'location'}.issubset(metadata.columns):
+                _save_figure(create_tree_plot(tree, metadata, DEFAULT_FIGURE_OPTIONS['show_labels'],
+                                              DEFAULT_FIGURE_OPTIONS['mlst_palette'],
+                                              DEFAULT_FIGURE_OPTIONS['location_palette']), work_dir, 'tree')
+            bundle = ProjectBundle(name, work_dir, manifest)
+            colors, datasets, _ = bundle.tree_annotations()
+            if colors or datasets:
+                _save_figure(plot_tree_circular(tree, bundle.tip_colors(colors), datasets), work_dir, 'tree_circular')
+
+        if 'matrix' in found:
+            labels = None
+            if 'matrix_labels' in found:
+                with open(found['matrix_labels'], 'rb') as f:
+                    labels = read_labels(f.read())
+            with open(found['matrix'], 'rb') as f:
+                write_matrix_files(*read_matrix(f.read(), found['matrix'], labels), work_dir)
+            matrix = open_matrix_dir(work_dir)
+            shown, _ = subsample_matrix(matrix)
+            _save_figure(create_snp_heatmap(shown.reset_index(), DEFAULT_FIGURE_OPTIONS['heatmap_palette']),
+                         work_dir, 'snp_heatmap')
+            manifest['contents']['matrix'] = {'samples': len(matrix)}
+
+        if 'alignment' in found:
+            with open(found['alignment'], 'rb') as f:
+                build_alignment_store(project_key(name), f.read(), directory=os.path.join(work_dir, 'alignment'))
+            with open(os.path.join(work_dir, 'alignment', 'meta.json')) as f:
+                manifest['contents']['alignment'] = json.load(f)
+
+        with open(os.path.join(work_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        # ✅ Move the old bundle aside before swapping, so the project is only missing between two renames
+        old_dir = None
+        if os.path.exists(final_dir):
+            old_dir = tempfile.mkdtemp(prefix=f".{name}-old-", dir=project_dir)
+            os.replace(final_dir, os.path.join(old_dir, name))
+        try:
+            os.replace(work_dir, final_dir)
+        except OSError:
+            if old_dir:
+                os.replace(os.path.join(old_dir, name), final_dir)
+            raise
+        finally:
+            if old_dir:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        _OPEN_BUNDLES.pop((project_dir, name), None)
+
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    # ✅ Track summaries are cached next to the alignment, so compute them once now
+    if 'alignment' in manifest['contents'] and os.path.abspath(project_dir) == os.path.abspath(PROJECT_DIR):
+        key = open_bundle(name).key
+        get_alignment_tracks(key, get_alignment(key).matrix)
+
+    logger.info(f"Ingested project {name} ({', '.join(manifest['contents'])}) in {time.time() - start:.1f}s")
+    return manifest
+
+
+class ProjectBundle:
+    """Read access to one ingested run; every artefact is loaded lazily and kept for this worker."""
+
+    def __init__(self, name, directory, manifest, mtime=None):
+        self.name = name
+        self.directory = directory
+        self.manifest = manifest
+        self.mtime = mtime  # Manifest mtime (ns) when opened; a re-ingest changes it
+        self._cache = {}
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def _cached(self, key, load):
+        if key not in self._cache:
+            self._cache[key] = load()
+        return self._cache[key]
+
+    def has(self, kind):
+        return kind in self.manifest['contents']
+
+    @property
+    def key(self):
+        """Store key of the bundle's matrix and alignment, new for every ingest."""
+        return project_key(self.name, self.mtime)
+
+    @property
+    def alignment_key(self):
+        return self.key if self.has('alignment') else None
+
+    def tree(self):
+        """The displayed (midpoint-rooted) Bio.Phylo tree; plotting functions use it as-is."""
+        return self._cached('tree', lambda: Phylo.read(self._path('tree.nwk'), 'newick'))
+
+    def tree_arrays(self):
+        def load():
+            arrays = np.load(self._path('tree_arrays.npz'))
+            return TreeArrays(arrays['parent'], arrays['branch_length'], [n or None for n in arrays['names'].tolist()])
+        return self._cached('tree_arrays', load)
+
+    def layout(self, kind):
+        """Per-node (preorder) coordinates: 'rectangular' gives x, y; 'circular' gives angle, radius."""
+        def load():
+            arrays = np.load(self._path(f"layout_{kind}.npz"))
+            return arrays['x'], arrays['y']
+        return self._cached(f"layout_{kind}", load)
+
+    def snp_matrix(self):
+        """Square SNP distance DataFrame indexed by sample name, over a read-only memory map."""
+        return self._cached('snp_matrix', lambda: open_matrix_dir(self.directory))
+
+    def metadata(self, columns=None):
+        df = self._cached('metadata', lambda: pd.read_pickle(self._path('metadata.pkl')))
+        if columns is None:
+            return df
+        return df[['taxa'] + [c for c in columns if c in df.columns and c != 'taxa']]
+
+    def annotation_files(self):
+        """The run's iTOL files as (bytes, filename) pairs."""
+        files = []
+        for filename in self.manifest['contents'].get('annotations', []):
+            with open(self._path('annotations', filename), 'rb') as f:
+                files.append((f.read(), filename))
+        return files
+
+    def tree_annotations(self):
+        """(tip -> colour, extra iTOL datasets, search table) for the circular tree, as for uploaded files."""
+        def load():
+            tip_names = [name.strip() if name else None for name in self.tree_arrays().tip_names]
+            files = self.annotation_files()
+            colors, datasets, search_table = load_tree_annotations(files, tip_names)
+            if not colors and self.has('metadata') and 'color' in self.metadata().columns:
+                colors = dict(zip(self.metadata()['taxa'], self.metadata()['color'].astype(str)))
+            return colors, datasets, search_table
+        return self._cached('tree_annotations', load)
+
+    def tip_colors(self, colors):
+        """Re-keys a stripped-name colour dict by the tree's own tip names."""
+        return {name: colors[name.strip()] for name in self.tree_arrays().tip_names
+                if name and name.strip() in colors}
+
+    def figure(self, name):
+        """A default figure stored at ingest time (plotly JSON as a dict), or None."""
+        path = self._path('figures', f"{name}.json")
+        if not os.path.exists(path):
+            return None
+        def load():
+            with open(path) as f:
+                return json.load(f)
+        return self._cached(f"figure_{name}", load)
+
+
+def list_bundles(project_dir=PROJECT_DIR):
+    """Names of the ingested projects in project_dir, newest first."""
+    if not os.path.isdir(project_dir):
+        return []
+    names = [n for n in os.listdir(project_dir)
+             if BUNDLE_NAME.match(n) and os.path.exists(os.path.join(project_dir, n, MANIFEST_FILE))]
+    return sorted(names, key=lambda n: os.path.getmtime(os.path.join(project_dir, n, MANIFEST_FILE)), reverse=True)
+
+
+def open_bundle(name, project_dir=PROJECT_DIR):
+    """
+    Opens an ingested project by name (once per worker, and again after it is re-ingested);
+    raises FileNotFoundError if it does not exist.
+    """
+    _check_name(name)
+    directory = os.path.join(project_dir, name)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Project {name!r} not found in {project_dir}.") from None
+    bundle = _OPEN_BUNDLES.get((project_dir, name))
+    if bundle is None or bundle.mtime != mtime:
+        with open(manifest_path) as f:
+            bundle = ProjectBundle(name, directory, json.load(f), mtime)
+        _OPEN_BUNDLES[(project_dir, name)] = bundle
+    return bundle
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.project_bundle",
+                                     description="Ingest a pipeline run directory into a dashboard project bundle.")
+    parser.add_argument("run_dir", help="directory with the run's tree, snp-dists matrix, alignment and metadata")
+    parser.add_argument("--name", help="project name (default: the directory name)")
+    parser.add_argument("--project-dir", default=PROJECT_DIR, help=f"bundle directory (default: {PROJECT_DIR})")
+    for kind in FILE_PATTERNS:
+        parser.add_argument(f"--{kind}", help=f"{kind} file (default: found by name in run_dir)")
+    parser.add_argument("--itol", nargs='*', help="iTOL dataset files (default: iTOL .txt files in run_dir)")
+    parser.add_argument("--force", action="store_true", help="replace an existing project of the same name")
+    args = parser.parse_args(argv)
+
+    overrides = {kind: getattr(args, kind) for kind in list(FILE_PATTERNS) + ['itol']}
+    try:
+        manifest = ingest_run(args.run_dir, args.name, args.project_dir, overrides, args.force)
+    except (ValueError, FileExistsError) as e:
+        parser.exit(2, f"error: {str(e)}\n")
+    print(f"Project {manifest['name']}: {json.dumps(manifest['contents'])}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,33 +1,66 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from Bio import Phylo
+from config import logger
 from utils.color_utils import generate_location_colors, generate_mlst_colors
+from utils.taxon_search import search_highlight_traces
+from utils.sample_selection import selection_trace
+from utils.metadata_loader import fill_missing
+from utils.tree_arrays import TreeArrays
+
+def rectangular_layout(tree_arrays, root_length=0.0):
+    """
+    x (distance from the root) and y of every node (preorder): tips on rows 0, 1, ... in tree order,
+    internal nodes at the mean of the last row under each child. Array operations only, so deep
+    (ladder) trees need no recursion.
+    """
+    n = tree_arrays.n_nodes
+    row = np.zeros(n)
+    row[tree_arrays.tips] = np.arange(tree_arrays.n_tips)
+    last_row = row[np.arange(n) + tree_arrays.subtree_size - 1]  # A preorder range ends with a tip
+    n_children = np.diff(tree_arrays.child_offsets)
+    child_sum = np.bincount(tree_arrays.parent[1:], weights=last_row[1:], minlength=n)
+    y = np.where(n_children > 0, child_sum / np.maximum(n_children, 1), row)
+    return tree_arrays.depth + root_length, y
+
+def rectangular_coordinates(tree):
+    """Returns x (distance from root) and y (tip order) per clade (in preorder), plus the largest tip y."""
+    tree_arrays = TreeArrays.from_phylo(tree)
+    x, y = rectangular_layout(tree_arrays, tree.root.branch_length or 0)
+    return (dict(zip(tree_arrays.clades, x.tolist())), dict(zip(tree_arrays.clades, y.tolist())),
+            max(tree_arrays.n_tips - 1, 0))
 
 def create_tree_plot(tree_file, metadata_file, show_tip_labels, mlst_palette, location_palette):
     """Generates a rectangular phylogenetic tree plot with optional MLST heatmap, bootstrap support, and location colors."""
     # Load tree
-    print("MLST Palette:", mlst_palette)
-    print("Location Palette:", location_palette)
+    logger.debug(f"Tree plot palettes: MLST {mlst_palette}, location {location_palette}")
 
-    try:
-        tree = Phylo.read(tree_file, 'newick')
-        print("Tree Loaded Successfully")
-    except Exception as e:
-        print(f"Tree Load Error: {e}")
-        return 0
+    # A Tree object is used as given (already rooted); a file path is read and midpoint-rooted
+    if isinstance(tree_file, Phylo.BaseTree.Tree):
+        tree = tree_file
+    else:
+        try:
+            tree = Phylo.read(tree_file, 'newick')
+        except Exception as e:
+            logger.error(f"Tree Load Error: {e}")
+            return 0
 
-    tree.root_at_midpoint()
+        tree.root_at_midpoint()
 
-    # Load metadata
-    metadata = pd.read_csv(metadata_file, sep='\t')
+    # Load metadata (a DataFrame from the metadata loader is copied, since it may be cached)
+    if isinstance(metadata_file, pd.DataFrame):
+        metadata = metadata_file.copy()
+    else:
+        metadata = pd.read_csv(metadata_file, sep='\t')
     if 'taxa' not in metadata.columns or 'location' not in metadata.columns:
         raise ValueError("Metadata file must contain 'taxa' and 'location' columns.")
 
-    metadata['location'] = metadata['location'].fillna('Unknown')
+    metadata['location'] = fill_missing(metadata['location'])
 
     has_mlst = 'MLST' in metadata.columns
     if has_mlst:
-        metadata['MLST'] = metadata['MLST'].fillna('Unknown')
+        metadata['MLST'] = fill_missing(metadata['MLST'])
         mlst_colors = generate_mlst_colors(metadata['MLST'], palette=mlst_palette)
     else:
         mlst_colors = {}
@@ -35,34 +68,11 @@ def create_tree_plot(tree_file, metadata_file, show_tip_labels, mlst_palette, lo
     location_colors = generate_location_colors(metadata['location'], palette=location_palette)
 
     # Compute tree node coordinates
-    x_coords = tree.depths(unit_branch_lengths=True)
-    y_coords = {}
-    max_y = 0
-
-    def assign_coordinates(clade, x_start=0, y_start=0):
-        nonlocal max_y
-        branch_length = clade.branch_length if clade.branch_length else 0.0
-        x_current = x_start + branch_length
-
-        if clade.is_terminal():
-            x_coords[clade] = x_current
-            y_coords[clade] = y_start
-            max_y = max(max_y, y_start)
-            return y_start + 1
-        else:
-            y_positions = []
-            for child in clade.clades:
-                y_start = assign_coordinates(child, x_current, y_start)
-                y_positions.append(y_start - 1)
+    x_coords, y_coords, max_y = rectangular_coordinates(tree)
+    tips = [clade for clade in x_coords if clade.is_terminal()]  # Tree order, without get_terminals' recursion
 
-            x_coords[clade] = x_current
-            y_coords[clade] = sum(y_positions) / len(y_positions)
-            return y_start
-
-    assign_coordinates(tree.root)
-
-    num_tips = sum(1 for _ in tree.get_terminals())
-    max_label_length = max((len(clade.name) for clade in tree.get_terminals() if clade.name), default=10)
+    num_tips = len(tips)
+    max_label_length = max((len(clade.name) for clade in tips if clade.name), default=10)
     height = max(800, num_tips * 25)
     width = max(1000, 800 + (max_label_length * 10))
     mlst_x_position = max(x_coords.values()) + 0.02
@@ -115,12 +125,15 @@ def create_tree_plot(tree_file, metadata_file, show_tip_labels, mlst_palette, lo
                 showlegend=False
             ))
 
-    for clade in tree.get_terminals():
+    # One row per taxon, looked up by name instead of filtering the whole table for every tip
+    meta_rows = metadata.drop_duplicates('taxa').set_index('taxa')
+
+    for clade in tips:
         x, y = x_coords[clade], y_coords[clade]
-        meta_row = metadata[metadata['taxa'] == clade.name]
 
-        if not meta_row.empty:
-            location = meta_row['location'].iloc[0]
+        if clade.name in meta_rows.index:
+            meta_row = meta_rows.loc[clade.name]
+            location = meta_row['location']
             color = location_colors.get(location, 'gray')
 
             show_location_legend = location not in seen_locations
@@ -145,7 +158,7 @@ def create_tree_plot(tree_file, metadata_file, show_tip_labels, mlst_palette, lo
                 ))
 
             if has_mlst:
-                mlst_value = meta_row['MLST'].iloc[0]
+                mlst_value = meta_row['MLST']
                 mlst_color = mlst_colors.get(mlst_value, 'gray')
                 show_mlst_legend = mlst_value not in seen_mlst
                 if show_mlst_legend:
@@ -166,7 +179,10 @@ def create_tree_plot(tree_file, metadata_file, show_tip_labels, mlst_palette, lo
         height=height, width=width, plot_bgcolor="rgb(240, 240, 250)"
     )
 
-    figure_data = [location_legend_title] + tree_line_traces + bootstrap_markers + tip_markers
+    # ✅ The selection trace (data[2]) holds every tip in tree order, for lasso selection and the shared selection
+    tip_selection = selection_trace([x_coords[clade] for clade in tips], [y_coords[clade] for clade in tips])
+    figure_data = (search_highlight_traces() + [tip_selection, location_legend_title] + tree_line_traces
+                   + bootstrap_markers + tip_markers)
     if has_mlst:
         figure_data += [mlst_legend_title] + mlst_markers
 
@@ -0,0 +1,31 @@
+"""
+Gzip for the JSON and HTML responses behind Dash (callback outputs, the layout), without
+flask-compress; files streamed from disk are left alone. Figures are made smaller
+before this by utils.figure_payload.compact_figure.
+"""
+import gzip
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESSED_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+
+def register_response_compression(server, min_bytes=COMPRESS_MIN_BYTES, level=5):
+    """Gzips responses of at least `min_bytes` for clients that accept it."""
+    from flask import request
+
+    @server.after_request
+    def compress(response):
+        if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSED_MIMETYPES
+                or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+            return response
+        data = response.get_data()
+        if len(data) < min_bytes:
+            return response
+        response.set_data(gzip.compress(data, level))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Content-Length'] = str(len(response.get_data()))
+        response.vary.add('Accept-Encoding')
+        return response
+
+    return compress
@@ -0,0 +1,65 @@
+import plotly.express as px
+from utils.sample_selection import selection_trace
+
+# ✅ Define a color scale mapping dictionary
+SNP_COLOR_SCALES = {
+    'viridis': px.colors.sequential.Viridis,
+    'plasma': px.colors.sequential.Plasma,
+    'inferno': px.colors.sequential.Inferno,
+    'magma': px.colors.sequential.Magma,
+    'cividis': px.colors.sequential.Cividis,
+    'turbo': px.colors.sequential.Turbo,
+    'blues': px.colors.sequential.Blues,
+    'greens': px.colors.sequential.Greens,
+    'oranges': px.colors.sequential.Oranges,
+    'reds': px.colors.sequential.Reds,
+    'blackbody': px.colors.sequential.Blackbody,
+    'rainbow': px.colors.sequential.Rainbow,
+    'electric': px.colors.sequential.Electric,
+    'hot': px.colors.sequential.Hot
+}
+
+HEATMAP_MAX_SAMPLES = 2000  # Larger matrices are drawn from every k-th sample
+HEATMAP_SELECTION_TRACE = 1  # Diagonal markers showing the shared sample selection
+
+
+def subsample_matrix(matrix, max_samples=HEATMAP_MAX_SAMPLES):
+    """Every k-th row and column of a square matrix DataFrame (k = 1 when it is small enough); returns (matrix, k)."""
+    step = -(-len(matrix) // max_samples)
+    if step <= 1:
+        return matrix, 1
+    return matrix.iloc[::step, ::step], step
+
+
+def heatmap_samples(matrix):
+    """Samples of a matrix's heatmap in plotted order (sorted, after subsampling), as in create_snp_heatmap."""
+    return sorted(subsample_matrix(matrix)[0].index)
+
+
+def create_snp_heatmap(df, heatmap_palette='viridis'):
+    """SNP distance heatmap from a snp-dists table (first column = sample names)."""
+    df = df.rename(columns={df.columns[0]: "Sample"})
+    df_melted = df.melt(id_vars=["Sample"], var_name="Variable", value_name="Value")
+    pivot_df = df_melted.pivot(index="Sample", columns="Variable", values="Value")
+
+    # ✅ Ensure valid color scale selection (default to Viridis)
+    if not heatmap_palette:
+        heatmap_palette = 'viridis'  # ✅ Set default if None
+
+    selected_palette = SNP_COLOR_SCALES.get(heatmap_palette.lower(), px.colors.sequential.Viridis)
+
+    fig = px.imshow(
+        pivot_df,
+        color_continuous_scale=selected_palette,  # ✅ Now correctly maps colors
+        labels={'color': 'SNP Distance'},
+        title=f"SNP Distance Heatmap ({heatmap_palette})"
+    )
+    fig.add_trace(selection_trace(pivot_df.index, pivot_df.index))
+
+    fig.update_layout(
+        xaxis=dict(tickangle=-45),
+        margin=dict(l=40, r=40, t=40, b=40),
+        width=1000,
+        height=800
+    )
+    return fig
@@ -0,0 +1,281 @@
+"""
+SNP distance matrices in text or binary formats, converted once per upload into the layout
+project bundles use and opened as read-only memory maps, so reopening even a 20k x 20k
+matrix takes milliseconds and only the rows a view touches are read from disk.
+
+    python -m utils.snp_matrix_store snp_dists.tsv -o snp_matrix.zip   # convert for fast loading
+
+Formats (by file extension):
+    .tsv .tab .txt .dist   snp-dists style text (first column = sample names); .csv is comma-separated
+    .npy                   square NumPy matrix; names come from a label file
+    .zip                   an exported matrix: snp_matrix.npy + snp_names.json (or a label file)
+    .parquet .arrow        one column per sample, optionally a first column of names (needs pyarrow)
+    .feather .ipc
+    .h5 .hdf5              first square dataset, names from a 'names'/'labels'/'samples' dataset
+                           or attribute (needs h5py)
+A label file (one name per line, or a JSON list) names the rows and columns of any of them.
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from config import PROJECT_DIR, SNP_MATRIX_STORE_DIR, logger
+from utils.alignment_store import PROJECT_KEY_PREFIX, project_name
+from utils.callback_metrics import record_cache
+from utils.file_processing import load_snp_matrix
+
+# On-disk layout of one stored matrix (one directory per upload hash, or a project bundle):
+#   snp_matrix.npy   square (n x n) matrix, int32 when the distances are integers
+#   snp_names.json   {'index': row names, 'columns': column names}
+MATRIX_FILE = 'snp_matrix.npy'
+NAMES_FILE = 'snp_names.json'
+EXPORT_FILENAME = 'snp_matrix.zip'
+FORMATS = {
+    '.tsv': 'text', '.tab': 'text', '.txt': 'text', '.dist': 'text', '.dists': 'text', '.csv': 'csv',
+    '.npy': 'npy', '.zip': 'zip', '.parquet': 'parquet', '.pq': 'parquet',
+    '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow', '.h5': 'hdf5', '.hdf5': 'hdf5',
+}
+LABEL_DATASETS = ('names', 'labels', 'samples')
+MAX_OPEN_MATRICES = 8
+
+_OPEN_MATRICES = OrderedDict()
+_OPEN_MATRICES_LOCK = threading.Lock()  # Threaded workers share the LRU order
+
+
+def matrix_format(filename):
+    """Format name for a matrix file name; unknown extensions are read as snp-dists text."""
+    return FORMATS.get(os.path.splitext(filename or '')[1].lower(), 'text')
+
+
+def _optional_import(module, what):
+    try:
+        return __import__(module, fromlist=['_'])
+    except ImportError:
+        raise ValueError(f"Reading {what} matrices needs the {module} package (pip install {module}).")
+
+
+def read_labels(data):
+    """Sample names from a label file: a JSON list (or {'index': [...]}) or one name per line."""
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    if text.lstrip().startswith(('[', '{')):
+        names = json.loads(text)
+        return [str(name) for name in (names['index'] if isinstance(names, dict) else names)]
+    return [line.split('\t')[0].split(',')[0].strip() for line in text.splitlines() if line.strip()]
+
+
+def _table_matrix(table):
+    """(values, names) from a table with one column per sample and optionally a leading name column."""
+    df = table.to_pandas() if hasattr(table, 'to_pandas') else table
+    names = None
+    if len(df.columns) == len(df) + 1 or not pd.api.types.is_numeric_dtype(df.dtypes.iloc[0]):
+        names = df.iloc[:, 0].astype(str).str.strip().tolist()
+        df = df.iloc[:, 1:]
+    columns = [str(column).strip() for column in df.columns]
+    return df.to_numpy(), names or columns
+
+
+def _hdf5_matrix(data):
+    h5py = _optional_import('h5py', 'HDF5')
+    with h5py.File(io.BytesIO(data), 'r') as f:
+        datasets = []
+        f.visititems(lambda path, item: datasets.append((path, item)) if isinstance(item, h5py.Dataset) else None)
+        square = [(path, item) for path, item in datasets if item.ndim == 2 and item.shape[0] == item.shape[1]]
+        if not square:
+            raise ValueError("The HDF5 file has no square dataset.")
+        path, dataset = square[0]
+        values = dataset[()]
+        names = None
+        for path, item in datasets:
+            if path.rsplit('/', 1)[-1].lower() in LABEL_DATASETS and item.ndim == 1 and len(item) == len(values):
+                names = item[()]
+        for key in LABEL_DATASETS:
+            if names is None and key in dataset.attrs:
+                names = dataset.attrs[key]
+    if names is not None:
+        names = [name.decode() if isinstance(name, bytes) else str(name) for name in names]
+    return values, names
+
+
+def read_matrix(data, filename, labels=None):
+    """
+    Reads matrix bytes of any supported format; returns (values, index names, column names).
+    `labels` (a list of names) overrides any names stored with the matrix.
+    """
+    kind = matrix_format(filename)
+    index = columns = None
+    if kind in ('text', 'csv'):
+        df = load_snp_matrix(data.decode('utf-8-sig') if isinstance(data, bytes) else data,
+                             sep=',' if kind == 'csv' else '\t')
+        values, index, columns = df.to_numpy(), list(df.index), list(df.columns)
+    elif kind == 'npy':
+        values = np.load(io.BytesIO(data), allow_pickle=False)
+    elif kind == 'zip':
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            members = archive.namelist()
+            matrix_member = next((m for m in members if m.lower().endswith('.npy')), None)
+            if matrix_member is None:
+                raise ValueError("The zip file has no .npy matrix.")
+            values = np.load(io.BytesIO(archive.read(matrix_member)), allow_pickle=False)
+            label_member = next((m for m in members if m != matrix_member and m.lower().endswith(('.json', '.txt'))), None)
+            if label_member and labels is None:
+                stored = json.loads(archive.read(label_member)) if label_member.lower().endswith('.json') else None
+                if isinstance(stored, dict):
+                    index, columns = stored['index'], stored['columns']
+                else:
+                    index = read_labels(archive.read(label_member))
+    elif kind == 'parquet':
+        parquet = _optional_import('pyarrow.parquet', 'Parquet')
+        values, index = _table_matrix(parquet.read_table(io.BytesIO(data)))
+    elif kind == 'arrow':
+        feather = _optional_import('pyarrow.feather', 'Arrow')
+        values, index = _table_matrix(feather.read_table(io.BytesIO(data)))
+    else:
+        values, index = _hdf5_matrix(data)
+
+    if labels is not None:
+        index = columns = list(labels)
+    columns = columns or index
+    if values.ndim != 2 or values.shape[0] != values.shape[1]:
+        raise ValueError(f"The SNP matrix must be square, got shape {values.shape}.")
+    if index is None:
+        raise ValueError(f"A {kind} matrix needs a label file with one sample name per line.")
+    if len(index) != len(values) or len(columns) != len(values):
+        raise ValueError(f"{len(index)} sample names for a {len(values)} x {len(values)} matrix.")
+    if not np.issubdtype(values.dtype, np.number):
+        raise ValueError("The SNP matrix must be numeric.")
+    if np.issubdtype(values.dtype, np.inexact) and not all(
+            np.isfinite(values[start:start + 1024]).all() for start in range(0, len(values), 1024)):
+        raise ValueError("The SNP matrix has missing or infinite distances (NaN/inf); every pair needs a value.")
+    return values, [str(name) for name in index], [str(name) for name in columns]
+
+
+def _compact(values):
+    """int32 for integer distances (half the size of pandas' int64), other matrices unchanged."""
+    if np.issubdtype(values.dtype, np.integer) and values.size and np.iinfo(np.int32).min <= values.min() \
+            and values.max() <= np.iinfo(np.int32).max:
+        return values.astype(np.int32, copy=False)
+    return values
+
+
+def write_matrix_files(values, index, columns, directory):
+    """Writes the matrix and its names in the stored layout into an existing directory."""
+    np.save(os.path.join(directory, MATRIX_FILE), _compact(np.asarray(values)))
+    with open(os.path.join(directory, NAMES_FILE), 'w') as f:
+        json.dump({'index': list(index), 'columns': list(columns)}, f)
+
+
+def open_matrix_dir(directory):
+    """The stored matrix of a directory as a DataFrame over a read-only memory map."""
+    with open(os.path.join(directory, NAMES_FILE)) as f:
+        names = json.load(f)
+    values = np.load(os.path.join(directory, MATRIX_FILE), mmap_mode='r')
+    return pd.DataFrame(values, index=names['index'], columns=names['columns'], copy=False)
+
+
+def store_path(key):
+    if key.startswith(PROJECT_KEY_PREFIX):
+        return os.path.join(PROJECT_DIR, project_name(key))
+    return os.path.join(SNP_MATRIX_STORE_DIR, key)
+
+
+def build_matrix_store(key, data, filename, labels=None):
+    """
+    Converts matrix bytes into the store for `key`; written under a temporary name and renamed,
+    so readers never see a partial matrix.
+    """
+    final_dir = store_path(key)
+    if os.path.exists(os.path.join(final_dir, NAMES_FILE)):
+        return final_dir
+
+    os.makedirs(SNP_MATRIX_STORE_DIR, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=".matrix-", dir=SNP_MATRIX_STORE_DIR)
+    try:
+        values, index, columns = read_matrix(data, filename, labels)
+        write_matrix_files(values, index, columns, work_dir)
+        try:
+            os.replace(work_dir, final_dir)
+        except OSError:
+            # Another worker finished the same upload first; its copy is identical
+            shutil.rmtree(work_dir, ignore_errors=True)
+        logger.info(f"Stored SNP matrix {key[:24]}: {len(index)} samples from {filename}")
+        return final_dir
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+
+def open_matrix(key):
+    """The stored matrix for `key` (memory-mapped, cached per process), or None if it is not stored."""
+    with _OPEN_MATRICES_LOCK:
+        matrix = _OPEN_MATRICES.get(key)
+        if matrix is not None:
+            _OPEN_MATRICES.move_to_end(key)
+    record_cache('snp_matrix', matrix is not None)
+    if matrix is not None:
+        return matrix
+
+    directory = store_path(key)
+    if not os.path.exists(os.path.join(directory, NAMES_FILE)):
+        return None
+    matrix = open_matrix_dir(directory)
+    with _OPEN_MATRICES_LOCK:
+        _OPEN_MATRICES[key] = matrix
+        while len(_OPEN_MATRICES) > MAX_OPEN_MATRICES:
+            _OPEN_MATRICES.popitem(last=False)
+    return matrix
+
+
+def store_uploaded_matrix(contents, filename, label_contents=None):
+    """Stores an uploaded matrix (and optional label file) once; returns its store key."""
+    from utils.file_processing import decode_uploaded_bytes, hash_uploaded_contents
+
+    key = hash_uploaded_contents(contents)
+    if label_contents:
+        key = f"{key}-{hash_uploaded_contents(label_contents)}"
+    if open_matrix(key) is None:
+        labels = read_labels(decode_uploaded_bytes(label_contents)) if label_contents else None
+        build_matrix_store(key, decode_uploaded_bytes(contents), filename, labels)
+    return key
+
+
+def export_matrix(matrix):
+    """A matrix DataFrame as zip bytes in the stored layout, the fastest format to load again."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        array = io.BytesIO()
+        np.save(array, _compact(matrix.to_numpy()))
+        archive.writestr(MATRIX_FILE, array.getvalue())
+        archive.writestr(NAMES_FILE, json.dumps({'index': list(matrix.index), 'columns': list(matrix.columns)}))
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.snp_matrix_store",
+                                     description="Convert an SNP distance matrix to the fast-loading zip format.")
+    parser.add_argument("matrix", help="matrix file (snp-dists text, .npy, .zip, Parquet, Arrow or HDF5)")
+    parser.add_argument("--labels", help="label file with one sample name per line (needed for a bare .npy)")
+    parser.add_argument("-o", "--output", help=f"output zip (default: {EXPORT_FILENAME} next to the input)")
+    args = parser.parse_args(argv)
+
+    labels = None
+    if args.labels:
+        with open(args.labels, 'rb') as f:
+            labels = read_labels(f.read())
+    with open(args.matrix, 'rb') as f:
+        values, index, columns = read_matrix(f.read(), args.matrix, labels)
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(args.matrix)), EXPORT_FILENAME)
+    with open(output, 'wb') as f:
+        f.write(export_matrix(pd.DataFrame(values, index=index, columns=columns, copy=False)))
+    print(f"Wrote {len(index)} x {len(columns)} matrix to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
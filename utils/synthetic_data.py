@@ -0,0 +1,101 @@
+"""
+Deterministic synthetic inputs for benchmarking: Newick trees (balanced or ladder-shaped),
+matching metadata tables, snp-dists matrices and FASTA alignments. The same (n, seed) always
+gives byte-identical files, so timings from different commits compare like with like.
+"""
+import numpy as np
+
+TREE_SHAPES = ('balanced', 'ladder')
+LOCATIONS = [
+    ('Paris', 48.8566, 2.3522), ('Lyon', 45.764, 4.8357), ('Berlin', 52.52, 13.405), ('Madrid', 40.4168, -3.7038),
+    ('Rome', 41.9028, 12.4964), ('Lisbon', 38.7223, -9.1393), ('Vienna', 48.2082, 16.3738), ('Prague', 50.0755, 14.4378),
+    ('Warsaw', 52.2297, 21.0122), ('Oslo', 59.9139, 10.7522), ('Dublin', 53.3498, -6.2603), ('Athens', 37.9838, 23.7275),
+    ('Nairobi', -1.2921, 36.8219), ('Lima', -12.0464, -77.0428), ('Hanoi', 21.0278, 105.8342), ('Atlanta', 33.749, -84.388),
+]
+LOCATION_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f',
+                   '#bcbd22', '#17becf', '#aec7e8', '#ffbb78', '#98df8a', '#ff9896', '#c5b0d5', '#c49c94']
+N_MLST = 30
+
+
+def taxon_names(n):
+    width = len(str(n))
+    return [f"S{i:0{width}d}" for i in range(1, n + 1)]
+
+
+def newick_tree(n, shape='balanced', seed=0):
+    """Newick text for an n-tip tree, built without recursion so 100k-tip ladders are fine."""
+    if shape not in TREE_SHAPES:
+        raise ValueError(f"Unknown tree shape {shape!r}; expected one of {', '.join(TREE_SHAPES)}")
+    rng = np.random.default_rng(seed)
+    names = taxon_names(n)
+    lengths = iter(np.round(rng.exponential(0.01, 2 * n), 6).tolist())
+
+    if shape == 'ladder':
+        parts = ["(" * (n - 1), f"{names[0]}:{next(lengths)}"]
+        for name in names[1:]:
+            parts.append(f",{name}:{next(lengths)}):{next(lengths)}")
+        parts[-1] = parts[-1].rsplit(':', 1)[0]
+        return "".join(parts) + ";"
+
+    # Balanced: pair neighbouring subtrees level by level
+    nodes = [f"{name}:{next(lengths)}" for name in names]
+    while len(nodes) > 1:
+        paired = [f"({nodes[k]},{nodes[k + 1]}):{next(lengths)}" for k in range(0, len(nodes) - 1, 2)]
+        if len(nodes) % 2:
+            paired.append(nodes[-1])
+        nodes = paired
+    return nodes[0].rsplit(':', 1)[0] + ";"
+
+
+def metadata_table(n, seed=0):
+    """TSV metadata for taxon_names(n): taxa, location, MLST, date, latitude, longitude and color."""
+    rng = np.random.default_rng(seed + 1)
+    location = rng.integers(0, len(LOCATIONS), n)
+    mlst = rng.integers(1, N_MLST + 1, n)
+    day = rng.integers(0, 3 * 365, n)
+    dates = (np.datetime64('2021-01-01') + day).astype(str)
+
+    lines = ["taxa\tlocation\tMLST\tdate\tlatitude\tlongitude\tcolor"]
+    for name, loc, st, date in zip(taxon_names(n), location, mlst, dates):
+        place, lat, lon = LOCATIONS[loc]
+        lines.append(f"{name}\t{place}\tST{st}\t{date}\t{lat}\t{lon}\t{LOCATION_COLORS[loc]}")
+    return "\n".join(lines) + "\n"
+
+
+def snp_distance_matrix(n, seed=0):
+    """Symmetric integer SNP distances with cluster structure (samples in one cluster are close)."""
+    rng = np.random.default_rng(seed + 2)
+    n_clusters = max(1, n // 50)
+    cluster = rng.integers(0, n_clusters, n)
+    centre = rng.integers(0, 5000, n_clusters)
+    position = centre[cluster] + rng.integers(0, 25, n)
+    distances = np.abs(position[:, None] - position[None, :])
+    np.fill_diagonal(distances, 0)
+    return distances
+
+
+def snp_dists_table(n, seed=0):
+    """The matrix of snp_distance_matrix in snp-dists TSV format."""
+    names = taxon_names(n)
+    distances = snp_distance_matrix(n, seed)
+    lines = ["snp-dists 0.8.2\t" + "\t".join(names)]
+    lines.extend(f"{name}\t" + "\t".join(map(str, row)) for name, row in zip(names, distances.tolist()))
+    return "\n".join(lines) + "\n"
+
+
+def fasta_alignment(n, length=1000, seed=0, variable_fraction=0.05, gap_fraction=0.01):
+    """FASTA bytes of n aligned sequences: a shared reference with variable sites, gaps and Ns."""
+    rng = np.random.default_rng(seed + 3)
+    bases = np.frombuffer(b'ACGT', dtype=np.uint8)
+    reference = bases[rng.integers(0, 4, length)]
+    variable = np.flatnonzero(rng.random(length) < variable_fraction)
+
+    out = []
+    for name in taxon_names(n):
+        sequence = reference.copy()
+        sequence[variable] = bases[rng.integers(0, 4, len(variable))]
+        masked = rng.random(length) < gap_fraction
+        sequence[masked] = ord('-')
+        sequence[rng.random(length) < gap_fraction / 4] = ord('N')
+        out.append(b">" + name.encode() + b"\n" + sequence.tobytes() + b"\n")
+    return b"".join(out)
@@ -0,0 +1,200 @@
+import bisect
+import numpy as np
+import plotly.graph_objects as go
+from config import VIEW_STORE_DIR
+from utils.tree_arrays import TreeArrays
+from utils.lru_cache import LRUCache
+from utils.view_store import SEPARATOR, load_view, pack_strings, save_view, touch_view, unpack_strings, view_path
+
+MAX_HIGHLIGHTS = 2000  # Markers drawn for a search; the clade outline still covers every match
+VIEW_CACHE_SIZE = 16
+HIGHLIGHT_COLOR = '#ff00ff'
+
+_VIEW_CACHE = LRUCache('search_view', VIEW_CACHE_SIZE)
+
+
+def search_highlight_traces(polar=False):
+    """Two empty traces reserved at the start of a tree figure: matched tips (0) and their LCA clade (1)."""
+    trace = go.Scatterpolar if polar else go.Scatter
+    return [
+        trace(mode='markers', hoverinfo='text', showlegend=False, name='search-matches',
+              marker=dict(size=22, color='rgba(0,0,0,0)', line=dict(width=3, color=HIGHLIGHT_COLOR))),
+        trace(mode='lines', hoverinfo='skip', showlegend=False, name='search-clade',
+              line=dict(width=2, color=HIGHLIGHT_COLOR, dash='dash'), fill='toself',
+              fillcolor='rgba(255, 0, 255, 0.08)'),
+    ]
+
+
+class TaxonSearchIndex:
+    """
+    Substring and prefix index over tip names and metadata values.
+    All keys are lower-cased into one separator-joined string, so a substring search is a
+    loop of str.find in C and a bisect maps each hit back to its tip.
+    """
+
+    def __init__(self, tip_names, metadata_values=None):
+        entries = [(name.lower(), tip) for tip, name in enumerate(tip_names) if name]
+        for tip, values in (metadata_values or {}).items():
+            entries.extend((str(value).lower(), tip) for value in values if str(value).strip())
+        self._index([text for text, _ in entries], [tip for _, tip in entries])
+
+    @classmethod
+    def from_entries(cls, texts, entry_tips):
+        """Rebuilds an index from the (lower-cased text, tip) entries of a stored one."""
+        index = cls.__new__(cls)
+        index._index(texts, entry_tips)
+        return index
+
+    def _index(self, texts, entry_tips):
+        self.texts = texts
+        self.entry_tips = np.asarray(entry_tips, dtype=np.int64)
+        self.blob = SEPARATOR.join(self.texts)
+        lengths = np.fromiter((len(text) + 1 for text in self.texts), dtype=np.int64, count=len(self.texts))
+        self.starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+        order = sorted(range(len(self.texts)), key=self.texts.__getitem__)
+        self.sorted_texts = [self.texts[i] for i in order]
+        self.sorted_tips = self.entry_tips[order] if order else self.entry_tips
+
+    def prefix(self, query):
+        """Tips with a name or metadata value starting with the query."""
+        query = query.lower()
+        lo = bisect.bisect_left(self.sorted_texts, query)
+        hi = bisect.bisect_left(self.sorted_texts, query + '\uffff', lo=lo)
+        return np.unique(self.sorted_tips[lo:hi])
+
+    def substring(self, query):
+        """Tips with a name or metadata value containing the query."""
+        query = query.lower()
+        if not query or "\x00" in query:
+            return np.array([], dtype=np.int64)
+        hits = []
+        find = self.blob.find
+        pos = find(query)
+        while pos >= 0:
+            hits.append(pos)
+            pos = find(query, pos + 1)
+        entries = np.searchsorted(self.starts, np.array(hits, dtype=np.int64), side='right') - 1
+        return np.unique(self.entry_tips[entries])
+
+    def search(self, query):
+        """Substring match (which includes prefix matches) on a trimmed query."""
+        return self.substring(query.strip())
+
+
+class TreeSearchView:
+    """A rendered tree's search index plus the node coordinates needed to draw the highlight overlay."""
+
+    def __init__(self, tree_arrays, lca_index, index, x, y, polar=False):
+        self.tree = tree_arrays
+        self.lca_index = lca_index
+        self.index = index
+        self.x = x  # per node: x (rectangular) or angle in radians (polar)
+        self.y = y  # per node: y (rectangular) or radius (polar)
+        self.polar = polar
+
+    def clade_of(self, tip_positions):
+        """LCA node of a set of tips: the LCA of the two with the earliest and latest Euler first visit."""
+        nodes = self.tree.tips[tip_positions]
+        first = self.lca_index.first[nodes]
+        return int(self.lca_index.lca(nodes[[first.argmin()]], nodes[[first.argmax()]])[0])
+
+    def highlight(self, query):
+        """Returns (matches trace dict, clade trace dict, number of matches, LCA clade size in tips)."""
+        matches = self.index.search(query) if query and query.strip() else np.array([], dtype=np.int64)
+        empty = search_highlight_traces(self.polar)
+        if len(matches) == 0:
+            return empty[0].to_plotly_json(), empty[1].to_plotly_json(), 0, 0
+
+        shown = self.tree.tips[matches[:MAX_HIGHLIGHTS]]
+        names = [self.tree.names[i] for i in shown]
+        node = self.clade_of(matches)
+        descendants = np.arange(node, node + self.tree.subtree_size[node])
+        clade_tips = int(np.isin(descendants, self.tree.tips).sum())
+
+        match_trace, clade_trace = empty
+        if self.polar:
+            match_trace.update(r=self.y[shown].tolist(), theta=np.degrees(self.x[shown]).tolist(), text=names)
+            theta = np.degrees(np.linspace(self.x[descendants].min(), self.x[descendants].max(), 60))
+            r_inner, r_outer = float(self.y[node]), float(self.y[descendants].max()) + 0.5
+            clade_trace.update(r=[r_inner] * len(theta) + [r_outer] * len(theta) + [r_inner],
+                               theta=theta.tolist() + theta[::-1].tolist() + [float(theta[0])])
+        else:
+            match_trace.update(x=self.x[shown].tolist(), y=self.y[shown].tolist(), text=names)
+            x0, x1 = float(self.x[node]), float(self.x[descendants].max())
+            y0, y1 = float(self.y[descendants].min()) - 0.5, float(self.y[descendants].max()) + 0.5
+            clade_trace.update(x=[x0, x1, x1, x0, x0], y=[y0, y0, y1, y1, y0])
+
+        return match_trace.to_plotly_json(), clade_trace.to_plotly_json(), len(matches), clade_tips
+
+
+def metadata_search_values(metadata, taxa_column, tip_names):
+    """Maps tip position -> metadata values for that tip (all columns except the taxa column)."""
+    positions = {name: i for i, name in enumerate(tip_names)}
+    values = {}
+    columns = [c for c in metadata.columns if c != taxa_column]
+    for row in metadata[[taxa_column] + columns].itertuples(index=False):
+        tip = positions.get(str(row[0]).strip())
+        if tip is not None:
+            values.setdefault(tip, []).extend(v for v in row[1:] if v == v)
+    return values
+
+
+def search_view_from_arrays(tree_arrays, x, y, metadata=None, taxa_column='taxa', polar=False):
+    """Builds a TreeSearchView from TreeArrays and per-node (preorder) plot coordinates."""
+    from utils.patristic import LCAIndex
+
+    values = None
+    if metadata is not None and taxa_column in metadata.columns:
+        values = metadata_search_values(metadata, taxa_column, tree_arrays.tip_names)
+    return TreeSearchView(tree_arrays, LCAIndex(tree_arrays), TaxonSearchIndex(tree_arrays.tip_names, values),
+                          np.asarray(x, dtype=float), np.asarray(y, dtype=float), polar)
+
+
+def build_search_view(tree, x_coords, y_coords, metadata=None, taxa_column='taxa', polar=False):
+    """Builds a TreeSearchView for a rendered Bio.Phylo tree from its per-clade plot coordinates."""
+    tree_arrays = TreeArrays.from_phylo(tree)
+    x = [x_coords[clade] for clade in tree_arrays.clades]
+    y = [y_coords[clade] for clade in tree_arrays.clades]
+    return search_view_from_arrays(tree_arrays, x, y, metadata, taxa_column, polar)
+
+
+def save_search_view(path, view):
+    """Stores a view's tree, layout and index entries for the other workers."""
+    save_view(path, parent=view.tree.parent, branch_length=view.tree.branch_length,
+              names=pack_strings(name or '' for name in view.tree.names), x=view.x, y=view.y, polar=view.polar,
+              texts=pack_strings(view.index.texts), entry_tips=view.index.entry_tips)
+
+
+def load_search_view(path):
+    """Rebuilds a TreeSearchView saved by save_search_view; returns None if it is not stored."""
+    from utils.patristic import LCAIndex
+
+    saved = load_view(path)
+    if saved is None:
+        return None
+    parent, entry_tips = saved['parent'], saved['entry_tips']
+    names = [name or None for name in unpack_strings(saved['names'], len(parent))]
+    tree_arrays = TreeArrays(parent, saved['branch_length'], names)
+    index = TaxonSearchIndex.from_entries(unpack_strings(saved['texts'], len(entry_tips)), entry_tips)
+    return TreeSearchView(tree_arrays, LCAIndex(tree_arrays), index, saved['x'], saved['y'], bool(saved['polar']))
+
+
+def cache_search_view(key, view, store_dir=VIEW_STORE_DIR):
+    """Caches a view in this worker and stores it for the other workers, which may answer its searches."""
+    _VIEW_CACHE.put(key, view)
+    save_search_view(view_path('search', key, store_dir), view)
+    return view
+
+
+def get_search_view(key, store_dir=VIEW_STORE_DIR):
+    """The view for `key`: this worker's cache, then the stored copy of the worker that drew the tree, else None."""
+    path = view_path('search', key, store_dir)
+    view = _VIEW_CACHE.get(key)
+    if view is None:
+        view = load_search_view(path)
+        if view is None:
+            return None
+        _VIEW_CACHE.put(key, view)
+    touch_view(path)
+    return view
@@ -0,0 +1,86 @@
+import io
+import numpy as np
+from Bio import Phylo
+from utils.lru_cache import LRUCache
+
+TREE_CACHE_SIZE = 16
+
+_TREE_CACHE = LRUCache('tree_arrays', TREE_CACHE_SIZE)
+
+
+class TreeArrays:
+    """
+    Flat array view of a Bio.Phylo tree, numbered in preorder (root = 0):
+    parent[i], branch_length[i], depth[i] (distance from the root), level[i] (edges from the root),
+    children as CSR offsets, and the tip nodes with their names.
+    """
+
+    def __init__(self, parent, branch_length, names, clades=None):
+        self.parent = np.asarray(parent, dtype=np.int64)
+        self.branch_length = np.asarray(branch_length, dtype=np.float64)
+        self.names = names
+        self.clades = clades
+        n = len(self.parent)
+
+        # Children in CSR form (preorder numbering keeps each child list in tree order)
+        child_counts = np.bincount(self.parent[1:], minlength=n)
+        self.child_offsets = np.concatenate([[0], np.cumsum(child_counts)])
+        self.child_index = np.argsort(self.parent[1:], kind='stable') + 1
+
+        # Parents precede children in preorder, so one forward pass fills depth and level
+        self.depth = np.zeros(n)
+        self.level = np.zeros(n, dtype=np.int64)
+        for i in range(1, n):
+            p = self.parent[i]
+            self.depth[i] = self.depth[p] + self.branch_length[i]
+            self.level[i] = self.level[p] + 1
+
+        # Descendants of node i are the preorder range [i, i + subtree_size[i])
+        self.subtree_size = np.ones(n, dtype=np.int64)
+        for i in range(n - 1, 0, -1):
+            self.subtree_size[self.parent[i]] += self.subtree_size[i]
+
+        self.tips = np.flatnonzero(child_counts == 0)
+        self.tip_names = [names[i] for i in self.tips]
+        self.tip_position = {name: k for k, name in enumerate(self.tip_names)}
+
+    @property
+    def n_nodes(self):
+        return len(self.parent)
+
+    @property
+    def n_tips(self):
+        return len(self.tips)
+
+    def children(self, i):
+        return self.child_index[self.child_offsets[i]:self.child_offsets[i + 1]]
+
+    def levels(self):
+        """Node indices grouped by level, deepest level first (children before parents), root excluded."""
+        order = np.argsort(self.level, kind='stable')
+        bounds = np.searchsorted(self.level[order], np.arange(self.level.max() + 2))
+        return [order[bounds[lvl]:bounds[lvl + 1]] for lvl in range(self.level.max(), 0, -1)]
+
+    @classmethod
+    def from_phylo(cls, tree):
+        """Builds the arrays from a Bio.Phylo tree without recursion (ladder trees can be very deep)."""
+        parent, branch_length, names, clades = [], [], [], []
+        stack = [(tree.root, -1)]
+        while stack:
+            clade, p = stack.pop()
+            i = len(parent)
+            parent.append(p)
+            branch_length.append((clade.branch_length or 0.0) if p >= 0 else 0.0)
+            names.append(clade.name.strip() if clade.name else None)
+            clades.append(clade)
+            stack.extend((child, i) for child in reversed(clade.clades))
+        parent[0] = 0
+        return cls(parent, branch_length, names, clades)
+
+
+def load_tree_arrays(key, newick_text):
+    """Parses a Newick string into TreeArrays once per upload hash (small LRU cache per worker)."""
+    tree = _TREE_CACHE.get(key)
+    if tree is None:
+        tree = _TREE_CACHE.put(key, TreeArrays.from_phylo(Phylo.read(io.StringIO(newick_text), 'newick')))
+    return tree
@@ -0,0 +1,282 @@
+import io
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from Bio import Phylo
+from utils.tree_arrays import TreeArrays
+from utils.lru_cache import LRUCache
+
+COMPARISON_CACHE_SIZE = 8
+CONNECTOR_LIMIT = 5000  # Tip-to-tip connector lines drawn in a tanglegram
+
+_COMPARISON_CACHE = LRUCache('tree_comparison', COMPARISON_CACHE_SIZE)
+
+
+def _popcount(bits):
+    """Number of set bits in each row of a uint64 matrix."""
+    return np.unpackbits(np.ascontiguousarray(bits).view(np.uint8), axis=1).sum(axis=1)
+
+
+def _as_keys(bits):
+    """Views each row of a uint64 matrix as one opaque value so rows can be uniqued/hashed."""
+    bits = np.ascontiguousarray(bits)
+    return bits.view(np.dtype((np.void, bits.dtype.itemsize * bits.shape[1]))).ravel()
+
+
+def split_bits(tree, taxon_position, n_words):
+    """
+    Bit-packed bipartition of every node of a TreeArrays over a shared taxon index:
+    row i has bit k set when shared taxon k is below node i. Taxa outside the index are ignored.
+    """
+    bits = np.zeros((tree.n_nodes, n_words), dtype=np.uint64)
+    columns = np.array([taxon_position.get(name, -1) for name in tree.tip_names], dtype=np.int64)
+    known = columns >= 0
+    columns = columns[known]
+    np.bitwise_or.at(bits, (tree.tips[known], columns // 64),
+                     np.left_shift(np.uint64(1), (columns % 64).astype(np.uint64)))
+    for nodes in tree.levels():
+        np.bitwise_or.at(bits, tree.parent[nodes], bits[nodes])
+    return bits
+
+
+class TreeComparison:
+    """
+    Splits of several trees encoded as bit-packed bipartitions over their shared taxa.
+    Splits are unrooted and canonical (the side without shared taxon 0), so each distinct
+    bipartition gets one id and every comparison reduces to array operations on an
+    (n_trees x n_splits) presence / branch-length matrix.
+    """
+
+    def __init__(self, trees, labels):
+        self.trees = trees
+        self.labels = labels
+        common = set(trees[0].tip_names)
+        for tree in trees[1:]:
+            common &= set(tree.tip_names)
+        common.discard(None)
+        self.taxa = sorted(common)
+        if len(self.taxa) < 4:
+            raise ValueError(f"The trees share only {len(self.taxa)} taxa; at least 4 are needed to compare splits.")
+        self.taxon_position = {name: k for k, name in enumerate(self.taxa)}
+        self.n_taxa = len(self.taxa)
+        self.n_missing = [tree.n_tips - self.n_taxa for tree in trees]
+
+        n_words = (self.n_taxa + 63) // 64
+        full = np.full(n_words, np.iinfo(np.uint64).max, dtype=np.uint64)
+        if self.n_taxa % 64:
+            full[-1] = np.uint64((1 << (self.n_taxa % 64)) - 1)
+
+        per_tree = []
+        for tree in trees:
+            bits = split_bits(tree, self.taxon_position, n_words)[1:]  # the root has no branch above it
+            flip = (bits[:, 0] & np.uint64(1)).astype(bool)
+            bits[flip] = ~bits[flip] & full
+            size = _popcount(bits)
+            keep = (size > 0) & (size < self.n_taxa)
+            per_tree.append((np.flatnonzero(keep) + 1, bits[keep], tree.branch_length[1:][keep], size[keep]))
+
+        keys, split_ids = np.unique(np.concatenate([_as_keys(bits) for _, bits, _, _ in per_tree]), return_inverse=True)
+        self.n_splits = len(keys)
+        self.presence = np.zeros((len(trees), self.n_splits), dtype=bool)
+        self.weights = np.zeros((len(trees), self.n_splits))
+        self.split_size = np.zeros(self.n_splits, dtype=np.int64)
+        self.node_split = []
+        start = 0
+        for t, (nodes, bits, lengths, size) in enumerate(per_tree):
+            ids = split_ids[start:start + len(nodes)]
+            start += len(nodes)
+            self.presence[t, ids] = True
+            np.add.at(self.weights[t], ids, lengths)  # the two root branches of a rooted tree are one split
+            self.split_size[ids] = size
+            node_split = np.full(trees[t].n_nodes, -1, dtype=np.int64)
+            node_split[nodes] = ids
+            self.node_split.append(node_split)
+
+        self.nontrivial = (self.split_size > 1) & (self.split_size < self.n_taxa - 1)
+
+    def robinson_foulds(self):
+        """Symmetric-difference (RF) distances between all trees, counting non-trivial splits only."""
+        present = self.presence[:, self.nontrivial].astype(np.float32)
+        counts = present.sum(axis=1)
+        shared = present @ present.T
+        return (counts[:, None] + counts[None, :] - 2 * shared).astype(np.int64)
+
+    def weighted_robinson_foulds(self):
+        """Sum over all splits (terminal branches included) of the branch length difference between trees."""
+        n = len(self.trees)
+        distances = np.zeros((n, n))
+        for i in range(n - 1):
+            distances[i, i + 1:] = np.abs(self.weights[i + 1:] - self.weights[i]).sum(axis=1)
+        return distances + distances.T
+
+    def support(self, t=0):
+        """Fraction of all trees containing each node's split in tree t (NaN for tips, the root and trivial splits)."""
+        frequency = self.presence.mean(axis=0)
+        ids = self.node_split[t]
+        values = np.full(len(ids), np.nan)
+        shown = ids >= 0
+        shown[shown] = self.nontrivial[ids[shown]]
+        values[shown] = frequency[ids[shown]]
+        return values
+
+
+def rotate(tree, key):
+    """Tip display order of a tree whose children are sorted by key[node] (iterative DFS)."""
+    order = []
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        children = tree.children(node)
+        if len(children) == 0:
+            order.append(node)
+        else:
+            stack.extend(children[np.argsort(key[children], kind='stable')[::-1]])
+    return np.array(order, dtype=np.int64)
+
+
+def _mean_below(tree, tip_values):
+    """Mean of tip_values (indexed by node, NaN ignored) over the tips below each node."""
+    known = ~np.isnan(tip_values)
+    total = np.where(known, tip_values, 0.0)
+    count = known.astype(float)
+    for nodes in tree.levels():
+        np.add.at(total, tree.parent[nodes], total[nodes])
+        np.add.at(count, tree.parent[nodes], count[nodes])
+    return np.where(count > 0, total / np.maximum(count, 1), np.inf)
+
+
+def untangle(left, right, rounds=4):
+    """
+    Matched tip orders for a tanglegram: alternately rotates each tree's children by the mean
+    position of their tips in the other tree (one-sided barycentre heuristic).
+    Returns the tip node orders of both trees.
+    """
+    def follow(moving, fixed, fixed_order):
+        position = {fixed.names[node]: k for k, node in enumerate(fixed_order)}
+        tip_values = np.full(moving.n_nodes, np.nan)
+        tip_values[moving.tips] = [position.get(name, np.nan) for name in moving.tip_names]
+        return rotate(moving, _mean_below(moving, tip_values))
+
+    left_order = rotate(left, np.zeros(left.n_nodes))
+    right_order = follow(right, left, left_order)
+    for _ in range(rounds - 1):
+        left_order = follow(left, right, right_order)
+        right_order = follow(right, left, left_order)
+    return left_order, right_order
+
+
+def node_y(tree, tip_order):
+    """y per node: tips at their display row, internal nodes midway between their extreme children."""
+    low = np.full(tree.n_nodes, np.inf)
+    high = np.full(tree.n_nodes, -np.inf)
+    low[tip_order] = high[tip_order] = np.arange(len(tip_order))
+    for nodes in tree.levels():
+        np.minimum.at(low, tree.parent[nodes], (low[nodes] + high[nodes]) / 2)
+        np.maximum.at(high, tree.parent[nodes], (low[nodes] + high[nodes]) / 2)
+    return (low + high) / 2
+
+
+def tree_segments(tree, x, y):
+    """Elbow-style branch lines of a whole tree as one None-separated coordinate list."""
+    nodes = np.arange(1, tree.n_nodes)
+    parents = tree.parent[nodes]
+    xs = np.column_stack([x[parents], x[parents], x[nodes], np.full(len(nodes), np.nan)]).ravel()
+    ys = np.column_stack([y[parents], y[nodes], y[nodes], np.full(len(nodes), np.nan)]).ravel()
+    return np.where(np.isnan(xs), None, xs).tolist(), np.where(np.isnan(ys), None, ys).tolist()
+
+
+def create_distance_figure(comparison):
+    """Side-by-side RF and weighted RF heatmaps over all loaded trees."""
+    fig = make_subplots(rows=1, cols=2, horizontal_spacing=0.15,
+                        subplot_titles=("Robinson-Foulds Distance", "Weighted Robinson-Foulds Distance"))
+    for col, (matrix, bar_x) in enumerate(((comparison.robinson_foulds(), 0.42),
+                                           (comparison.weighted_robinson_foulds(), 1.0)), start=1):
+        fig.add_trace(go.Heatmap(z=matrix.tolist(), x=comparison.labels, y=comparison.labels,
+                                 colorscale='Viridis', colorbar=dict(x=bar_x)), row=1, col=col)
+    fig.update_layout(title=f"{len(comparison.trees)} trees, {comparison.n_taxa} shared taxa",
+                      height=550, margin=dict(l=60, r=40, t=80, b=60))
+    return fig
+
+
+def create_support_figure(comparison, t=0):
+    """Tree t drawn rectangularly with each internal branch coloured by the fraction of trees that contain it."""
+    tree = comparison.trees[t]
+    order = rotate(tree, np.zeros(tree.n_nodes))
+    y = node_y(tree, order)
+    x = tree.depth
+    support = comparison.support(t)
+    xs, ys = tree_segments(tree, x, y)
+    internal = np.flatnonzero(~np.isnan(support))
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=xs, y=ys, mode='lines', line=dict(color='black', width=1), hoverinfo='skip'))
+    fig.add_trace(go.Scattergl(
+        x=x[internal].tolist(), y=y[internal].tolist(), mode='markers',
+        marker=dict(size=7, color=support[internal].tolist(), colorscale='RdYlGn', cmin=0, cmax=1,
+                    colorbar=dict(title='Support')),
+        text=[f"{s:.0%} of trees" for s in support[internal]],
+        hoverinfo='text'
+    ))
+    fig.update_layout(
+        title=f"Split Support on {comparison.labels[t]}",
+        showlegend=False,
+        height=max(600, min(tree.n_tips * 12, 4000)),
+        xaxis=dict(title='Branch Length', showgrid=False, zeroline=False),
+        yaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
+        plot_bgcolor='white'
+    )
+    return fig
+
+
+def create_tanglegram_figure(comparison, left_t, right_t):
+    """Two trees facing each other with matched tips joined; child order is untangled to reduce crossings."""
+    left, right = comparison.trees[left_t], comparison.trees[right_t]
+    left_order, right_order = untangle(left, right)
+    left_y, right_y = node_y(left, left_order), node_y(right, right_order)
+    left_x = left.depth / max(left.depth.max(), 1e-12)
+    right_x = 2.5 - right.depth / max(right.depth.max(), 1e-12)
+
+    fig = go.Figure()
+    for tree, x, y in ((left, left_x, left_y), (right, right_x, right_y)):
+        xs, ys = tree_segments(tree, x, y)
+        fig.add_trace(go.Scattergl(x=xs, y=ys, mode='lines', line=dict(color='black', width=1), hoverinfo='skip'))
+
+    right_node = {right.names[node]: node for node in right.tips}
+    pairs = [(node, right_node[left.names[node]]) for node in left.tips if left.names[node] in right_node]
+    pairs = pairs[:CONNECTOR_LIMIT]
+    xs, ys, names = [], [], []
+    for a, b in pairs:
+        xs += [1.05, 1.45, None]
+        ys += [float(left_y[a]), float(right_y[b]), None]
+        names += [left.names[a]] * 2 + [None]
+    fig.add_trace(go.Scattergl(x=xs, y=ys, mode='lines', line=dict(color='rgba(70,130,180,0.5)', width=1),
+                               text=names, hoverinfo='text'))
+
+    fig.update_layout(
+        title=f"Tanglegram: {comparison.labels[left_t]} vs {comparison.labels[right_t]}",
+        showlegend=False,
+        height=max(600, min(max(left.n_tips, right.n_tips) * 12, 4000)),
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        plot_bgcolor='white'
+    )
+    return fig
+
+
+def parse_tree_uploads(decoded_files, filenames):
+    """Reads every Newick tree from each uploaded file (a file may hold many, e.g. bootstrap replicates)."""
+    trees, labels = [], []
+    for text, filename in zip(decoded_files, filenames):
+        parsed = list(Phylo.parse(io.StringIO(text), 'newick'))
+        for k, tree in enumerate(parsed):
+            trees.append(TreeArrays.from_phylo(tree))
+            labels.append(filename if len(parsed) == 1 else f"{filename} #{k + 1}")
+    return trees, labels
+
+
+def get_cached_comparison(key):
+    return _COMPARISON_CACHE.get(key)
+
+
+def cache_comparison(key, comparison):
+    return _COMPARISON_CACHE.put(key, comparison)
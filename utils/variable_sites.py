@@ -0,0 +1,72 @@
+import numpy as np
+from utils.lru_cache import LRUCache
+
+# ✅ Codes that never count as a residue state (gap, ambiguous N, unknown)
+MISSING_CODES = np.frombuffer(b'-N?.', dtype=np.uint8)
+GAP_CODES = np.frombuffer(b'-.', dtype=np.uint8)
+N_CODES = np.frombuffer(b'N?', dtype=np.uint8)
+CELLS_PER_CHUNK = 8_000_000  # Bounds the temporary count arrays to tens of MB
+MAX_CHUNK_COLUMNS = 16384
+SITE_INDEX_CACHE_SIZE = 16
+
+_SITE_INDEX_CACHE = LRUCache('site_index', SITE_INDEX_CACHE_SIZE)
+
+
+class SiteIndex:
+    """Per-column summary of an encoded alignment: which columns vary and how much is missing."""
+
+    def __init__(self, n_states, n_informative_states, gap_fraction, n_fraction):
+        self.n_states = n_states
+        self.gap_fraction = gap_fraction
+        self.n_fraction = n_fraction
+        self.polymorphic = np.flatnonzero(n_states >= 2)
+        self.parsimony_informative = np.flatnonzero(n_informative_states >= 2)
+
+    @property
+    def n_columns(self):
+        return len(self.n_states)
+
+    @property
+    def polymorphic_mask(self):
+        mask = np.zeros(self.n_columns, dtype=bool)
+        mask[self.polymorphic] = True
+        return mask
+
+
+def column_counts(block):
+    """Counts every uint8 code per column of a (rows x cols) block -> (cols x 256) array."""
+    n_rows, n_cols = block.shape
+    offsets = block.astype(np.int64) + (np.arange(n_cols, dtype=np.int64) * 256)[np.newaxis, :]
+    return np.bincount(offsets.ravel(), minlength=n_cols * 256).reshape(n_cols, 256)
+
+
+def build_site_index(matrix):
+    """Builds a SiteIndex in column chunks, so memory stays bounded for wide alignments."""
+    n_rows, n_cols = matrix.shape
+    chunk = max(1, min(MAX_CHUNK_COLUMNS, CELLS_PER_CHUNK // max(n_rows, 1)))
+
+    state_codes = np.setdiff1d(np.arange(256), MISSING_CODES)
+    n_states = np.zeros(n_cols, dtype=np.int32)
+    n_informative_states = np.zeros(n_cols, dtype=np.int32)
+    gap_count = np.zeros(n_cols, dtype=np.int64)
+    n_count = np.zeros(n_cols, dtype=np.int64)
+
+    for start in range(0, n_cols, chunk):
+        stop = min(start + chunk, n_cols)
+        counts = column_counts(np.asarray(matrix[:, start:stop]))
+        states = counts[:, state_codes]
+        n_states[start:stop] = (states > 0).sum(axis=1)
+        n_informative_states[start:stop] = (states >= 2).sum(axis=1)
+        gap_count[start:stop] = counts[:, GAP_CODES].sum(axis=1)
+        n_count[start:stop] = counts[:, N_CODES].sum(axis=1)
+
+    return SiteIndex(n_states, n_informative_states,
+                     gap_count / max(n_rows, 1), n_count / max(n_rows, 1))
+
+
+def get_site_index(key, matrix):
+    """Returns the SiteIndex for an alignment key, computing it on first use only."""
+    site_index = _SITE_INDEX_CACHE.get(key)
+    if site_index is None:
+        site_index = _SITE_INDEX_CACHE.put(key, build_site_index(matrix))
+    return site_index
@@ -0,0 +1,78 @@
+"""
+Small per-upload views (tree search indexes and layouts, map sample points) kept as one .npz
+file each in VIEW_STORE_DIR, so any worker on the host can answer a callback for a figure that
+another worker drew. Files are written under a temporary name and renamed into place, and the
+ones not opened for ALIGNMENT_STORE_MAX_AGE_DAYS are removed whenever a new one is stored.
+"""
+import hashlib
+import os
+import tempfile
+import time
+import numpy as np
+from config import ALIGNMENT_STORE_MAX_AGE_DAYS, VIEW_STORE_DIR, logger
+
+SEPARATOR = "\x00"  # Joins the strings of a stored view into one byte array
+
+
+def pack_strings(strings):
+    return np.frombuffer(SEPARATOR.join(strings).encode('utf-8'), dtype=np.uint8)
+
+
+def unpack_strings(packed, n):
+    """The n strings packed by pack_strings."""
+    return bytes(packed).decode('utf-8').split(SEPARATOR) if n else []
+
+
+def view_path(kind, key, store_dir=VIEW_STORE_DIR):
+    return os.path.join(store_dir, f"{kind}-{hashlib.sha1(key.encode('utf-8')).hexdigest()}.npz")
+
+
+def save_view(path, **arrays):
+    """Stores the arrays of a view once; a view already stored under this key is identical and kept."""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, work_path = tempfile.mkstemp(prefix='.view-', suffix='.npz', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(work_path, path)
+    except Exception:
+        os.remove(work_path)
+        raise
+    prune_views(store_dir=os.path.dirname(path))
+
+
+def load_view(path):
+    """The arrays of a stored view, or None if it is not stored."""
+    try:
+        with np.load(path) as saved:
+            return {name: saved[name] for name in saved.files}
+    except FileNotFoundError:
+        return None
+
+
+def touch_view(path):
+    try:
+        os.utime(path)  # Marks the view as in use for pruning
+    except OSError:
+        pass
+
+
+def prune_views(max_age_days=ALIGNMENT_STORE_MAX_AGE_DAYS, store_dir=VIEW_STORE_DIR):
+    """Removes stored views (and abandoned temporary files) not opened for max_age_days."""
+    if not max_age_days or not os.path.isdir(store_dir):
+        return 0
+    cutoff = time.time() - max_age_days * 24 * 60 * 60
+    removed = 0
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info(f"Removed {removed} stored view(s) unused for {max_age_days:g} days")
+    return removed